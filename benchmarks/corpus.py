@@ -0,0 +1,140 @@
+# corpus.py
+# Reproducible synthetic PDF corpus for the benchmarks, generated offline
+# with PyMuPDF. Documents vary in page count, column layout, tables, text
+# density and keyword hit density (keywords from get_default_keywords).
+import argparse
+import random
+import sys
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from smartsearch.backend import get_default_keywords
+
+
+# Filler vocabulary, none of which contains a default keyword
+FILLER_WORDS = (
+    "aims project cohort study clinical patients outcomes analysis data "
+    "research methods results community program model trial sample measures "
+    "approach evaluate primary secondary specific significance innovation "
+    "investigators environment timeline budget hypothesis preliminary findings "
+    "assessment intervention protocol recruitment retention follow baseline"
+).split()
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 54
+FONT_SIZE = 9
+
+# Document shapes: (columns, tables per page, words per page, keyword hit rate);
+# page counts come from SCALES
+DOCUMENT_SHAPES = {
+    "plain": (1, 0, 350, 0.01),
+    "dense": (1, 0, 700, 0.01),
+    "two_column": (2, 0, 500, 0.01),
+    "tables": (1, 2, 250, 0.01),
+    "keyword_heavy": (1, 0, 350, 0.15),
+}
+
+# Page counts of the benchmark scales
+SCALES = {
+    "small": 10,
+    "medium": 100,
+    "large": 500,
+}
+
+
+def make_paragraph(rng, word_count, hit_rate, keywords):
+    """
+    Random text in which about hit_rate of the words are keywords
+    """
+    words = []
+    for _ in range(word_count):
+        if rng.random() < hit_rate:
+            words.append(rng.choice(keywords))
+        else:
+            words.append(rng.choice(FILLER_WORDS))
+    return " ".join(words)
+
+
+def draw_table(page, rect, rng, hit_rate, keywords, rows=6, columns=4):
+    """
+    Draws a ruled table with a word or two in each cell
+    """
+    cell_width = rect.width / columns
+    cell_height = rect.height / rows
+    for row in range(rows + 1):
+        y = rect.y0 + row * cell_height
+        page.draw_line((rect.x0, y), (rect.x1, y), width=0.5)
+    for column in range(columns + 1):
+        x = rect.x0 + column * cell_width
+        page.draw_line((x, rect.y0), (x, rect.y1), width=0.5)
+    for row in range(rows):
+        for column in range(columns):
+            cell = fitz.Rect(
+                rect.x0 + column * cell_width + 2, rect.y0 + row * cell_height + 2,
+                rect.x0 + (column + 1) * cell_width - 2, rect.y0 + (row + 1) * cell_height - 2
+            )
+            page.insert_textbox(cell, make_paragraph(rng, 2, hit_rate, keywords), fontsize=FONT_SIZE - 1)
+
+
+def generate_pdf(path, pages, columns=1, tables=0, words_per_page=350, hit_rate=0.01, seed=0):
+    """
+    Writes a synthetic PDF; the same arguments always give the same document
+    """
+    rng = random.Random(seed)
+    keywords = get_default_keywords()
+    doc = fitz.open()
+    table_height = 110
+
+    for _ in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        top = MARGIN
+        for _ in range(tables):
+            draw_table(page, fitz.Rect(MARGIN, top, PAGE_WIDTH - MARGIN, top + table_height), rng, hit_rate, keywords)
+            top += table_height + 12
+
+        column_width = (PAGE_WIDTH - 2 * MARGIN - (columns - 1) * 18) / columns
+        for column in range(columns):
+            x0 = MARGIN + column * (column_width + 18)
+            rect = fitz.Rect(x0, top, x0 + column_width, PAGE_HEIGHT - MARGIN)
+            text = make_paragraph(rng, words_per_page // columns, hit_rate, keywords)
+            page.insert_textbox(rect, text, fontsize=FONT_SIZE)
+
+    doc.save(str(path), garbage=3, deflate=True)
+    doc.close()
+
+
+def generate_corpus(directory, scales=None, shapes=None):
+    """
+    Generates (or reuses) one PDF per document shape and scale
+    Returns {case name: path}
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    cases = {}
+    for scale in scales or SCALES:
+        for shape in shapes or DOCUMENT_SHAPES:
+            columns, tables, words_per_page, hit_rate = DOCUMENT_SHAPES[shape]
+            name = f"{shape}_{scale}"
+            path = directory / f"{name}.pdf"
+            if not path.exists():
+                seed = sum(map(ord, name))
+                generate_pdf(path, SCALES[scale], columns, tables, words_per_page, hit_rate, seed)
+            cases[name] = path
+    return cases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the synthetic benchmark corpus")
+    parser.add_argument("directory", help="output directory")
+    parser.add_argument("--scales", default=",".join(SCALES), help=f"comma separated scales ({', '.join(SCALES)})")
+    args = parser.parse_args(argv)
+
+    for name, path in generate_corpus(args.directory, args.scales.split(",")).items():
+        print(f"{name}: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# run_benchmarks.py
+# Measures extraction, search and end-to-end throughput and peak memory on
+# the synthetic corpus, writes the results as JSON and compares them with a
+# stored baseline. Runs offline.
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from corpus import DOCUMENT_SHAPES, SCALES, generate_corpus
+from smartsearch.backend import (
+    extract_text_from_pdf,
+    get_default_keywords,
+    process_pdf_with_keywords,
+    search_keywords_in_text,
+)
+
+
+RESULTS_VERSION = 1
+
+# Metrics compared with the baseline; all of them are lower-is-better
+COMPARED_METRICS = ("extract_seconds", "search_seconds", "end_to_end_seconds", "peak_python_mb")
+
+# Default allowed slowdown before a metric counts as a regression
+DEFAULT_THRESHOLD = 0.15
+
+DEFAULT_CORPUS_DIR = Path(tempfile.gettempdir()) / "smartsearch-benchmark-corpus"
+
+# Baseline written by --save-baseline and read by a bare --baseline. Timings
+# depend on the machine, so each machine keeps its own.
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+
+def _timed(fn, repeat):
+    """
+    Runs fn repeat times; returns (median seconds, last result)
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def benchmark_case(path, keywords, repeat):
+    """
+    Measures one document; run in a fresh process, so the peak RSS is its own
+    """
+    extract_seconds, all_text = _timed(lambda: extract_text_from_pdf(path, workers=1), repeat)
+    search_seconds, _ = _timed(lambda: search_keywords_in_text(all_text, keywords), repeat)
+    end_to_end_seconds, _ = _timed(lambda: process_pdf_with_keywords(path, keywords), repeat)
+
+    tracemalloc.start()
+    process_pdf_with_keywords(path, keywords)
+    _, peak_python = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    pages = len(all_text)
+    chars = sum(len(text) for text in all_text.values())
+    result = {
+        "pages": pages,
+        "chars": chars,
+        "file_mb": round(os.path.getsize(path) / 1e6, 3),
+        "extract_seconds": round(extract_seconds, 5),
+        "extract_pages_per_sec": round(pages / extract_seconds, 1),
+        "search_seconds": round(search_seconds, 5),
+        "search_mchars_per_sec": round(chars / search_seconds / 1e6, 2),
+        "end_to_end_seconds": round(end_to_end_seconds, 5),
+        "end_to_end_pages_per_sec": round(pages / end_to_end_seconds, 1),
+        "peak_python_mb": round(peak_python / 1e6, 3),
+    }
+    if resource is not None:
+        # Kilobytes on Linux, bytes on macOS
+        scale = 1e6 if sys.platform == "darwin" else 1e3
+        result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+    return result
+
+
+def run_benchmarks(corpus_dir, scales, shapes, repeat, keywords=None):
+    """
+    Returns the benchmark results dictionary
+    """
+    keywords = keywords or get_default_keywords()
+    cases = generate_corpus(corpus_dir, scales, shapes)
+    results = {}
+    for name, path in cases.items():
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results[name] = executor.submit(benchmark_case, str(path), keywords, repeat).result()
+        print(
+            f"{name:28} {results[name]['pages']:5} pages  "
+            f"extract {results[name]['extract_pages_per_sec']:8} pages/s  "
+            f"search {results[name]['search_mchars_per_sec']:6} Mchars/s  "
+            f"end-to-end {results[name]['end_to_end_pages_per_sec']:8} pages/s",
+            file=sys.stderr,
+        )
+
+    return {
+        "version": RESULTS_VERSION,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pymupdf": fitz.VersionBind,
+            "cpu_count": os.cpu_count(),
+        },
+        "repeat": repeat,
+        "keywords": len(keywords),
+        "results": results,
+    }
+
+
+def compare_results(current, baseline, threshold=DEFAULT_THRESHOLD, metrics=COMPARED_METRICS):
+    """
+    Compares two results dictionaries, case by case, on lower-is-better metrics
+    Returns a list of (case, metric, baseline value, current value, change)
+    for metrics that got worse by more than threshold
+    """
+    regressions = []
+    for name, case in current["results"].items():
+        baseline_case = baseline.get("results", {}).get(name)
+        if baseline_case is None:
+            continue
+        for metric in metrics:
+            old = baseline_case.get(metric)
+            new = case.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change > threshold:
+                regressions.append((name, metric, old, new, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark extraction and search on a synthetic PDF corpus")
+    parser.add_argument("--scales", default="small,medium", help=f"comma separated scales ({', '.join(SCALES)})")
+    parser.add_argument(
+        "--shapes", default=",".join(DOCUMENT_SHAPES),
+        help=f"comma separated document shapes ({', '.join(DOCUMENT_SHAPES)})"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the median is kept (default: 3)")
+    parser.add_argument("--corpus-dir", default=str(DEFAULT_CORPUS_DIR), help="where the synthetic PDFs are kept")
+    parser.add_argument("-o", "--output", help="write the results JSON to this file (default: standard output)")
+    parser.add_argument(
+        "--baseline", nargs="?", const=str(DEFAULT_BASELINE), metavar="FILE",
+        help=f"results JSON to compare with (default: {DEFAULT_BASELINE}); exits with status 1 on regressions"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true",
+        help="save the results as the baseline (to the --baseline file if given) instead of comparing"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD,
+        help=f"relative slowdown counted as a regression (default: {DEFAULT_THRESHOLD})"
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.corpus_dir, args.scales.split(","), args.shapes.split(","), args.repeat)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    if args.save_baseline:
+        baseline_path = args.baseline or str(DEFAULT_BASELINE)
+        Path(baseline_path).write_text(text + "\n", encoding="utf-8")
+        print(f"Baseline saved to {baseline_path}", file=sys.stderr)
+    elif args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions (threshold {args.threshold:.0%}):", file=sys.stderr)
+            for name, metric, old, new, change in regressions:
+                print(f"  {name} {metric}: {old} -> {new} (+{change:.0%})", file=sys.stderr)
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
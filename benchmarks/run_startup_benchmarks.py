@@ -0,0 +1,216 @@
+# run_startup_benchmarks.py
+# Measures cold start: the import time of the CLI and backend entry points,
+# and how long the app script takes on its first run, on plain reruns and
+# while typing in the keyword filter. Every measurement runs in a fresh
+# interpreter. Writes the results as JSON and compares them with a baseline.
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from run_benchmarks import DEFAULT_THRESHOLD, compare_results
+
+
+RESULTS_VERSION = 1
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+APP_PATH = REPO_DIR / "smartsearch" / "app.py"
+
+# Baseline written by --save-baseline and read by a bare --baseline
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "startup_baseline.json"
+
+# Entry points imported without the app: {case name: module}
+IMPORT_CASES = {
+    "import_backend": "smartsearch.backend",
+    "import_cli": "smartsearch.run",
+    "import_batch": "smartsearch.batch",
+}
+
+# Modules only the app may import; loading them elsewhere counts as a regression
+APP_ONLY_MODULES = ("streamlit", "pandas")
+
+# Metrics compared with the baseline; all of them are lower-is-better
+COMPARED_METRICS = ("import_seconds", "process_seconds", "first_run_seconds", "rerun_seconds", "filter_seconds")
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {app_only!r} if m in sys.modules]}}))
+"""
+
+APP_SCRIPT = """
+import json, statistics, sys, time
+sys.path.insert(0, {app_dir!r})
+from streamlit.testing.v1 import AppTest
+
+def timed_run(at):
+    start = time.perf_counter()
+    at.run()
+    return time.perf_counter() - start
+
+at = AppTest.from_file({app_path!r}, default_timeout=120)
+first = timed_run(at)
+reruns = [timed_run(at) for _ in range({reruns})]
+
+# Typing in the keyword filter box, one character per run
+filters = []
+for length in range(1, {reruns} + 1):
+    at.text_input(key="keyword_search_0").input("equity"[:length])
+    filters.append(timed_run(at))
+
+print(json.dumps({{
+    "first_run_seconds": first,
+    "rerun_seconds": statistics.median(reruns),
+    "filter_seconds": statistics.median(filters),
+    "exception": [str(e.value) for e in at.exception],
+}}))
+"""
+
+
+def _run_python(code):
+    """
+    Runs code in a fresh interpreter; returns (wall seconds, its JSON output)
+    """
+    env = dict(os.environ, PYTHONPATH=str(REPO_DIR))
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True, cwd=str(REPO_DIR)
+    )
+    seconds = time.perf_counter() - start
+    return seconds, json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def benchmark_import(module, repeat):
+    """
+    Cold import of one module, median of repeat fresh interpreters
+    """
+    import_times = []
+    process_times = []
+    loaded = []
+    for _ in range(repeat):
+        process_seconds, output = _run_python(IMPORT_SCRIPT.format(module=module, app_only=APP_ONLY_MODULES))
+        import_times.append(output["seconds"])
+        process_times.append(process_seconds)
+        loaded = output["loaded"]
+    return {
+        "module": module,
+        "import_seconds": round(statistics.median(import_times), 4),
+        "process_seconds": round(statistics.median(process_times), 4),
+        "app_only_modules_loaded": loaded,
+    }
+
+
+def benchmark_app(repeat, reruns):
+    """
+    App script run times with no upload, medians of repeat fresh interpreters
+    """
+    runs = []
+    for _ in range(repeat):
+        _, output = _run_python(APP_SCRIPT.format(app_dir=str(APP_PATH.parent), app_path=str(APP_PATH), reruns=reruns))
+        if output["exception"]:
+            raise RuntimeError(f"The app raised: {output['exception']}")
+        runs.append(output)
+    return {
+        metric: round(statistics.median(run[metric] for run in runs), 4)
+        for metric in ("first_run_seconds", "rerun_seconds", "filter_seconds")
+    }
+
+
+def run_startup_benchmarks(repeat, reruns, with_app=True):
+    """
+    Returns the startup benchmark results dictionary
+    """
+    results = {}
+    for name, module in IMPORT_CASES.items():
+        results[name] = benchmark_import(module, repeat)
+        print(
+            f"{name:16} import {results[name]['import_seconds'] * 1000:7.1f} ms  "
+            f"process {results[name]['process_seconds'] * 1000:7.1f} ms",
+            file=sys.stderr,
+        )
+    if with_app:
+        results["app"] = benchmark_app(repeat, reruns)
+        print(
+            f"{'app':16} first run {results['app']['first_run_seconds'] * 1000:7.1f} ms  "
+            f"rerun {results['app']['rerun_seconds'] * 1000:7.1f} ms  "
+            f"filter {results['app']['filter_seconds'] * 1000:7.1f} ms",
+            file=sys.stderr,
+        )
+
+    return {
+        "version": RESULTS_VERSION,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "repeat": repeat,
+        "reruns": reruns,
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark cold import and app rerun times")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per measurement, the median is kept (default: 5)")
+    parser.add_argument("--reruns", type=int, default=5, help="app reruns timed per interpreter (default: 5)")
+    parser.add_argument("--no-app", action="store_true", help="only measure the imports (does not need streamlit)")
+    parser.add_argument("-o", "--output", help="write the results JSON to this file (default: standard output)")
+    parser.add_argument(
+        "--baseline", nargs="?", const=str(DEFAULT_BASELINE), metavar="FILE",
+        help=f"results JSON to compare with (default: {DEFAULT_BASELINE}); exits with status 1 on regressions"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true",
+        help="save the results as the baseline (to the --baseline file if given) instead of comparing"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD,
+        help=f"relative slowdown counted as a regression (default: {DEFAULT_THRESHOLD})"
+    )
+    args = parser.parse_args(argv)
+
+    results = run_startup_benchmarks(args.repeat, args.reruns, not args.no_app)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    failed = False
+    for name, case in results["results"].items():
+        if case.get("app_only_modules_loaded"):
+            print(f"{name} imports {', '.join(case['app_only_modules_loaded'])}", file=sys.stderr)
+            failed = True
+
+    if args.save_baseline:
+        baseline_path = args.baseline or str(DEFAULT_BASELINE)
+        Path(baseline_path).write_text(text + "\n", encoding="utf-8")
+        print(f"Baseline saved to {baseline_path}", file=sys.stderr)
+    elif args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold, COMPARED_METRICS)
+        if regressions:
+            print(f"{len(regressions)} regressions (threshold {args.threshold:.0%}):", file=sys.stderr)
+            for name, metric, old, new, change in regressions:
+                print(f"  {name} {metric}: {old} -> {new} (+{change:.0%})", file=sys.stderr)
+            failed = True
+        else:
+            print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})", file=sys.stderr)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
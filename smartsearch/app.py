@@ -1,8 +1,5 @@
 # app.py
 import streamlit as st
-import pandas as pd
-import tempfile
-import os
 from pathlib import Path
 
 
@@ -11,21 +8,41 @@ from pathlib import Path
 #     extract_text_from_pdf, 
 #     search_keywords_in_text,
 #     process_pdf_with_keywords, 
+#     ExtractionCache,
+#     get_pdf_cache_key,
+#     hash_keywords,
+#     get_keyword_snippets,
+#     MAX_SNIPPETS_PER_KEYWORD,
+#     normalize_pages,
+#     PageSelection,
+#     select_pages,
 #     get_default_keywords,
 #     load_keywords,
 #     save_keywords,
 #     get_keywords_file_path)
 
 from backend import (
+    MemoryBudget,
     extract_text_from_pdf, 
     search_keywords_in_text,
     process_pdf_with_keywords, 
+    ExtractionCache,
+    get_pdf_cache_key,
+    hash_keywords,
+    get_keyword_snippets,
+    MAX_SNIPPETS_PER_KEYWORD,
+    normalize_pages,
+    PageSelection,
+    select_pages,
     get_default_keywords,
     load_keywords,
     save_keywords,
     get_keywords_file_path)
 
 from image_setting import show_logo
+from instrumentation import collect_metrics, measure_keyword_costs
+from jobs import CANCELLED, DONE, FAILED, JobManager, JobQueueFull, highlight_pdf_job, search_pdf_job
+from keyword_store import KeywordStore, page_count, parse_keywords
 
 
 # Set page configuration
@@ -35,25 +52,407 @@ st.set_page_config(
     layout="wide",
 )
 
+# Read the stylesheet once per server process, not on every rerun
+@st.cache_resource
+def get_css():
+    css_path = Path(__file__).parent / "styles.css"
+    if not css_path.exists():
+        return None
+    with open(css_path, encoding="utf-8") as f:
+        return f"<style>{f.read()}</style>"
+
+
+# Encode the logo once per server process, not on every rerun
+@st.cache_resource
+def get_logo_html():
+    return show_logo(Path(__file__).parent / "logo.png", width=400)
+
+
 # Load external CSS
 def load_css():
     """Load CSS from the package directory"""
-    css_path = Path(__file__).parent / "styles.css"
-    if css_path.exists():
-        with open(css_path, encoding="utf-8") as f:
-            st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+    css = get_css()
+    if css:
+        st.markdown(css, unsafe_allow_html=True)
 
 # Call it once at the beginning of your app
 # load_css("styles.css")
 load_css()
 
 
-if 'keywords_list' not in st.session_state:
-    st.session_state.keywords_list = load_keywords()
+# Extraction cache shared by every session of the app
+@st.cache_resource
+def get_extraction_cache():
+    return ExtractionCache()
+
+
+# Background search jobs shared by every session of the app
+@st.cache_resource
+def get_job_manager():
+    return JobManager()
+
+
+# Seconds between progress updates of a running search
+JOB_POLL_SECONDS = 0.5
+
+# Keywords shown per page in the keyword manager
+KEYWORDS_PAGE_SIZE = 50
+
+# Default page text budget of "Limit memory use" searches, in MB
+DEFAULT_MEMORY_BUDGET_MB = 512
+
+
+# Number of recent documents kept in the per-session search memo
+SEARCH_MEMO_DOCUMENTS = 3
+
+
+def get_document_memo(doc_key):
+    """
+    Per-session memo of a parsed document (page text) and its search results,
+    keyed by the document content hash
+    """
+    if 'search_memo' not in st.session_state:
+        st.session_state.search_memo = {}
+    search_memo = st.session_state.search_memo
+
+    if doc_key not in search_memo:
+        # Forget the oldest document
+        if len(search_memo) >= SEARCH_MEMO_DOCUMENTS:
+            search_memo.pop(next(iter(search_memo)))
+        search_memo[doc_key] = {
+            "text": None,             # {page_num: text} of the pages extracted so far
+            "complete": False,        # whether "text" holds every page
+            "normalized": None,       # {page_num: NormalizedText}, built on first use
+            "keyword_results": {},    # search options -> {keyword: {"count", "pages"}, or None if not found}
+            "results": {},            # (search options, keyword list hash) -> results
+        }
+    return search_memo[doc_key]
+
+
+def collect_memo_results(memo, keywords, search_options):
+    """
+    Build the results for a keyword list from the per-keyword memo
+    """
+    keyword_results = memo["keyword_results"].get(search_options, {})
+    results = {}
+    for kw in keywords:
+        if keyword_results.get(kw):
+            results[kw] = keyword_results[kw]
+    return results
+
+
+if 'keyword_store' not in st.session_state:
+    st.session_state.keyword_store = KeywordStore(load_keywords())
 
 # ------
 
 
+def get_upload_id(uploaded_pdf):
+    """
+    Identifies an upload across reruns
+    """
+    return getattr(uploaded_pdf, "file_id", uploaded_pdf.name)
+
+
+def show_keyword_snippets(results, pdf_text):
+    """
+    Expandable panel with keyword-in-context snippets for one keyword at a time
+    """
+    keywords_with_offsets = [kw for kw, info in results.items() if info.get("offsets")]
+    if not keywords_with_offsets:
+        return
+
+    with st.expander("Keyword in Context"):
+        keyword = st.selectbox(
+            "Keyword",
+            keywords_with_offsets,
+            key="snippet_keyword"
+        )
+        offsets = results[keyword]["offsets"]
+        snippets = get_keyword_snippets(pdf_text, offsets, MAX_SNIPPETS_PER_KEYWORD)
+
+        if len(offsets) > len(snippets):
+            st.caption(f"Showing the first {len(snippets)} of {len(offsets)} matches")
+        for page_num, before, match, after in snippets:
+            st.markdown(f"**Page {page_num}:** …{escape_markdown(before)} **{escape_markdown(match)}** {escape_markdown(after)}…")
+
+
+def escape_markdown(text):
+    """
+    Escape markdown characters in PDF text shown with st.markdown
+    """
+    for char in "\\`*_{}[]<>()#+-.!|$~":
+        text = text.replace(char, "\\" + char)
+    return text
+
+
+def store_search_results(search, memo, results, metrics=None, memory=None):
+    """
+    Memoize a search's results and make it the search shown on reruns
+    """
+    memo["results"][search["results_key"]] = results
+    st.session_state.last_search = {
+        "file_id": search["file_id"],
+        "doc_key": search["doc_key"],
+        "results_key": search["results_key"],
+        "keywords": search["keywords"],
+        "presence": search["presence"],
+        "normalize": search["search_options"][0],
+        "pages": search["search_options"][2],
+        "metrics": metrics,
+        "memory": memory,
+    }
+
+
+def collect_search_job():
+    """
+    Moves the results of the session's finished background search into the
+    search memo, or reports why it did not finish
+    """
+    search_job = st.session_state.get("search_job")
+    if search_job is None:
+        return
+    job_manager = get_job_manager()
+    job = job_manager.get(search_job["job_id"])
+    if job is not None and not job.finished:
+        return
+
+    st.session_state.pop("search_job")
+    if job is None:
+        st.warning("The search was interrupted, please run it again")
+        return
+    job_manager.forget(job.id)
+
+    if job.status == CANCELLED:
+        st.info("Search cancelled")
+    elif job.status == FAILED:
+        st.session_state.pop("last_search", None)
+        st.error(f"❌ Error processing PDF: {job.error}")
+    else:
+        memo = get_document_memo(search_job["doc_key"])
+        if job.result["memory"] is not None:
+            # Memory-capped search: keep its (possibly spilled) pages for the
+            # snippets only, so later searches stream the document again
+            memo["text"] = job.result["text"]
+            memo["complete"] = False
+        else:
+            # Keep the pages read, for snippets and later searches
+            memo["text"] = {**(memo["text"] or {}), **job.result["text"]}
+            memo["complete"] = memo["complete"] or job.result["complete"]
+        results = job.result["results"]
+        keyword_results = memo["keyword_results"].setdefault(search_job["search_options"], {})
+        for kw in search_job["keywords"]:
+            keyword_results[kw] = results.get(kw)
+        store_search_results(search_job, memo, results, job.result["metrics"], job.result["memory"])
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_search_job():
+    """
+    Progress bar and cancel button of the session's background search,
+    refreshed on its own until the search finishes
+    """
+    search_job = st.session_state.get("search_job")
+    if search_job is None:
+        return
+    job = get_job_manager().get(search_job["job_id"])
+    if job is None or job.finished:
+        # Rerun the whole page to show the results
+        st.rerun()
+
+    progress_col, cancel_col = st.columns([8, 1])
+    with progress_col:
+        if job.cancel_requested:
+            st.progress(job.fraction, text="Cancelling...")
+        else:
+            st.progress(job.fraction, text=job.message or "Waiting for a free worker...")
+    with cancel_col:
+        if st.button("Cancel", key="cancel_search", disabled=job.cancel_requested):
+            # Picked up by the next refresh
+            job.cancel()
+
+
+def show_diagnostics(last_search, pdf_text):
+    """
+    Collapsible panel with the timings and counters of the last search
+    """
+    import pandas as pd
+    metrics = last_search.get("metrics")
+    with st.expander("Diagnostics"):
+        if metrics is None:
+            st.caption("These results were reused from an earlier search of this document")
+        else:
+            summary = f"Search took {metrics['wall_seconds']:.3f} s"
+            if metrics["counters"].get("pages"):
+                summary += f", {metrics['pages_per_sec']:,.0f} pages/s"
+            st.caption(summary)
+            stages = pd.DataFrame([
+                {"Stage": stage, "Seconds": info["seconds"], "Calls": info["calls"]}
+                for stage, info in metrics["stages"].items()
+            ])
+            if not stages.empty:
+                st.dataframe(stages, hide_index=True, width="stretch")
+            counters = ", ".join(f"{name.replace('_', ' ')}: {value:,}" for name, value in metrics["counters"].items())
+            if counters:
+                st.caption(counters)
+
+        memory = last_search.get("memory")
+        if memory is not None:
+            st.caption(
+                f"Peak page text in memory {memory['peak_text_mb']:,.1f} MB (budget {memory['max_mb']:,g} MB), "
+                f"{memory['spilled_pages']:,} pages of text spilled to disk"
+            )
+
+        # Per-keyword cost needs one pass per keyword, so it is only measured on request
+        if pdf_text and st.button("Measure per-keyword match cost", key="measure_keyword_costs"):
+            costs = measure_keyword_costs(pdf_text, last_search["keywords"], last_search.get("normalize", False))
+            st.dataframe(
+                pd.DataFrame([
+                    {"Keyword": keyword, "Seconds": cost["seconds"], "Matches": cost["matches"]}
+                    for keyword, cost in costs.items()
+                ]),
+                hide_index=True,
+                width="stretch"
+            )
+
+
+def show_highlight_export(uploaded_pdf, last_search):
+    """
+    Builds a copy of the upload with every hit of the last search
+    highlighted on request, and offers it for download
+    """
+    export_key = (last_search["doc_key"], last_search["results_key"])
+    export = st.session_state.get("highlight_export")
+    if export is None or export["key"] != export_key:
+        if not st.button("Prepare highlighted PDF", key="prepare_highlighted_pdf"):
+            return
+        pages = last_search.get("pages")
+        try:
+            with st.spinner("Highlighting keyword hits..."):
+                # In a job process, like every use of PyMuPDF in the app
+                job = get_job_manager().submit(
+                    highlight_pdf_job,
+                    uploaded_pdf.getvalue(),
+                    last_search["keywords"],
+                    last_search.get("normalize", False),
+                    PageSelection(pages) if pages else None
+                )
+                job.future.result()
+                get_job_manager().forget(job.id)
+        except JobQueueFull:
+            st.warning("Too many searches are running right now, please try again in a moment")
+            return
+        if job.status != DONE:
+            st.error(f"❌ Error highlighting PDF: {job.error}")
+            return
+        # Only the latest export is kept
+        export = {"key": export_key, "data": job.result}
+        st.session_state.highlight_export = export
+
+    st.download_button(
+        "Download highlighted PDF",
+        data=export["data"],
+        file_name=f"{Path(uploaded_pdf.name).stem}_highlighted.pdf",
+        mime="application/pdf",
+        key="download_highlighted_pdf"
+    )
+
+
+# Render the summary metrics and results table
+def show_results(results, keywords, pdf_text=None, presence=False):
+    """
+    Show the keyword search results for the searched keywords
+    """
+    # Imported on first use: pandas takes longer to import than the rest of
+    # the app, and is only needed once there are results to show
+    import pandas as pd
+
+    if presence:
+        st.caption("Presence check: each keyword is listed with the first page where it appears")
+
+    if results:
+        # Summary metrics
+        col1, col2, col3 = st.columns(3)
+        # with col1.container(key="metric1"):
+        #     st.metric("Keywords Found", len(results))
+        with col1:
+            st.markdown(f"""
+                <div class="custom-metric-box">
+                    <div class="metric-label">Keywords Found</div>
+                    <div class="metric-value">{len(results)}</div>
+                </div>
+            """, unsafe_allow_html=True)
+        with col2:
+            total_occurrences = sum(info['count'] for info in results.values())
+            # st.metric("Total Occurrences", total_occurrences)
+            st.markdown(f"""
+                <div class="custom-metric-box">
+                    <div class="metric-label">Total Occurrences</div>
+                    <div class="metric-value">{total_occurrences}</div>
+                </div>
+            """, unsafe_allow_html=True)
+        with col3:
+            all_pages = set()
+            for info in results.values():
+                all_pages.update(info['pages'])
+            # st.metric("Pages with Results", len(all_pages))
+            st.markdown(f"""
+                <div class="custom-metric-box">
+                    <div class="metric-label">Pages with Results</div>
+                    <div class="metric-value">{len(all_pages)}</div>
+                </div>
+            """, unsafe_allow_html=True)
+
+        st.write("")  # Space
+
+        # Results table
+        st.write("**Detailed Results:**")
+
+        results_data = []
+        for keyword, info in results.items():
+            pages_str = ", ".join(map(str, info['pages']))
+            results_data.append({
+                'Keyword': keyword,
+                'Count': info['count'],
+                'Pages': pages_str
+            })
+
+        df = pd.DataFrame(results_data)
+        df = df.sort_values('Count', ascending=False).reset_index(drop=True)
+
+        st.dataframe(
+            df,
+            width="stretch",
+            hide_index=True,
+            column_config={
+                "Keyword": st.column_config.TextColumn("Keyword"),
+                "Count": st.column_config.NumberColumn("Count"),
+                "Pages": st.column_config.TextColumn("Pages Found")
+            }
+        )
+
+
+        # Keyword-in-context snippets, built only for the selected keyword
+        if pdf_text is not None:
+            show_keyword_snippets(results, pdf_text)
+
+        # Show keywords that weren't found
+        found_keywords = set(results.keys())
+        not_found = [kw for kw in keywords if kw not in found_keywords]
+
+        if not_found:
+            with st.expander(f"Keywords Not Found ({len(not_found)})"):
+                st.write(", ".join(not_found))
+
+    else:
+        st.error("❌ No keywords were found in the PDF")
+        st.info("💡 Try different keywords or check if the PDF contains searchable text")
+
+        # Show all keywords that weren't found
+        with st.expander("🔍 Searched Keywords"):
+            st.write(", ".join(keywords))
+
+
 def main():
     # st.title("Smart Search")
     # st.markdown("Search for keywords in PDF documents")
@@ -66,11 +465,7 @@ def main():
 
         left_co, cent_co,last_co = st.columns(3)
         with cent_co:
-            logo_html = show_logo(
-                Path(__file__).parent / "logo.png", 
-                width=400
-            )
-            st.markdown(logo_html, unsafe_allow_html=True)
+            st.markdown(get_logo_html(), unsafe_allow_html=True)
             
             # st.markdown("Search for keywords in PDF documents")
             st.markdown("""
@@ -113,16 +508,15 @@ def main():
             st.text("Expand the section to manage keywords")
             with st.expander("Keywords Management Section", 
                             expanded=False):
-                
+                store = st.session_state.keyword_store
+
                 # Show total keywords count at the top
-                total_keywords = len(st.session_state.keywords_list) if 'keywords_list' in st.session_state else 0
-                st.info(f"**Total current keywords: {total_keywords}**")
+                st.info(f"**Total current keywords: {len(store)}**")
         
-                # Search/Filter box with quick add functionality - More responsive version
+                # Search/Filter box with quick add functionality
                 search_col, add_col, clear_col = st.columns([7, 2, 1])
                 
                 with search_col:
-                    # Using st.text_input with auto-rerun for better responsiveness
                     if 'search_counter' not in st.session_state:
                         st.session_state.search_counter = 0
                     
@@ -130,46 +524,31 @@ def main():
                         "Search",
                         placeholder="🔍 Search keywords or type to add new...",
                         key=f"keyword_search_{st.session_state.search_counter}",
-                        label_visibility="collapsed"
+                        label_visibility="collapsed",
+                        help="Keywords match anywhere in a word by default. Use word:white for whole words only, "
+                             "discriminat* for words starting with a prefix, or regex:colou?r for a regular expression."
                     )
                     
-                    # Store search term in session state for persistence
-                    if 'current_search' not in st.session_state:
-                        st.session_state.current_search = ""
-                    
-                    # Update current search if it changed
-                    if search_term != st.session_state.current_search:
-                        st.session_state.current_search = search_term
-                        # Force rerun for dynamic filtering
-                        st.rerun()
-                    
-                    # Use the stored search term for consistency
-                    search_term = st.session_state.current_search
-                
-                # Filter keywords based on search term
-                filtered_keywords = []
-                original_indices = []  # Keep track of original indices for removal
+                    # Editing the box already reruns the script, so the list below
+                    # is filtered in the same run
+                    st.session_state.current_search = search_term
+
+                prefix_only = st.toggle("Match the start of keywords only", key="keyword_prefix_only")
                 
-                if st.session_state.keywords_list:
-                    if search_term.strip():
-                        # Filter keywords that contain the search term (case insensitive)
-                        for i, keyword in enumerate(st.session_state.keywords_list):
-                            if search_term.lower() in keyword.lower():
-                                filtered_keywords.append(keyword)
-                                original_indices.append(i)
-                    else:
-                        # Show all keywords when no search term
-                        filtered_keywords = st.session_state.keywords_list.copy()
-                        original_indices = list(range(len(st.session_state.keywords_list)))
+                # Filter keywords based on search term (indexed, see KeywordStore)
+                if search_term.strip():
+                    filtered_keywords = store.with_prefix(search_term) if prefix_only else store.filter(search_term)
+                else:
+                    filtered_keywords = store.to_list()
                 
                 # Check if search term exists in keywords (exact match, case insensitive)
-                search_exists = search_term.strip().lower() in [kw.lower() for kw in st.session_state.keywords_list] if search_term.strip() else True
+                search_exists = search_term in store if search_term.strip() else True
                 
                 # Show "Add" button if search term doesn't exist and is not empty
                 with add_col:
                     if search_term.strip() and not search_exists:
                         if st.button(f"➕ Add", key="quick_add", help=f"Add '{search_term.strip()}'"):
-                            st.session_state.keywords_list.append(search_term.strip())
+                            store.add(search_term)
                             # Clear search term after adding
                             st.session_state.current_search = ""
                             st.session_state.search_counter += 1
@@ -182,44 +561,71 @@ def main():
                             st.session_state.current_search = ""
                             st.session_state.search_counter += 1
                             st.rerun()
-                
+
+                # Only one page of the filtered keywords is rendered
+                total_pages = page_count(len(filtered_keywords), KEYWORDS_PAGE_SIZE)
+                if st.session_state.get("keyword_page_filter") != (search_term, prefix_only):
+                    # Back to the first page when the filter changes
+                    st.session_state.keyword_page_filter = (search_term, prefix_only)
+                    st.session_state.keyword_page = 0
+                keyword_page = min(st.session_state.get("keyword_page", 0), total_pages - 1)
+                first = keyword_page * KEYWORDS_PAGE_SIZE
+                page_keywords = filtered_keywords[first:first + KEYWORDS_PAGE_SIZE]
                 
                 # Scrollable box showing filtered keywords
                 keywords_display = st.container(height=200)
                 with keywords_display:
-                    if filtered_keywords:
-                        for display_index, (keyword, original_index) in enumerate(zip(filtered_keywords, original_indices)):
+                    if page_keywords:
+                        for display_index, keyword in enumerate(page_keywords, start=first):
                             col_key, col_button = st.columns([8, 1])
                             with col_key:
                                 # Show keyword with search term highlighted (basic text highlighting)
                                 if search_term.strip():
-                                    st.write(f"{display_index+1}. {keyword} *(contains '{search_term}')*")
+                                    match = "starts with" if prefix_only else "contains"
+                                    st.write(f"{display_index+1}. {keyword} *({match} '{search_term}')*")
                                 else:
                                     st.write(f"{display_index+1}. {keyword}")
                             with col_button:
-                                if st.button("❌", key=f"remove_{original_index}_{display_index}", help=f"Remove '{keyword}'"):
-                                    st.session_state.keywords_list.pop(original_index)
+                                if st.button("❌", key=f"remove_{display_index}", help=f"Remove '{keyword}'"):
+                                    store.remove(keyword)
                                     # Clear search to refresh the view
                                     st.session_state.current_search = ""
                                     st.session_state.search_counter += 1
                                     st.rerun()
 
-                    elif st.session_state.keywords_list and search_term.strip():
+                    elif len(store) and search_term.strip():
                         # Show message when no results found but keywords exist
                         st.write("*No keywords match your search*")
-                    elif not st.session_state.keywords_list:
+                    elif not len(store):
                         st.write("*No keywords added yet*")
 
+                # Page navigation
+                if total_pages > 1:
+                    prev_col, page_col, next_col = st.columns([1, 3, 1])
+                    with prev_col:
+                        if st.button("◀", key="keyword_page_prev", disabled=keyword_page == 0):
+                            st.session_state.keyword_page = keyword_page - 1
+                            st.rerun()
+                    with page_col:
+                        st.caption(
+                            f"Page {keyword_page + 1} of {total_pages} "
+                            f"({len(filtered_keywords):,} keywords)"
+                        )
+                    with next_col:
+                        if st.button("▶", key="keyword_page_next", disabled=keyword_page >= total_pages - 1):
+                            st.session_state.keyword_page = keyword_page + 1
+                            st.rerun()
+
                 # Action buttons
                 col_btn1, col_btn2 = st.columns(2)
                 with col_btn1:
                     if st.button("Clear All", key = "clear_button"):
-                        st.session_state.keywords_list = []
+                        store.replace([])
                         st.rerun()
                 
                 with col_btn2:
                     if st.button("Reset to Default", key="reset_button"):
-                        st.session_state.keywords_list = get_default_keywords()
+                        store.replace(get_default_keywords())
                         st.rerun()
 
 
@@ -237,21 +643,8 @@ def main():
                 
                 if st.button("Add All", key = "add_all_button"):
                     if bulk_keywords.strip():
-                        new_keywords = [kw.strip() for kw in bulk_keywords.split('\n') if kw.strip()]
-                        added_count = 0
-
-                        # Create lowercase version of existing keywords for case-insensitive comparison
-                        existing_keywords_lower = [kw.lower() for kw in st.session_state.keywords_list]
-
-                        for kw in new_keywords:
-                            # if kw not in st.session_state.keywords_list:
-                            # Check if keyword already exists (case-insensitive)
-                            if kw.lower() not in existing_keywords_lower:
-                                st.session_state.keywords_list.append(kw)
-
-                                existing_keywords_lower.append(kw.lower())  # Add to comparison list
-
-                                added_count += 1
+                        # Duplicates (case-insensitive) are skipped by the store
+                        added_count = store.add_many(parse_keywords(bulk_keywords))
                         if added_count > 0:
                             st.success(f"Added {added_count} new keywords")
                             st.session_state.bulk_input_counter += 1  # Clear textarea
@@ -259,24 +652,85 @@ def main():
                         else:
                             st.warning("Keyword already exists!")
 
+                # Bulk import and export
+                keywords_file = st.file_uploader(
+                    "Import keywords",
+                    type=["json", "txt", "csv"],
+                    key=f"keywords_file_{st.session_state.bulk_input_counter}",
+                    help="A JSON list of keywords, or a text file with one keyword per line"
+                )
+                import_col, export_col = st.columns(2)
+                with import_col:
+                    if st.button("Import", key="import_keywords", disabled=keywords_file is None):
+                        try:
+                            added_count = store.add_many(parse_keywords(keywords_file.getvalue(), keywords_file.name))
+                        except ValueError as e:
+                            st.error(f"Could not import {keywords_file.name}: {e}")
+                        else:
+                            st.success(f"Imported {added_count} new keywords")
+                            st.session_state.bulk_input_counter += 1  # Clear the uploader
+                            st.rerun()
+                with export_col:
+                    st.download_button(
+                        "Export",
+                        data=store.to_json(),
+                        file_name="keywords.json",
+                        mime="application/json",
+                        key="export_keywords"
+                    )
 
                 # Added Save Keywords functionality
                 if st.button("Save Keywords", key = "save_keywords"):
-                    if save_keywords(st.session_state.keywords_list):
+                    if store.revision == st.session_state.get("saved_keywords_revision"):
+                        st.info("No changes since the keywords were last saved")
+                    elif save_keywords(store.to_list()):
+                        st.session_state.saved_keywords_revision = store.revision
                         filepath = get_keywords_file_path()
                         st.success(f"Keywords saved successfully!\nSaved keywords file: `{filepath}`")
                     else:
                         st.error("Failed to save keywords")
                 
     # 3. Run Search Button
-        can_run = uploaded_pdf is not None and len(st.session_state.keywords_list) > 0
+        can_run = uploaded_pdf is not None and len(st.session_state.keyword_store) > 0
         
         if not can_run:
             if not uploaded_pdf:
                 st.warning("Please upload a PDF file first")
-            if len(st.session_state.keywords_list) == 0:
+            if len(st.session_state.keyword_store) == 0:
                 st.warning("Please add at least one keyword")
         
+        normalize = st.checkbox(
+            "Normalize text",
+            key="normalize_text",
+            help="Match across ligatures (ﬁ), hyphenated line breaks and line breaks inside phrases"
+        )
+        presence = st.checkbox(
+            "Only check presence",
+            key="presence_only",
+            help="Stop at the first match of each keyword, and stop reading the PDF once every keyword is found"
+        )
+        limit_memory = st.checkbox(
+            "Limit memory use",
+            key="limit_memory",
+            help="For very large PDFs: page text is moved to a temporary file on disk once the "
+                 "memory budget is reached (slower, and every search reads the document again)"
+        )
+        memory_budget_mb = None
+        if limit_memory:
+            memory_budget_mb = st.number_input(
+                "Page text budget (MB)",
+                min_value=64,
+                value=DEFAULT_MEMORY_BUDGET_MB,
+                step=64,
+                key="memory_budget_mb"
+            )
+        page_selection = st.text_input(
+            "Pages",
+            key="page_selection",
+            placeholder="All pages (or e.g. 1-30, 45, 50-)",
+            help="Only extract and search these pages"
+        ).strip()
+
         search_button = st.button(
             "SEARCH", 
             type="primary", 
@@ -289,107 +743,118 @@ def main():
         if search_button and can_run:
             st.subheader("Results")
             
-            with st.spinner("Searching PDF for keywords..."):
-                # Save PDF temporarily
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-                    tmp_file.write(uploaded_pdf.getvalue())
-                    tmp_file_path = tmp_file.name
-                
-                try:
-                    # Use backend function to process PDF
-                    pdf_text, results = process_pdf_with_keywords(
-                        tmp_file_path, 
-                        st.session_state.keywords_list
+            keywords = st.session_state.keyword_store.to_list()
+
+            # A new search replaces the one still running, if any
+            previous_job = st.session_state.pop("search_job", None)
+            if previous_job is not None:
+                get_job_manager().forget(previous_job["job_id"])
+
+            try:
+                # Open the upload straight from memory, without a temporary file
+                # (in place, without a copy, when limiting memory use)
+                pdf_bytes = uploaded_pdf.getbuffer() if limit_memory else uploaded_pdf.getvalue()
+                doc_key = get_pdf_cache_key(pdf_bytes)
+                memo = get_document_memo(doc_key)
+                pages = PageSelection(page_selection) if page_selection else None
+                search_options = (normalize, presence, str(pages or ""))
+                results_key = (search_options, hash_keywords(keywords))
+                keyword_results = memo["keyword_results"].setdefault(search_options, {})
+                search = {
+                    "file_id": get_upload_id(uploaded_pdf),
+                    "doc_key": doc_key,
+                    "results_key": results_key,
+                    "keywords": list(keywords),
+                    "presence": presence,
+                    "search_options": search_options,
+                }
+
+                search_metrics = None
+
+                if results_key in memo["results"]:
+                    # Same document and keywords: reuse the previous results
+                    results = memo["results"][results_key]
+
+                elif memo["complete"] and not limit_memory:
+                    # Same document: only search the keywords not searched yet
+                    new_keywords = [kw for kw in keywords if kw not in keyword_results]
+                    if new_keywords:
+                        with collect_metrics() as metrics:
+                            search_text = memo["text"]
+                            if normalize:
+                                # Normalize the pages once per document
+                                if memo["normalized"] is None:
+                                    with metrics.stage("normalize"):
+                                        memo["normalized"] = normalize_pages(memo["text"])
+                                search_text = memo["normalized"]
+                            if pages is not None:
+                                search_text = {
+                                    page_num: search_text[page_num]
+                                    for page_num in select_pages(pages, len(search_text))
+                                }
+                            new_results = search_keywords_in_text(
+                                search_text, new_keywords, with_offsets=True, normalize=normalize, presence=presence
+                            )
+                        search_metrics = metrics.report()
+                        for kw in new_keywords:
+                            keyword_results[kw] = new_results.get(kw)
+                    results = collect_memo_results(memo, keywords, search_options)
+
+                else:
+                    # Stream the PDF through the backend page by page, in the
+                    # background so the search survives reruns
+                    results = None
+                    job = get_job_manager().submit(
+                        search_pdf_job,
+                        # Copied to the job's worker process
+                        bytes(pdf_bytes),
+                        list(keywords),
+                        get_extraction_cache(),
+                        doc_key,
+                        normalize,
+                        pages,
+                        presence,
+                        MemoryBudget(max_mb=memory_budget_mb) if limit_memory else None
                     )
-                    
-                    if results:
-                        # Summary metrics
-                        col1, col2, col3 = st.columns(3)
-                        # with col1.container(key="metric1"):
-                        #     st.metric("Keywords Found", len(results))
-                        with col1:
-                            st.markdown(f"""
-                                <div class="custom-metric-box">
-                                    <div class="metric-label">Keywords Found</div>
-                                    <div class="metric-value">{len(results)}</div>
-                                </div>
-                            """, unsafe_allow_html=True)
-                        with col2:
-                            total_occurrences = sum(info['count'] for info in results.values())
-                            # st.metric("Total Occurrences", total_occurrences)
-                            st.markdown(f"""
-                                <div class="custom-metric-box">
-                                    <div class="metric-label">Total Occurrences</div>
-                                    <div class="metric-value">{total_occurrences}</div>
-                                </div>
-                            """, unsafe_allow_html=True)
-                        with col3:
-                            all_pages = set()
-                            for info in results.values():
-                                all_pages.update(info['pages'])
-                            # st.metric("Pages with Results", len(all_pages))
-                            st.markdown(f"""
-                                <div class="custom-metric-box">
-                                    <div class="metric-label">Pages with Results</div>
-                                    <div class="metric-value">{len(all_pages)}</div>
-                                </div>
-                            """, unsafe_allow_html=True)
-                        
-                        st.write("")  # Space
-                        
-                        # Results table
-                        st.write("**Detailed Results:**")
-                        
-                        results_data = []
-                        for keyword, info in results.items():
-                            pages_str = ", ".join(map(str, info['pages']))
-                            results_data.append({
-                                'Keyword': keyword,
-                                'Count': info['count'],
-                                'Pages': pages_str
-                            })
-                        
-                        df = pd.DataFrame(results_data)
-                        df = df.sort_values('Count', ascending=False).reset_index(drop=True)
-                        
-                        st.dataframe(
-                            df,
-                            width="stretch",
-                            hide_index=True,
-                            column_config={
-                                "Keyword": st.column_config.TextColumn("Keyword"),
-                                "Count": st.column_config.NumberColumn("Count"),
-                                "Pages": st.column_config.TextColumn("Pages Found")
-                            }
-                        )
-
-                        
-                        # Show keywords that weren't found
-                        found_keywords = set(results.keys())
-                        not_found = [kw for kw in st.session_state.keywords_list if kw not in found_keywords]
-                        
-                        if not_found:
-                            with st.expander(f"Keywords Not Found ({len(not_found)})"):
-                                st.write(", ".join(not_found))
-                    
-                    else:
-                        st.error("❌ No keywords were found in the PDF")
-                        st.info("💡 Try different keywords or check if the PDF contains searchable text")
-                        
-                        # Show all keywords that weren't found
-                        with st.expander("🔍 Searched Keywords"):
-                            st.write(", ".join(st.session_state.keywords_list))
-                
-                except Exception as e:
-                    st.error(f"❌ Error processing PDF: {str(e)}")
-                
-                finally:
-                    # Clean up temporary file
-                    try:
-                        os.unlink(tmp_file_path)
-                    except:
-                        pass
-                    
+                    st.session_state.search_job = dict(search, job_id=job.id)
+
+                if results is not None:
+                    # Keep showing these results on later reruns
+                    store_search_results(search, memo, results, search_metrics)
+
+            except JobQueueFull:
+                st.warning("Too many searches are running right now, please try again in a moment")
+            except Exception as e:
+                st.session_state.pop("last_search", None)
+                st.error(f"❌ Error processing PDF: {str(e)}")
+
+        # Background search of this session
+        collect_search_job()
+        if "search_job" in st.session_state:
+            if not search_button:
+                st.subheader("Results")
+            show_search_job()
+
+        # Results of the last search on the current upload, kept across reruns
+        last_search = st.session_state.get("last_search")
+        if uploaded_pdf is not None and last_search and last_search["file_id"] == get_upload_id(uploaded_pdf):
+            memo = st.session_state.search_memo.get(last_search["doc_key"])
+            if (
+                memo is not None
+                and last_search["results_key"] in memo["results"]
+                and "search_job" not in st.session_state
+            ):
+                if not search_button:
+                    st.subheader("Results")
+                show_results(
+                    memo["results"][last_search["results_key"]],
+                    last_search["keywords"],
+                    memo["text"],
+                    last_search["presence"]
+                )
+                if memo["results"][last_search["results_key"]]:
+                    show_highlight_export(uploaded_pdf, last_search)
+                show_diagnostics(last_search, memo["text"])
 
 
 if __name__ == "__main__":
@@ -1,31 +1,333 @@
 import fitz  # PyMuPDF
 import os
 import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
 
+try:
+    from .cache import ExtractionCache, hash_keywords, hash_pdf_bytes, hash_pdf_file
+    from .instrumentation import current_metrics
+    from .matcher import KeywordAggregate, KeywordMatcher, get_keyword_matcher
+    from .normalize import normalize_pages
+    from .textstore import SpillingPageText, TextStore, search_text_store, write_text_store
+except ImportError:  # imported as a top-level module by the Streamlit app
+    from cache import ExtractionCache, hash_keywords, hash_pdf_bytes, hash_pdf_file
+    from instrumentation import current_metrics
+    from matcher import KeywordAggregate, KeywordMatcher, get_keyword_matcher
+    from normalize import normalize_pages
+    from textstore import SpillingPageText, TextStore, search_text_store, write_text_store
+
+
+# Documents with fewer pages than this are always extracted serially,
+# since starting worker processes would cost more than it saves
+PARALLEL_MIN_PAGES = 64
+
+# Number of pages handed to a worker process at a time
+DEFAULT_CHUNK_SIZE = 32
+
+def open_pdf(pdf_path):
+    """
+    Opens a PDF document from a file path, or directly from its bytes
+    (e.g. an upload) without writing a temporary file
+    """
+    metrics = current_metrics()
+    start = time.perf_counter() if metrics is not None else None
+
+    if isinstance(pdf_path, (bytes, bytearray, memoryview)):
+        # A memoryview (e.g. of an upload buffer) is opened without a copy
+        doc = fitz.open(stream=pdf_path, filetype="pdf")
+    else:
+        doc = fitz.open(pdf_path)
+
+    if metrics is not None:
+        metrics.add_time("open", time.perf_counter() - start)
+    return doc
+
+
+# Pages to extract or search, as typed by the user
+class PageSelection:
+    """
+    Parsed page selection such as "1-30, 45, 50-" (1-based, inclusive;
+    an open range runs to the last page)
+    """
+
+    def __init__(self, selection):
+        self.text = selection
+        self.ranges = []
+        for part in selection.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            first, dash, last = part.partition("-")
+            try:
+                first = int(first) if first.strip() else 1
+                last = (int(last) if last.strip() else None) if dash else first
+            except ValueError:
+                raise ValueError(f"Invalid page selection '{selection}'")
+            if first < 1 or (last is not None and last < first):
+                raise ValueError(f"Invalid page range '{part}'")
+            self.ranges.append((first, last))
+        if not self.ranges:
+            raise ValueError(f"Invalid page selection '{selection}'")
+
+    def __str__(self):
+        return self.text
+
+    def pages(self, page_count):
+        """
+        Returns the selected page numbers that exist in a document, in order
+        """
+        selected = set()
+        for first, last in self.ranges:
+            last = page_count if last is None else min(last, page_count)
+            selected.update(range(first, last + 1))
+        return sorted(selected)
+
+
+def select_pages(pages, page_count):
+    """
+    Resolves a page selection (None for every page, a PageSelection or its
+    text, or page numbers) against a document's page count
+    Returns a sorted list of 1-based page numbers
+    """
+    if pages is None:
+        return list(range(1, page_count + 1))
+    if isinstance(pages, str):
+        pages = PageSelection(pages)
+    if isinstance(pages, PageSelection):
+        return pages.pages(page_count)
+    return sorted({int(page_num) for page_num in pages if 1 <= int(page_num) <= page_count})
+
+
+# Memory cap of a bounded-memory search
+class MemoryBudget:
+    """
+    Caps the page text a search holds in memory at max_chars characters
+    and/or max_mb MB. Only the page strings the search keeps are counted,
+    so searches sharing a process (e.g. app sessions) each get their own
+    budget. Page text collected past the cap is spilled to a temporary file
+    (see SpillingPageText).
+    Use one budget per search: it also records the peak size of the page
+    text it kept in memory (not the process's memory use).
+    """
+
+    def __init__(self, max_chars=None, max_mb=None):
+        if max_chars is None and max_mb is None:
+            raise ValueError("A memory budget needs max_chars or max_mb")
+        self.max_chars = max_chars
+        self.max_mb = max_mb
+        self.chars = 0
+        self.bytes = 0
+        self.peak_text_bytes = 0
+        self.spilled_pages = 0
+
+    def exceeded(self):
+        return (
+            (self.max_chars is not None and self.chars > self.max_chars)
+            or (self.max_mb is not None and self.bytes > self.max_mb * 1e6)
+        )
+
+    def collect(self, page_text, page_num, text):
+        """
+        Adds a page to a SpillingPageText, spilling it once over budget
+        """
+        page_text.add_page(page_num, text)
+        if page_text.spilled:
+            self.spilled_pages += 1
+            return
+        self.chars += len(text)
+        self.bytes += sys.getsizeof(text)
+        self.peak_text_bytes = max(self.peak_text_bytes, self.bytes)
+        if self.exceeded():
+            self.chars -= page_text.chars
+            self.bytes -= page_text.bytes
+            self.spilled_pages += len(page_text.pages)
+            page_text.spill()
+
+    def report(self):
+        """
+        Returns the budget and the page text held in memory, as a dictionary
+        """
+        return {
+            "max_chars": self.max_chars,
+            "max_mb": self.max_mb,
+            "spilled_pages": self.spilled_pages,
+            "peak_text_mb": round(self.peak_text_bytes / 1e6, 1),
+        }
+
+
+def _extract_page_text(page):
+    """
+    Extracts the text of a single page, falling back to text blocks
+    """
+    metrics = current_metrics()
+    start = time.perf_counter() if metrics is not None else None
+
+    # Extract raw text from page
+    text = page.get_text("text")  # layout-aware extraction
+
+    if metrics is not None:
+        fallback_start = time.perf_counter()
+        metrics.add_time("get_text", fallback_start - start)
+
+    if not text.strip():  # fallback if text empty (maybe scanned)
+        text = page.get_text("blocks")  # another strategy
+        text = " ".join([block[4] for block in text if isinstance(block[4], str)])
+        if metrics is not None:
+            metrics.add_time("blocks_fallback", time.perf_counter() - fallback_start)
+            metrics.count("fallback_pages")
+
+    if metrics is not None:
+        metrics.count("pages")
+        metrics.count("chars", len(text))
+    return text
+
+
+# Document opened once by each extraction worker process
+_worker_pdf = None
+
+
+def _init_extraction_worker(pdf_path):
+    """
+    Worker process initializer: receives the path or bytes of the PDF once,
+    instead of once per chunk
+    """
+    global _worker_pdf
+    _worker_pdf = pdf_path
+
+
+def _extract_pages(page_nums):
+    """
+    Worker process task: opens the document itself and extracts the given
+    pages (1-based page numbers)
+    Returns a list of (page_num, text) tuples
+    """
+    doc = open_pdf(_worker_pdf)
+    try:
+        return [(page_num, _extract_page_text(doc[page_num - 1])) for page_num in page_nums]
+    finally:
+        doc.close()
+
 
 # function to extract text from a PDF file
-def extract_text_from_pdf(pdf_path):
+def extract_text_from_pdf(pdf_path, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, cache=None, pages=None):
     """
     Extracts all text (including from tables & multi-columns) from a PDF file.
     Ignores plots/graphics, since they usually don't contain text.
+    pdf_path can also be the bytes of the PDF.
+    Large documents are split into chunks of chunk_size pages and extracted
+    by a pool of worker processes (workers=None uses every CPU core,
+    workers=1 forces the serial path).
+    If an ExtractionCache is given, a previously extracted document is
+    returned from the cache without opening it (as a read-only TextStore
+    mapping of the same shape).
+    pages restricts extraction to a page selection (see select_pages); the
+    other pages are never loaded, and partial extractions are not cached.
     Returns a dictionary with page numbers as keys and extracted text as values.
     """
-    doc = fitz.open(pdf_path)
-    all_text = {}
+    if cache is not None:
+        cache_key = get_pdf_cache_key(pdf_path)
+        all_text = cache.get(cache_key)
+        _count_cache_lookup(all_text is not None)
+        if all_text is None:
+            if pages is not None:
+                return extract_text_from_pdf(pdf_path, workers, chunk_size, pages=pages)
+            all_text = extract_text_from_pdf(pdf_path, workers, chunk_size)
+            cache.put(cache_key, all_text)
+        if pages is not None:
+            return {page_num: all_text[page_num] for page_num in select_pages(pages, len(all_text))}
+        return all_text
+
+    doc = open_pdf(pdf_path)
+    page_nums = select_pages(pages, doc.page_count)
+
+    workers = _extraction_workers(workers, len(page_nums), chunk_size)
+    if workers <= 1:
+        all_text = {}
+        for page_num in page_nums:
+            all_text[page_num] = _extract_page_text(doc[page_num - 1])
+        doc.close()
+        return all_text
 
-    for page_num, page in enumerate(doc, start=1):
-        # Extract raw text from page
-        text = page.get_text("text")  # layout-aware extraction
+    doc.close()
+    return _extract_text_parallel(pdf_path, page_nums, workers, chunk_size)
 
-        if not text.strip():  # fallback if text empty (maybe scanned)
-            text = page.get_text("blocks")  # another strategy
-            text = " ".join([block[4] for block in text if isinstance(block[4], str)])
 
-        all_text[page_num] = text
+def _count_cache_lookup(hit):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.count("cache_hits" if hit else "cache_misses")
+
+
+def get_pdf_cache_key(pdf_path):
+    """
+    Extraction cache key: hash of the PDF bytes and the PyMuPDF version
+    """
+    if isinstance(pdf_path, (bytes, bytearray, memoryview)):
+        return hash_pdf_bytes(pdf_path, fitz.VersionBind)
+    return hash_pdf_file(pdf_path, fitz.VersionBind)
 
-    doc.close()
-    return all_text
+
+def _extraction_workers(workers, page_count, chunk_size):
+    """
+    Number of worker processes to extract page_count pages with; 1 means
+    the serial path (also used below PARALLEL_MIN_PAGES)
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if page_count < PARALLEL_MIN_PAGES:
+        return 1
+    return max(1, min(workers, -(-page_count // max(chunk_size, 1))))
+
+
+def _extract_text_parallel(pdf_path, page_nums, workers, chunk_size):
+    """
+    Extracts page chunks in worker processes and merges them in page order
+    """
+    return dict(_iter_page_text_parallel(pdf_path, page_nums, workers, chunk_size))
+
+
+def _iter_page_text_parallel(pdf_path, page_nums, workers, chunk_size):
+    """
+    Yields (page_num, text) for the given pages in page order, extracted a
+    chunk at a time by worker processes. At most two chunks per worker are
+    extracted ahead of the caller; closing the generator cancels the rest.
+    """
+    chunks = [page_nums[start:start + chunk_size] for start in range(0, len(page_nums), chunk_size)]
+    if isinstance(pdf_path, memoryview):
+        # Sent to the worker processes, which need a picklable copy
+        pdf_path = bytes(pdf_path)
+
+    metrics = current_metrics()
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_extraction_worker,
+        initargs=(pdf_path,)
+    )
+    pending = deque()
+    next_chunk = 0
+    try:
+        while pending or next_chunk < len(chunks):
+            while next_chunk < len(chunks) and len(pending) < workers * 2:
+                pending.append(executor.submit(_extract_pages, chunks[next_chunk]))
+                next_chunk += 1
+            start = time.perf_counter() if metrics is not None else None
+            # Chunks are collected in submission order, i.e. page order
+            chunk = pending.popleft().result()
+            if metrics is not None:
+                # Pages are extracted in the worker processes, outside this context
+                metrics.add_time("parallel_extraction", time.perf_counter() - start)
+                metrics.count("pages", len(chunk))
+                metrics.count("chars", sum(len(text) for _, text in chunk))
+            yield from chunk
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown()
 
 
 # Function save the extracted text to a .txt file
@@ -36,32 +338,256 @@ def save_text_to_file(all_text, output_path):
     print(f"Extracted text saved to: {output_path}")
 
 
+# Function to save the extracted text in the compact binary format
+def save_text_store(all_text, output_path):
+    """
+    Saves the extracted text as a text store (see textstore.py), which can be
+    reloaded instantly with TextStore(output_path) and searched directly
+    """
+    write_text_store(all_text, output_path)
+    print(f"Extracted text saved to: {output_path}")
+
+
 # Function to count keywords in the extracted text
-def search_keywords_in_text(all_text, keywords):
+def search_keywords_in_text(all_text, keywords, with_offsets=False, normalize=False, presence=False):
     """
     Searches for keywords in the extracted text
+    Each page is lowercased and scanned once for the whole keyword list
+    With with_offsets=True, each result also lists the (page_num, start, end)
+    character offsets of its matches, found in the same pass
+    With normalize=True, pages and keywords are normalized first (ligatures,
+    hyphenation, line breaks, see normalize.py); pages may be passed already
+    normalized by normalize_pages, so this cost is paid once per document
+    With presence=True, only the first match of each keyword is looked for
+    (see iter_search_pdf)
     Returns a dictionary with keyword matches and their counts
     """
-    result = {}
+    metrics = current_metrics()
+    if metrics is None or presence:
+        # Presence searches are measured page by page
+        return _search_keywords_in_text(all_text, keywords, with_offsets, normalize, presence)
+
+    with metrics.stage("search"):
+        results = _search_keywords_in_text(all_text, keywords, with_offsets, normalize, presence)
+    metrics.count("matches", sum(info["count"] for info in results.values()))
+    return results
+
+
+def _search_keywords_in_text(all_text, keywords, with_offsets, normalize, presence):
+    if presence:
+        aggregate = KeywordAggregate(keywords, with_offsets)
+        for _ in _iter_search_pages(all_text.items(), get_keyword_matcher(keywords, normalize), aggregate, True):
+            pass
+        return aggregate.results()
+
+    if isinstance(all_text, TextStore):
+        # Memory-mapped text: one pass over the whole buffer
+        return search_text_store(all_text, get_keyword_matcher(keywords, normalize), with_offsets)
+
+    matcher = get_keyword_matcher(keywords, normalize)
+    aggregate = KeywordAggregate(keywords, with_offsets)
+
+    for page_num, text in all_text.items():
+        if with_offsets:
+            aggregate.add_page(page_num, *matcher.find(text))
+        else:
+            aggregate.add_page(page_num, matcher.count(text))
 
-    for keyword in keywords:
-        keyword_lower = keyword.lower()
-        count_total = 0
-        pages_found = []
+    return aggregate.results()
 
-        for page_num, text in all_text.items():
-            count = text.lower().count(keyword_lower)
-            if count > 0:
-                count_total += count
-                # Record the page number where the keyword was found
-                # page_num = int(page_num) - 1  # if the document has a page 0
-                page_num = int(page_num)  # if the document starts at page 1
-                pages_found.append(page_num)
 
-        if count_total > 0:
-            result[keyword] = {"count": count_total, "pages": pages_found}
+# Characters of context shown on each side of a keyword match
+SNIPPET_CONTEXT = 60
 
-    return result
+# Default maximum number of snippets produced per keyword
+MAX_SNIPPETS_PER_KEYWORD = 20
+
+
+def iter_keyword_snippets(all_text, offsets, context=SNIPPET_CONTEXT):
+    """
+    Lazily yields keyword-in-context snippets for the (page_num, start, end)
+    offsets of a keyword, as (page_num, before, match, after) tuples
+    Whitespace is collapsed so snippets read as one line
+    """
+    for page_num, start, end in offsets:
+        text = all_text[page_num]
+        before = " ".join(text[max(start - context, 0):start].split())
+        after = " ".join(text[end:end + context].split())
+        yield page_num, before, text[start:end], after
+
+
+def get_keyword_snippets(all_text, offsets, limit=MAX_SNIPPETS_PER_KEYWORD, context=SNIPPET_CONTEXT):
+    """
+    Returns at most limit keyword-in-context snippets (see iter_keyword_snippets)
+    Only the returned snippets are built, whatever the number of matches
+    """
+    return list(islice(iter_keyword_snippets(all_text, offsets, context), limit))
+
+
+# Function to extract and search a PDF one page at a time
+def iter_search_pdf(
+    pdf_path, keywords, aggregate=None, cache=None, cache_key=None, normalize=False, pages=None, presence=False,
+    budget=None, page_cache=None, collect=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE
+):
+    """
+    Streaming version of process_pdf_with_keywords.
+    keywords can also be a KeywordMatcher that is reused across documents.
+    Yields (page_num, text, hits) tuples as each page is extracted, where hits
+    is a {keyword: count} dictionary for that page.
+    If a KeywordAggregate is given, it is updated before each page is yielded,
+    so callers can show progressive results and drop the page text
+    (match offsets are recorded too if the aggregate has with_offsets).
+    If an ExtractionCache is given, cached documents are searched without
+    opening them, and newly extracted documents are added to the cache
+    (cache_key can be given if the caller already hashed the document).
+    If collect is given (a dictionary, or a SpillingPageText with a
+    MemoryBudget), the text of every searched page is kept in it; it is
+    also what gets cached, so the page text is only held once.
+    With a MemoryBudget, the pages kept (for collect or for the cache) are
+    spilled to disk once over budget.
+    With normalize=True, each page is normalized before matching.
+    pages restricts the search to a page selection (see select_pages); the
+    other pages are never extracted.
+    Large documents are extracted by a pool of worker processes, chunk_size
+    pages at a time, and still searched in page order (workers as in
+    extract_text_from_pdf; workers=1 forces the serial path).
+    With presence=True, only the first match of each keyword is looked for:
+    its count is 1 and its pages list the first page where it was found,
+    and no further page is extracted once every keyword has been found.
+    With a PageHitCache (for the same keywords and options), a page whose
+    text was already searched reuses its hits instead of being searched
+    again (not with presence=True).
+    The aggregate's page_count is the number of pages selected for the search.
+    """
+    matcher = keywords if isinstance(keywords, KeywordMatcher) else get_keyword_matcher(keywords, normalize)
+    cached_text = None
+    extracted_text = None
+    doc = None
+    parallel_texts = None
+
+    if cache is not None:
+        if cache_key is None:
+            cache_key = get_pdf_cache_key(pdf_path)
+        cached_text = cache.get(cache_key)
+        _count_cache_lookup(cached_text is not None)
+        # Only complete documents are cached
+        if cached_text is None and pages is None:
+            if collect is not None:
+                extracted_text = collect
+            else:
+                extracted_text = SpillingPageText() if budget is not None else {}
+
+    if cached_text is not None:
+        page_nums = select_pages(pages, len(cached_text))
+        page_texts = ((page_num, cached_text[page_num]) for page_num in page_nums)
+    else:
+        doc = open_pdf(pdf_path)
+        page_nums = select_pages(pages, doc.page_count)
+        workers = _extraction_workers(workers, len(page_nums), chunk_size)
+        if workers > 1:
+            # The worker processes open the document themselves
+            doc.close()
+            doc = None
+            page_texts = parallel_texts = _iter_page_text_parallel(pdf_path, page_nums, workers, chunk_size)
+        else:
+            page_texts = _iter_page_text(doc, page_nums)
+    if collect is not None or extracted_text is not None:
+        page_texts = _collect_page_text(page_texts, collect if collect is not None else extracted_text, budget)
+
+    if aggregate is not None:
+        aggregate.page_count = len(page_nums)
+
+    searched = 0
+    try:
+        for page in _iter_search_pages(page_texts, matcher, aggregate, presence, page_cache):
+            searched += 1
+            yield page
+        if doc is not None:
+            doc.close()
+            doc = None
+        if extracted_text is not None and searched == len(page_nums):
+            cache.put(cache_key, extracted_text.finish() if budget is not None else extracted_text)
+    finally:
+        if parallel_texts is not None:
+            # Stops the worker processes if the search ended early
+            parallel_texts.close()
+        if doc is not None:
+            doc.close()
+        if budget is not None and extracted_text is not None and extracted_text is not collect:
+            extracted_text.close()
+
+
+def _iter_search_pages(page_texts, matcher, aggregate=None, presence=False, page_cache=None):
+    """
+    Searches (page_num, text) pairs with a matcher, updating the aggregate
+    Yields (page_num, text, hits) tuples (see iter_search_pdf)
+    """
+    with_offsets = aggregate is not None and aggregate.with_offsets
+    found = set()
+    metrics = current_metrics()
+
+    for page_num, text in page_texts:
+        start = time.perf_counter() if metrics is not None else None
+        if presence:
+            first = matcher.find_first(text, found)
+            hits = {keyword: 1 for keyword in first}
+            found.update(first)
+            if aggregate is not None:
+                aggregate.add_page(page_num, hits, {keyword: [span] for keyword, span in first.items()})
+        else:
+            cached = None
+            if page_cache is not None:
+                digest, cached = page_cache.get(text, with_offsets)
+            if cached is not None:
+                # Same text as a page already searched
+                hits, spans = cached
+                if metrics is not None:
+                    metrics.count("duplicate_pages")
+            elif with_offsets:
+                hits, spans = matcher.find(text)
+            else:
+                hits, spans = matcher.count(text), None
+            if page_cache is not None and cached is None:
+                page_cache.put(digest, hits, spans)
+            if aggregate is not None:
+                aggregate.add_page(page_num, hits, spans)
+        if metrics is not None:
+            metrics.add_time("search", time.perf_counter() - start)
+            metrics.count("matches", sum(hits.values()))
+        yield page_num, text, hits
+
+        if presence and len(found) == len(set(matcher.keywords)):
+            # Every keyword has been found: stop extracting pages
+            break
+
+
+def _iter_page_text(doc, page_nums):
+    """
+    Yields (page_num, text) for the given pages of an open document
+    """
+    for page_num in page_nums:
+        yield page_num, _extract_page_text(doc[page_num - 1])
+
+
+def _collect_page_text(page_texts, collect, budget=None):
+    """
+    Passes (page_num, text) pairs through, storing each page in collect (a
+    dictionary, or a SpillingPageText with a MemoryBudget)
+    """
+    for page_num, text in page_texts:
+        if budget is not None:
+            budget.collect(collect, page_num, text)
+        else:
+            collect[page_num] = text
+        yield page_num, text
+
+
+def get_pdf_page_count(pdf_path):
+    """
+    Returns the number of pages in a PDF file
+    """
+    with open_pdf(pdf_path) as doc:
+        return doc.page_count
 
 
 def get_default_keywords():
@@ -104,16 +630,30 @@ def get_default_keywords():
     # return ["Discrimination", "neutrophil", "phagocytosis"]
 
 
-def process_pdf_with_keywords(pdf_path, keywords):
+def process_pdf_with_keywords(pdf_path, keywords, cache=None, normalize=False, pages=None, presence=False):
     """
     Complete workflow: extract text from PDF and search for keywords
+    If an ExtractionCache is given, a repeated document skips extraction
+    pages restricts both steps to a page selection (see select_pages)
+    With presence=True, extraction stops once every keyword has been found
+    (see iter_search_pdf), so the text only holds the pages searched
     Returns tuple: (extracted_text_dict, keyword_results_dict)
     """
+    if presence:
+        # Extract and search together, so extraction can stop early
+        aggregate = KeywordAggregate(keywords)
+        pdf_text = {}
+        for page_num, text, _ in iter_search_pdf(
+            pdf_path, keywords, aggregate, cache=cache, normalize=normalize, pages=pages, presence=True
+        ):
+            pdf_text[page_num] = text
+        return pdf_text, aggregate.results()
+
     # Step 1: Extract text from PDF
-    pdf_text = extract_text_from_pdf(pdf_path)
+    pdf_text = extract_text_from_pdf(pdf_path, cache=cache, pages=pages)
 
     # Step 2: Search for keywords
-    keyword_results = search_keywords_in_text(pdf_text, keywords)
+    keyword_results = search_keywords_in_text(pdf_text, keywords, normalize=normalize)
 
     return pdf_text, keyword_results
 
@@ -132,13 +672,28 @@ def save_keywords(keywords_list):
     """
     try:
         filepath = get_keywords_file_path()
-        with open(filepath, "w", encoding="utf-8") as f:
+        # Write a temporary file and swap it in, so a failed save keeps the old list
+        temp_path = filepath.with_name(filepath.name + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
             json.dump(keywords_list, f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, filepath)
         return True
     except Exception as e:
         return False
 
 
+def read_keywords_file(filepath):
+    """
+    Read a keywords file (a JSON list of keywords)
+    Raises an error if the file is missing or malformed
+    """
+    with open(filepath, "r", encoding="utf-8") as f:
+        keywords = json.load(f)
+    if not isinstance(keywords, list) or not all(isinstance(kw, str) for kw in keywords):
+        raise ValueError(f"{filepath} is not a JSON list of keywords")
+    return keywords
+
+
 def load_keywords():
     """
     Load keywords from file, return default if file doesn't exist
@@ -146,8 +701,7 @@ def load_keywords():
     try:
         filepath = get_keywords_file_path()
         if filepath.exists():
-            with open(filepath, "r", encoding="utf-8") as f:
-                return json.load(f)
+            return read_keywords_file(filepath)
     except:
         pass
 
@@ -184,6 +738,6 @@ if __name__ == "__main__":
             print("Keyword Matches Found:")
             for keyword, info in keyword_results.items():
                 pages = ", ".join(map(str, info["pages"]))
-                print(f"'{keyword}': found {info["count"]} times on pages: {pages}")
+                print(f"'{keyword}': found {info['count']} times on pages: {pages}")
         else:
             print("No keyword matches found.")
@@ -0,0 +1,343 @@
+# batch.py
+# Headless search over many PDFs. Only depends on the backend, so it never
+# imports streamlit or pandas.
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack
+from functools import partial
+from multiprocessing import Manager
+from pathlib import Path
+
+try:
+    from .backend import KeywordAggregate, KeywordMatcher, iter_search_pdf
+    from .cache import hash_pdf_bytes
+    from .dedup import DocumentDedup, PageHitCache
+    from .textstore import TEXT_STORE_SUFFIX
+except ImportError:
+    from backend import KeywordAggregate, KeywordMatcher, iter_search_pdf
+    from cache import hash_pdf_bytes
+    from dedup import DocumentDedup, PageHitCache
+    from textstore import TEXT_STORE_SUFFIX
+
+
+# Documents queued per worker process, so the input list is never fully submitted
+TASKS_PER_WORKER = 4
+
+
+def iter_pdf_paths(inputs, text_stores=False):
+    """
+    Yields the PDF files named by the inputs: files, directories
+    (searched recursively) or glob patterns
+    With text_stores=True, directories also yield their text stores
+    (TEXT_STORE_SUFFIX files)
+    """
+    suffixes = (".pdf", TEXT_STORE_SUFFIX) if text_stores else (".pdf",)
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            for pdf_path in sorted(path.rglob("*")):
+                if pdf_path.suffix.lower() in suffixes and pdf_path.is_file():
+                    yield str(pdf_path)
+        elif path.is_file():
+            yield str(path)
+        else:
+            for match in sorted(glob.iglob(item, recursive=True)):
+                if os.path.isfile(match):
+                    yield match
+
+
+def iter_completed(new_executor, fn, items, max_pending, failed_record):
+    """
+    Runs fn over items in a pool of worker processes made by new_executor,
+    and yields the results as they complete, with at most max_pending tasks
+    submitted at any time.
+    If a worker process dies, every task then in the pool yields
+    failed_record(item, error) instead, and the remaining items are run in a
+    new pool.
+    """
+    executor = new_executor()
+    pending = {}
+    try:
+        for item in items:
+            broken = False
+            if len(pending) >= max_pending:
+                broken = yield from _iter_done(pending, failed_record)
+            if not broken:
+                try:
+                    pending[executor.submit(fn, item)] = item
+                    continue
+                except BrokenProcessPool:
+                    pass
+            # The tasks left in the broken pool fail too
+            yield from _iter_done(pending, failed_record, ALL_COMPLETED)
+            executor.shutdown()
+            executor = new_executor()
+            pending[executor.submit(fn, item)] = item
+
+        while pending:
+            yield from _iter_done(pending, failed_record)
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown()
+
+
+def _iter_done(pending, failed_record, return_when=FIRST_COMPLETED):
+    """
+    Waits for tasks of iter_completed (a future -> item dictionary) and
+    yields the results of those done
+    Returns True if the worker pool broke
+    """
+    done, _ = wait(pending, return_when=return_when)
+    broken = False
+    for future in done:
+        item = pending.pop(future)
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            broken = True
+            result = failed_record(item, e)
+        yield result
+    return broken
+
+
+# Keyword matcher (and page hits) built once by each worker process
+_worker_keywords = None
+_worker_matcher = None
+_worker_page_cache = None
+_worker_options = {}
+# Content hash -> path of the first document read with it, shared by the
+# worker processes of a run_batch run
+_worker_claims = None
+
+
+def _init_batch_worker(keywords, normalize=False, pages=None, presence=False, dedup=True, claims=None):
+    global _worker_keywords, _worker_matcher, _worker_page_cache, _worker_options, _worker_claims
+    _worker_keywords = keywords
+    _worker_claims = claims
+    _worker_matcher = KeywordMatcher(keywords, normalize)
+    # Shared by the worker's documents, so boilerplate pages are searched once per worker
+    _worker_page_cache = PageHitCache() if dedup and not presence else None
+    # Documents are already searched in parallel: extract each one serially
+    _worker_options = {"pages": pages, "presence": presence, "workers": 1}
+
+
+def search_document(pdf_path, pdf_bytes=None):
+    """
+    Worker process task: searches one PDF with the worker's keyword list
+    (from pdf_bytes if the caller already read the file)
+    Returns a result record; errors are reported in the record, not raised
+    """
+    try:
+        aggregate = KeywordAggregate(_worker_keywords)
+        source = pdf_path if pdf_bytes is None else pdf_bytes
+        duplicate_pages = _worker_page_cache.duplicate_pages if _worker_page_cache is not None else 0
+        for _ in iter_search_pdf(source, _worker_matcher, aggregate, page_cache=_worker_page_cache, **_worker_options):
+            pass
+        record = {
+            "path": pdf_path,
+            "page_count": aggregate.page_count,
+            "results": aggregate.results(),
+        }
+        if _worker_page_cache is not None:
+            record["duplicate_pages"] = _worker_page_cache.duplicate_pages - duplicate_pages
+        return record
+    except Exception as e:
+        return {"path": pdf_path, "error": f"{type(e).__name__}: {e}"}
+
+
+def search_unique_document(pdf_path):
+    """
+    Worker process task for deduplicated runs: reads the PDF once, hashes
+    its bytes and searches them, unless another task already claimed a
+    document with the same hash
+    Returns the record of search_document with its "digest", or a
+    {"path", "digest", "duplicate_of"} record for a duplicate
+    """
+    try:
+        with open(pdf_path, "rb") as f:
+            pdf_bytes = f.read()
+    except OSError as e:
+        return {"path": pdf_path, "error": f"{type(e).__name__}: {e}"}
+    digest = hash_pdf_bytes(pdf_bytes)
+    original = _worker_claims.setdefault(digest, pdf_path)
+    if original != pdf_path:
+        return {"path": pdf_path, "digest": digest, "duplicate_of": original}
+    return dict(search_document(pdf_path, pdf_bytes), digest=digest)
+
+
+# Writers for the per-document results
+class JsonlWriter:
+    """
+    Writes one JSON object per document
+    """
+
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, record):
+        self.f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.f.flush()
+
+
+class CsvWriter:
+    """
+    Writes one row per document and keyword found (a single row for
+    documents without matches or with an error)
+    """
+
+    fieldnames = ["path", "page_count", "keyword", "count", "pages", "error", "duplicate_of"]
+
+    def __init__(self, f):
+        self.f = f
+        self.writer = csv.DictWriter(f, fieldnames=self.fieldnames)
+        self.writer.writeheader()
+
+    def write(self, record):
+        row = {
+            "path": record["path"],
+            "page_count": record.get("page_count"),
+            "error": record.get("error"),
+            "duplicate_of": record.get("duplicate_of"),
+        }
+        results = record.get("results")
+        if not results:
+            self.writer.writerow(row)
+        else:
+            for keyword, info in results.items():
+                self.writer.writerow(dict(
+                    row,
+                    keyword=keyword,
+                    count=info["count"],
+                    pages=" ".join(map(str, info["pages"])),
+                ))
+        self.f.flush()
+
+
+WRITERS = {"jsonl": JsonlWriter, "csv": CsvWriter}
+
+
+def run_batch(inputs, keywords, output, workers=None, normalize=False, pages=None, presence=False, dedup=True):
+    """
+    Searches every PDF named by inputs across a pool of worker processes,
+    streaming each document's record to the output writer as it finishes.
+    Failed documents are recorded and do not stop the run, including those
+    lost when a worker process dies (the pool is then replaced).
+    With normalize=True, pages are normalized before matching; pages and
+    presence restrict each search as in iter_search_pdf.
+    With dedup=True, a document with the same bytes as an earlier one is not
+    searched again: its record has "duplicate_of" set to the path of the
+    first one, and its page count (see DocumentDedup). The worker processes
+    hash each file as they read it, and claim its hash in a table shared
+    through a multiprocessing manager. Pages with the same text reuse the
+    hits of the first one (see PageHitCache).
+    Returns a summary dictionary with throughput, failures and dedup savings.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * TASKS_PER_WORKER
+
+    summary = new_summary()
+    start_time = time.perf_counter()
+    document_dedup = DocumentDedup() if dedup else None
+
+    with ExitStack() as stack:
+        claims = stack.enter_context(Manager()).dict() if dedup else None
+        new_executor = partial(
+            ProcessPoolExecutor,
+            max_workers=workers,
+            initializer=_init_batch_worker,
+            initargs=(keywords, normalize, pages, presence, dedup, claims)
+        )
+
+        def failed_record(pdf_path, error):
+            record = {"path": pdf_path, "error": f"{type(error).__name__}: {error}"}
+            if claims is not None:
+                # The worker may have claimed the document's hash before it died
+                for digest, path in claims.items():
+                    if path == pdf_path:
+                        record["digest"] = digest
+            return record
+
+        task = search_unique_document if dedup else search_document
+        for record in iter_completed(new_executor, task, iter_pdf_paths(inputs), max_pending, failed_record):
+            digest = record.pop("digest", None)
+            if digest is None:
+                records = [record]
+            elif "duplicate_of" in record:
+                records = document_dedup.add_duplicate(record["path"], digest)
+            else:
+                records = [record] + document_dedup.finish(digest, record)
+            for finished in records:
+                output.write(finished)
+                add_to_summary(summary, finished)
+
+    return finish_summary(summary, time.perf_counter() - start_time)
+
+
+def new_summary():
+    return {
+        "documents": 0,
+        "pages": 0,
+        "failed": [],
+        "duplicate_documents": 0,
+        "duplicate_document_pages": 0,
+        "duplicate_pages": 0,
+    }
+
+
+def add_to_summary(summary, record):
+    """
+    Counts one document record in a run summary; only the pages actually
+    searched count towards pages (and pages/sec), not those of duplicates
+    """
+    summary["documents"] += 1
+    if "error" in record:
+        summary["failed"].append({"path": record["path"], "error": record["error"]})
+    elif "duplicate_of" not in record:
+        summary["pages"] += record["page_count"]
+
+    if "duplicate_of" in record:
+        summary["duplicate_documents"] += 1
+        summary["duplicate_document_pages"] += record.get("page_count") or 0
+    else:
+        summary["duplicate_pages"] += record.get("duplicate_pages", 0)
+
+
+def finish_summary(summary, elapsed):
+    """
+    Adds the run time and throughput to a run summary
+    """
+    summary["seconds"] = round(elapsed, 3)
+    summary["docs_per_sec"] = round(summary["documents"] / elapsed, 2) if elapsed else None
+    summary["pages_per_sec"] = round(summary["pages"] / elapsed, 2) if elapsed else None
+    return summary
+
+
+def print_summary(summary, file=sys.stderr):
+    """
+    Prints the end of run report
+    """
+    print("=" * 50, file=file)
+    print(
+        f"Searched {summary['documents']} documents ({summary['pages']} pages) "
+        f"in {summary['seconds']}s: {summary['docs_per_sec']} docs/sec, "
+        f"{summary['pages_per_sec']} pages/sec",
+        file=file,
+    )
+    if summary["duplicate_documents"] or summary["duplicate_pages"]:
+        print(
+            f"Skipped {summary['duplicate_documents']} duplicate documents "
+            f"({summary['duplicate_document_pages']} pages) and reused the hits of "
+            f"{summary['duplicate_pages']} duplicate pages",
+            file=file,
+        )
+    if summary["failed"]:
+        print(f"{len(summary['failed'])} documents failed:", file=file)
+        for failure in summary["failed"]:
+            print(f"  {failure['path']}: {failure['error']}", file=file)
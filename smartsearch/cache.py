@@ -0,0 +1,150 @@
+# cache.py
+import hashlib
+import os
+from pathlib import Path
+from struct import error as struct_error
+
+try:
+    import fcntl
+except ImportError:  # no file locking on Windows, writes are still atomic
+    fcntl = None
+
+try:
+    from .textstore import TextStore, write_text_store
+except ImportError:
+    from textstore import TextStore, write_text_store
+
+
+# Cache entries are text store files (see textstore.py)
+ENTRY_SUFFIX = ".sstx"
+
+# Default size limit of the extraction cache
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Files are hashed in blocks of this size, so large PDFs are never fully read in memory
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def get_cache_dir_path():
+    """
+    Get the path of the extraction cache directory in user's home directory
+    (next to the keywords file)
+    """
+    return Path.home() / ".smart_search_cache"
+
+
+def hash_pdf_bytes(pdf_bytes, version=""):
+    """
+    Content hash of a PDF, combined with the extractor version
+    """
+    digest = hashlib.sha256(version.encode("utf-8") + b"\0")
+    digest.update(pdf_bytes)
+    return digest.hexdigest()
+
+
+def hash_pdf_file(pdf_path, version=""):
+    """
+    Content hash of a PDF file, combined with the extractor version
+    """
+    digest = hashlib.sha256(version.encode("utf-8") + b"\0")
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_keywords(keywords):
+    """
+    Hash of a keyword list, used to memoize search results
+    """
+    digest = hashlib.sha256()
+    for keyword in keywords:
+        digest.update(keyword.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+# On-disk cache of extracted page text, keyed by content hash
+class ExtractionCache:
+    """
+    Stores the {page_num: text} dictionaries returned by extract_text_from_pdf
+    as memory-mapped text stores.
+    Entries are written atomically (temporary file + rename), so several app
+    sessions can share the cache. The least recently used entries are evicted
+    once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir) if cache_dir else get_cache_dir_path()
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, key):
+        return self.cache_dir / f"{key}{ENTRY_SUFFIX}"
+
+    def get(self, key):
+        """
+        Return the cached page text for key as a read-only TextStore mapping,
+        or None if it is not cached
+        """
+        path = self._entry_path(key)
+        try:
+            store = TextStore(path)
+            # Mark as recently used
+            os.utime(path)
+        except (OSError, ValueError, struct_error):
+            # Missing, evicted by another session, or unreadable
+            return None
+        return store
+
+    def put(self, key, all_text):
+        """
+        Store the page text for key and evict old entries if needed
+        """
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # Written under a temporary name and renamed
+            write_text_store(all_text, self._entry_path(key))
+            self.evict()
+        except OSError:
+            # The cache is an optimization; never fail the search because of it
+            return False
+        return True
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in max_bytes
+        """
+        with open(self.cache_dir / ".lock", "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            entries = []
+            total_size = 0
+            for path in self.cache_dir.glob(f"*{ENTRY_SUFFIX}"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+
+            # Oldest access time first
+            entries.sort()
+            for _, size, path in entries:
+                if total_size <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                except OSError:
+                    # Already evicted, or still mapped on Windows
+                    pass
+                total_size -= size
+
+    def clear(self):
+        """
+        Remove every cached entry
+        """
+        for path in self.cache_dir.glob(f"*{ENTRY_SUFFIX}"):
+            try:
+                path.unlink()
+            except OSError:
+                pass
@@ -0,0 +1,118 @@
+# dedup.py
+# Duplicate detection for searches over repetitive material: pages with the
+# same text reuse the keyword hits found on the first one, and batch runs
+# search documents with the same bytes only once.
+import hashlib
+from collections import OrderedDict
+
+
+# Unique pages whose hits are remembered by a PageHitCache
+DEFAULT_PAGE_CACHE_SIZE = 10000
+
+
+def page_digest(text):
+    """
+    Fast content hash of a page's text
+    """
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+# Keyword hits of pages already searched with the same matcher
+class PageHitCache:
+    """
+    Maps page text hashes to the (hits, spans) found on that text, so an
+    identical page (repeated consent form, shared appendix...) is not
+    searched again. Only the text the matcher sees is hashed, so reused hits
+    and offsets are exactly those a new search would find.
+    Use one cache per keyword matcher; the oldest pages are forgotten past
+    max_pages. Counts pages, duplicate pages and the characters not searched.
+    """
+
+    def __init__(self, max_pages=DEFAULT_PAGE_CACHE_SIZE):
+        self.max_pages = max_pages
+        self._hits = OrderedDict()
+        self.pages = 0
+        self.duplicate_pages = 0
+        self.duplicate_chars = 0
+
+    def get(self, text, with_spans=False):
+        """
+        Returns (digest, found): the hash of the text, and the (hits, spans)
+        of a page with the same text seen before, or None (also if spans are
+        needed but were not recorded)
+        """
+        digest = page_digest(text)
+        self.pages += 1
+        found = self._hits.get(digest)
+        if found is None or (with_spans and found[1] is None):
+            return digest, None
+        self._hits.move_to_end(digest)
+        self.duplicate_pages += 1
+        self.duplicate_chars += len(text)
+        return digest, found
+
+    def put(self, digest, hits, spans=None):
+        self._hits[digest] = (hits, spans)
+        self._hits.move_to_end(digest)
+        if len(self._hits) > self.max_pages:
+            self._hits.popitem(last=False)
+
+    def stats(self):
+        return {
+            "pages": self.pages,
+            "duplicate_pages": self.duplicate_pages,
+            "duplicate_chars": self.duplicate_chars,
+        }
+
+
+# Document-level dedup of a batch run
+class DocumentDedup:
+    """
+    Tracks the content hash of every document of a run. The first document
+    with a given hash is searched; later ones get a record pointing to it,
+    with "duplicate_of" set to its path and its page count (or error), as
+    soon as it is finished. Only that summary is kept per document, never
+    the results, so memory stays small however long the run.
+    """
+
+    def __init__(self):
+        self._originals = {}
+        self._finished = {}
+        self._waiting = {}
+
+    def add(self, path, digest):
+        """
+        Registers a document
+        Returns None if it must be searched, or else the list of duplicate
+        records ready to be written (empty while its original is running)
+        """
+        if digest not in self._originals:
+            self._originals[digest] = path
+            return None
+        return self.add_duplicate(path, digest)
+
+    def add_duplicate(self, path, digest):
+        """
+        Registers a document already known to be a duplicate (e.g. by the
+        worker that read it)
+        Returns its record in a list, or an empty list while its original is
+        running
+        """
+        finished = self._finished.get(digest)
+        if finished is None:
+            self._waiting.setdefault(digest, []).append(path)
+            return []
+        return [dict(path=path, **finished)]
+
+    def finish(self, digest, record):
+        """
+        Records the result of a searched document
+        Returns the records of its duplicates that were waiting for it
+        """
+        finished = {"duplicate_of": record["path"]}
+        if "error" in record:
+            finished["error"] = record["error"]
+        else:
+            finished["page_count"] = record["page_count"]
+        self._finished[digest] = finished
+        return [dict(path=path, **finished) for path in self._waiting.pop(digest, [])]
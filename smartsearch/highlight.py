@@ -0,0 +1,214 @@
+# highlight.py
+# Exports a copy of a PDF with every keyword hit highlighted. Each page is
+# laid out once (get_text("words"), about as fast as plain text extraction),
+# every keyword is found in a single matcher pass over that text, and the
+# hits are mapped to the boxes of their words and added as one highlight
+# annotation per keyword and page.
+import os
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from .backend import DEFAULT_CHUNK_SIZE, PARALLEL_MIN_PAGES, open_pdf, select_pages
+    from .instrumentation import current_metrics
+    from .matcher import get_keyword_matcher
+    from .normalize import normalize_text
+except ImportError:
+    from backend import DEFAULT_CHUNK_SIZE, PARALLEL_MIN_PAGES, open_pdf, select_pages
+    from instrumentation import current_metrics
+    from matcher import get_keyword_matcher
+    from normalize import normalize_text
+
+
+# Author of the highlight annotations
+ANNOTATION_TITLE = "Smart Search"
+
+
+def _page_layout(page):
+    """
+    Text of a page rebuilt from its words, which are separated by a space
+    within a line and by a "\n" between lines
+    Returns a tuple (text, starts, words): the offset where each word starts,
+    and a (start, end, line, x0, y0, x1, y1) tuple per word
+    """
+    parts = []
+    starts = []
+    words = []
+    offset = 0
+    line = None
+    for x0, y0, x1, y1, word, block_no, line_no, _ in page.get_text("words"):
+        if line is not None:
+            parts.append(" " if (block_no, line_no) == line else "\n")
+            offset += 1
+        line = (block_no, line_no)
+        parts.append(word)
+        starts.append(offset)
+        words.append((offset, offset + len(word), line, x0, y0, x1, y1))
+        offset += len(word)
+    return "".join(parts), starts, words
+
+
+def _hit_rects(starts, words, start, end):
+    """
+    Rectangles covering the characters [start, end), one per line
+    A hit on part of a word covers its share of the word's width
+    """
+    rects = []
+    current_line = None
+    for index in range(max(bisect_right(starts, start) - 1, 0), len(words)):
+        word_start, word_end, line, x0, y0, x1, y1 = words[index]
+        if word_start >= end:
+            break
+        if word_end <= start:
+            continue
+        if start > word_start or end < word_end:
+            char_width = (x1 - x0) / (word_end - word_start)
+            x0, x1 = (
+                x0 + (max(start, word_start) - word_start) * char_width,
+                x0 + (min(end, word_end) - word_start) * char_width,
+            )
+        if line == current_line:
+            rect = rects[-1]
+            rects[-1] = (min(rect[0], x0), min(rect[1], y0), max(rect[2], x1), max(rect[3], y1))
+        else:
+            rects.append((x0, y0, x1, y1))
+            current_line = line
+    return rects
+
+
+def find_page_highlights(page, matcher):
+    """
+    Finds every keyword hit of a page in one pass over its layout
+    Keywords sharing a pattern ("Bias" and "bias") share one highlight
+    Returns a list of (pattern_id, hit count, [rect, ...]) tuples
+    """
+    text, starts, words = _page_layout(page)
+    normalized = normalize_text(text) if matcher.normalize else None
+
+    pattern_spans = {}
+    counts = matcher.count_patterns(normalized.text if normalized is not None else text, pattern_spans)
+
+    highlights = []
+    for pattern_id, spans in pattern_spans.items():
+        rects = []
+        for start, end in spans:
+            if normalized is not None:
+                start, end = normalized.to_original(start, end)
+            rects.extend(_hit_rects(starts, words, start, end))
+        if rects:
+            highlights.append((pattern_id, counts[pattern_id], rects))
+    return highlights
+
+
+def _add_highlights(page, matcher, highlights):
+    """
+    Adds one highlight annotation per pattern found on the page, noting its
+    keywords and number of hits
+    Returns the number of annotations added
+    """
+    for pattern_id, count, rects in highlights:
+        keywords = matcher.pattern_keywords[pattern_id]
+        # Kept in the default color: the appearance is built once, when the
+        # annotation is added, and recoloring would build it again
+        annot = page.add_highlight_annot(rects)
+        annot.set_info(title=ANNOTATION_TITLE, content=f"{', '.join(keywords)} ({count})")
+    return len(highlights)
+
+
+# Document and matcher of each highlight worker process
+_worker_pdf = None
+_worker_matcher = None
+
+
+def _init_highlight_worker(pdf_path, keywords, normalize):
+    """
+    Worker process initializer: receives the PDF and the keywords once,
+    instead of once per chunk
+    """
+    global _worker_pdf, _worker_matcher
+    _worker_pdf = pdf_path
+    _worker_matcher = get_keyword_matcher(keywords, normalize)
+
+
+def _find_highlights(page_nums):
+    """
+    Worker process task: lays out the given pages (1-based page numbers)
+    and finds their hits
+    Returns a list of (page_num, highlights) tuples
+    """
+    doc = open_pdf(_worker_pdf)
+    try:
+        return [(page_num, find_page_highlights(doc[page_num - 1], _worker_matcher)) for page_num in page_nums]
+    finally:
+        doc.close()
+
+
+def _iter_highlights(doc, pdf_path, page_nums, keywords, normalize, workers, chunk_size):
+    """
+    Yields (page_num, highlights) in page order, laying out large documents
+    in worker processes (see extract_text_from_pdf)
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, -(-len(page_nums) // max(chunk_size, 1)))
+
+    if workers <= 1 or len(page_nums) < PARALLEL_MIN_PAGES:
+        matcher = get_keyword_matcher(keywords, normalize)
+        for page_num in page_nums:
+            yield page_num, find_page_highlights(doc[page_num - 1], matcher)
+        return
+
+    chunks = [page_nums[start:start + chunk_size] for start in range(0, len(page_nums), chunk_size)]
+    if isinstance(pdf_path, memoryview):
+        # Sent to the worker processes, which need a picklable copy
+        pdf_path = bytes(pdf_path)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_highlight_worker,
+        initargs=(pdf_path, list(keywords), normalize)
+    ) as executor:
+        for chunk in executor.map(_find_highlights, chunks):
+            yield from chunk
+
+
+def highlight_pdf(pdf_path, keywords, output, normalize=False, pages=None, workers=None,
+                  chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Saves a copy of the PDF with every keyword hit highlighted.
+    pdf_path can also be the bytes of the PDF, and output a file path or a
+    writable binary file object (e.g. io.BytesIO).
+    Large documents are laid out by a pool of worker processes, like
+    extract_text_from_pdf; the annotations are then added in page order.
+    pages restricts highlighting to a page selection (see select_pages).
+    Hits are found on the word layout of each page, where words are joined
+    by single spaces, so counts may differ slightly from the search's (e.g.
+    a phrase split by a double space).
+    Returns a dictionary with the number of "pages" laid out, keyword "hits"
+    and "annotations" added
+    """
+    metrics = current_metrics()
+    doc = open_pdf(pdf_path)
+    try:
+        page_nums = select_pages(pages, doc.page_count)
+        matcher = get_keyword_matcher(keywords, normalize)
+        hits = 0
+        annotations = 0
+
+        start = time.perf_counter() if metrics is not None else None
+        for page_num, highlights in _iter_highlights(doc, pdf_path, page_nums, keywords, normalize, workers,
+                                                     chunk_size):
+            annotations += _add_highlights(doc[page_num - 1], matcher, highlights)
+            hits += sum(count for _, count, _ in highlights)
+
+        if metrics is not None:
+            save_start = time.perf_counter()
+            metrics.add_time("highlight", save_start - start)
+        doc.save(output)
+        if metrics is not None:
+            metrics.add_time("highlight_save", time.perf_counter() - save_start)
+            metrics.count("highlighted_pages", len(page_nums))
+    finally:
+        doc.close()
+
+    return {"pages": len(page_nums), "hits": hits, "annotations": annotations}
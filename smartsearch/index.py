@@ -0,0 +1,487 @@
+# index.py
+# Persistent inverted index over a corpus of PDFs, so queries with new
+# keyword lists do not need to re-extract or re-scan the documents.
+import heapq
+import math
+import os
+import re
+import sqlite3
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+try:
+    from .backend import extract_text_from_pdf
+    from .batch import TASKS_PER_WORKER, iter_completed, iter_pdf_paths
+    from .cache import hash_pdf_file
+    from .matcher import PREFIX, REGEX, parse_keyword
+except ImportError:
+    from backend import extract_text_from_pdf
+    from batch import TASKS_PER_WORKER, iter_completed, iter_pdf_paths
+    from cache import hash_pdf_file
+    from matcher import PREFIX, REGEX, parse_keyword
+
+
+# Words are indexed as lowercase tokens with their position on the page
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Sorts after every term starting with a given prefix
+MAX_CHAR = "\U0010ffff"
+
+# BM25 parameters: term frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    page_count INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    content_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS pages (
+    doc_id INTEGER NOT NULL,
+    page_num INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    PRIMARY KEY (doc_id, page_num)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    page_num INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    positions BLOB NOT NULL,
+    PRIMARY KEY (term, doc_id, page_num)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+"""
+
+
+def get_index_file_path():
+    """
+    Get the default path of the corpus index in user's home directory
+    """
+    return Path.home() / ".smart_search_index.sqlite"
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase word tokens
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def bm25_idf(doc_freq, doc_count):
+    """
+    BM25 inverse document frequency (always positive)
+    """
+    return math.log((doc_count - doc_freq + 0.5) / (doc_freq + 0.5) + 1)
+
+
+def build_postings(all_text):
+    """
+    Builds the postings of one document from its {page_num: text} dictionary
+    Returns (page_lengths, postings) where postings maps
+    term -> list of (page_num, positions array)
+    """
+    page_lengths = {}
+    postings = {}
+    for page_num, text in all_text.items():
+        tokens = tokenize(text)
+        page_lengths[int(page_num)] = len(tokens)
+        page_positions = {}
+        for position, token in enumerate(tokens):
+            page_positions.setdefault(token, array("I")).append(position)
+        for term, positions in page_positions.items():
+            postings.setdefault(term, []).append((int(page_num), positions))
+    return page_lengths, postings
+
+
+def document_path(pdf_path):
+    """
+    Path under which a document is indexed: absolute, so the same file is
+    one document whichever directory the index is updated from
+    """
+    return os.path.abspath(str(pdf_path))
+
+
+def get_file_fingerprint(pdf_path):
+    """
+    Returns the (size, mtime) of a file, used to detect changes cheaply
+    """
+    stat = os.stat(pdf_path)
+    return stat.st_size, stat.st_mtime
+
+
+def index_document(task):
+    """
+    Worker process task: fingerprints one PDF and, unless its content hash
+    matches known_hash, extracts it and builds its postings
+    task is a (pdf_path, known_hash) tuple
+    Returns a record dictionary; errors are reported in the record
+    """
+    pdf_path, known_hash = task
+    try:
+        size, mtime = get_file_fingerprint(pdf_path)
+        content_hash = hash_pdf_file(pdf_path)
+        record = {"path": pdf_path, "size": size, "mtime": mtime, "content_hash": content_hash}
+        if content_hash == known_hash:
+            # Touched but not modified
+            record["unchanged"] = True
+            return record
+
+        all_text = extract_text_from_pdf(pdf_path, workers=1)
+        record["page_lengths"], record["postings"] = build_postings(all_text)
+        return record
+    except Exception as e:
+        return {"path": pdf_path, "error": f"{type(e).__name__}: {e}"}
+
+
+def _count_phrase(position_lists):
+    """
+    Counts non-overlapping occurrences of a phrase on a page, given the
+    sorted positions of each of its tokens
+    """
+    following = [set(positions) for positions in position_lists[1:]]
+    length = len(position_lists)
+    count = 0
+    last_end = 0
+    for start in position_lists[0]:
+        if start < last_end:
+            continue
+        if all(start + offset + 1 in positions for offset, positions in enumerate(following)):
+            count += 1
+            last_end = start + length
+    return count
+
+
+# Inverted index stored in a SQLite database
+class CorpusIndex:
+    """
+    Term -> (document, page, count, positions) inverted index.
+    Terms are lowercase words; multi-word keywords are resolved with the
+    stored positions, so "low socioeconomic status" only matches the words
+    in sequence. Unlike search_keywords_in_text, keywords match whole words;
+    a trailing wildcard ("discriminat*") matches every term with that prefix,
+    and regex keywords are not supported.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = str(db_path or get_index_file_path())
+        self.conn = sqlite3.connect(self.db_path)
+        # Write-ahead log: queries keep reading a consistent snapshot while
+        # a document is being replaced
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_document(self, pdf_path, page_lengths, postings, fingerprint=(None, None, None)):
+        """
+        Adds (or replaces) one document's postings in a single transaction,
+        so concurrent queries never see a half-written document
+        fingerprint is the (size, mtime, content_hash) of the file
+        """
+        pdf_path = document_path(pdf_path)
+        with self.conn:
+            self._delete_document(pdf_path)
+            cursor = self.conn.execute(
+                "INSERT INTO documents (path, page_count, length, size, mtime, content_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (pdf_path, len(page_lengths), sum(page_lengths.values())) + tuple(fingerprint)
+            )
+            doc_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO pages (doc_id, page_num, length) VALUES (?, ?, ?)",
+                [(doc_id, page_num, length) for page_num, length in page_lengths.items()]
+            )
+            self.conn.executemany(
+                "INSERT INTO postings (term, doc_id, page_num, count, positions) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (term, doc_id, page_num, len(positions), positions.tobytes())
+                    for term, pages in postings.items()
+                    for page_num, positions in pages
+                ]
+            )
+        return doc_id
+
+    def add_text(self, pdf_path, all_text):
+        """
+        Indexes an already extracted {page_num: text} dictionary
+        """
+        return self.add_document(pdf_path, *build_postings(all_text))
+
+    def _delete_document(self, pdf_path):
+        row = self.conn.execute("SELECT id FROM documents WHERE path = ?", (pdf_path,)).fetchone()
+        if row is None:
+            return
+        doc_id = row[0]
+        self.conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        self.conn.execute("DELETE FROM pages WHERE doc_id = ?", (doc_id,))
+        self.conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+    def remove_document(self, pdf_path):
+        """
+        Removes one document from the index
+        """
+        with self.conn:
+            self._delete_document(document_path(pdf_path))
+
+    def update_fingerprint(self, pdf_path, fingerprint):
+        """
+        Records a new (size, mtime, content_hash) for an unchanged document
+        """
+        with self.conn:
+            self.conn.execute(
+                "UPDATE documents SET size = ?, mtime = ?, content_hash = ? WHERE path = ?",
+                tuple(fingerprint) + (document_path(pdf_path),)
+            )
+
+    def fingerprints(self):
+        """
+        Returns {path: (size, mtime, content_hash)} for every indexed document
+        """
+        rows = self.conn.execute("SELECT path, size, mtime, content_hash FROM documents")
+        return {path: (size, mtime, content_hash) for path, size, mtime, content_hash in rows}
+
+    def document_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def _term_postings(self, term, prefix=False, columns="count"):
+        """
+        Postings of a term, or of every term starting with it if prefix is set
+        Yields (doc_id, page_num, column) rows
+        """
+        if not prefix:
+            return self.conn.execute(
+                f"SELECT doc_id, page_num, {columns} FROM postings WHERE term = ?", (term,)
+            )
+        return self.conn.execute(
+            f"SELECT doc_id, page_num, {columns} FROM postings WHERE term >= ? AND term < ?",
+            (term, term + MAX_CHAR)
+        )
+
+    def keyword_page_counts(self, keyword):
+        """
+        Returns {(doc_id, page_num): count} for one keyword (word or phrase)
+        """
+        mode, pattern = parse_keyword(keyword)
+        if mode == REGEX:
+            raise ValueError(f"Regex keywords are not supported by the index: '{keyword}'")
+        terms = tokenize(pattern)
+        if not terms:
+            return {}
+        # With a wildcard, the last term is a prefix
+        prefix = mode == PREFIX and pattern[-1:].isalnum()
+
+        if len(terms) == 1:
+            page_counts = {}
+            for doc_id, page_num, count in self._term_postings(terms[0], prefix):
+                page_counts[(doc_id, page_num)] = page_counts.get((doc_id, page_num), 0) + count
+            return page_counts
+
+        # Phrase: only pages containing every term, then check the positions
+        candidates = None
+        term_positions = []
+        for i, term in enumerate(terms):
+            rows = self._term_postings(term, prefix and i == len(terms) - 1, "positions")
+            positions = {}
+            for doc_id, page_num, blob in rows:
+                key = (doc_id, page_num)
+                if candidates is None or key in candidates:
+                    positions.setdefault(key, []).append(blob)
+            candidates = set(positions)
+            term_positions.append(positions)
+            if not candidates:
+                return {}
+
+        page_counts = {}
+        for key in candidates:
+            position_lists = []
+            for positions in term_positions:
+                position_array = array("I")
+                for blob in positions[key]:
+                    position_array.frombytes(blob)
+                if len(positions[key]) > 1:
+                    # Several terms matched the prefix
+                    position_array = sorted(position_array)
+                position_lists.append(position_array)
+            count = _count_phrase(position_lists)
+            if count:
+                page_counts[key] = count
+        return page_counts
+
+    def search(self, keywords):
+        """
+        Searches the whole corpus for a keyword list
+        Returns {document path: {keyword: {"count": total, "pages": [...]}}}
+        for documents with at least one match
+        """
+        # One read transaction, so every keyword sees the same snapshot
+        self.conn.execute("BEGIN")
+        try:
+            paths = dict(self.conn.execute("SELECT id, path FROM documents"))
+            per_document = {}
+
+            for keyword in keywords:
+                for (doc_id, page_num), count in sorted(self.keyword_page_counts(keyword).items()):
+                    info = per_document.setdefault(doc_id, {}).setdefault(keyword, {"count": 0, "pages": []})
+                    info["count"] += count
+                    info["pages"].append(page_num)
+        finally:
+            self.conn.rollback()
+
+        # Keep the keyword list order in each document's results
+        results = {}
+        for doc_id, doc_results in per_document.items():
+            results[paths[doc_id]] = {kw: doc_results[kw] for kw in keywords if kw in doc_results}
+        return results
+
+
+def rank_documents(index, keywords, k=50, weights=None, by_page=False):
+    """
+    Ranks the documents (or pages) of the index with BM25 for a keyword list
+    weights is an optional {keyword: weight} dictionary (default weight 1)
+    Only the top k are kept, in a bounded heap, so the corpus is never sorted
+    Returns a list of {"path", "score"} dictionaries (plus "page" if by_page),
+    best first
+    """
+    weights = weights or {}
+
+    index.conn.execute("BEGIN")
+    try:
+        # Corpus statistics and lengths of the documents (or pages)
+        if by_page:
+            lengths = {
+                (doc_id, page_num): length
+                for doc_id, page_num, length in index.conn.execute("SELECT doc_id, page_num, length FROM pages")
+            }
+        else:
+            lengths = dict(index.conn.execute("SELECT id, length FROM documents"))
+        if not lengths:
+            return []
+        unit_count = len(lengths)
+        average_length = (sum(lengths.values()) / unit_count) or 1
+
+        scores = {}
+        for keyword in dict.fromkeys(keywords):
+            weight = weights.get(keyword, 1.0)
+            if not weight:
+                continue
+
+            page_counts = index.keyword_page_counts(keyword)
+            if by_page:
+                term_freqs = page_counts
+            else:
+                term_freqs = {}
+                for (doc_id, _), count in page_counts.items():
+                    term_freqs[doc_id] = term_freqs.get(doc_id, 0) + count
+
+            idf = bm25_idf(len(term_freqs), unit_count)
+            for unit, tf in term_freqs.items():
+                length_norm = 1 - BM25_B + BM25_B * lengths.get(unit, 0) / average_length
+                score = weight * idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+                scores[unit] = scores.get(unit, 0.0) + score
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        paths = dict(index.conn.execute("SELECT id, path FROM documents"))
+    finally:
+        index.conn.rollback()
+
+    ranked = []
+    for unit, score in top:
+        if by_page:
+            doc_id, page_num = unit
+            ranked.append({"path": paths[doc_id], "page": page_num, "score": round(score, 4)})
+        else:
+            ranked.append({"path": paths[unit], "score": round(score, 4)})
+    return ranked
+
+
+def update_index(index, inputs, workers=None):
+    """
+    Brings the index up to date with the PDFs named by inputs (files,
+    directories or glob patterns): only new or modified files are extracted
+    and indexed, and documents whose file no longer exists are removed.
+    Files with an unchanged size and mtime are skipped without reading them.
+    Returns a dictionary of counts and the list of failed files.
+    """
+    workers = workers or os.cpu_count() or 1
+    known = index.fingerprints()
+    stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "failed": []}
+
+    def iter_tasks():
+        for pdf_path in iter_pdf_paths(inputs):
+            pdf_path = document_path(pdf_path)
+            size, mtime, content_hash = known.get(pdf_path, (None, None, None))
+            try:
+                if (size, mtime) == get_file_fingerprint(pdf_path):
+                    stats["unchanged"] += 1
+                    continue
+            except OSError:
+                pass
+            yield pdf_path, content_hash
+
+    def failed_record(task, error):
+        return {"path": task[0], "error": f"{type(error).__name__}: {error}"}
+
+    records = iter_completed(
+        partial(ProcessPoolExecutor, max_workers=workers), index_document, iter_tasks(),
+        workers * TASKS_PER_WORKER, failed_record
+    )
+    for record in records:
+        pdf_path = record["path"]
+        if "error" in record:
+            stats["failed"].append((pdf_path, record["error"]))
+            continue
+
+        fingerprint = (record["size"], record["mtime"], record["content_hash"])
+        if record.get("unchanged"):
+            index.update_fingerprint(pdf_path, fingerprint)
+            stats["unchanged"] += 1
+        else:
+            index.add_document(pdf_path, record["page_lengths"], record["postings"], fingerprint)
+            stats["updated" if pdf_path in known else "added"] += 1
+
+    # Remove deleted files
+    for pdf_path in known:
+        if not os.path.exists(pdf_path):
+            index.remove_document(pdf_path)
+            stats["removed"] += 1
+
+    return stats
+
+
+def watch_index(index, inputs, interval=30, workers=None, file=sys.stderr):
+    """
+    Polls the inputs every interval seconds and keeps the index current,
+    until interrupted
+    """
+    try:
+        while True:
+            stats = update_index(index, inputs, workers)
+            if stats["added"] or stats["updated"] or stats["removed"] or stats["failed"]:
+                print(format_update_stats(stats), file=file, flush=True)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def format_update_stats(stats):
+    return (
+        f"added {stats['added']}, updated {stats['updated']}, removed {stats['removed']}, "
+        f"unchanged {stats['unchanged']}, failed {len(stats['failed'])}"
+    )
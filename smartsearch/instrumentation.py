@@ -0,0 +1,150 @@
+# instrumentation.py
+# Lightweight per-stage timings and counters. The backend records into the
+# Metrics collected by the current context (see collect_metrics); when
+# nothing is being collected, each hook costs one context variable lookup.
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    from .matcher import get_keyword_matcher
+except ImportError:
+    from matcher import get_keyword_matcher
+
+
+# Functions listed in a cProfile report
+PROFILE_TOP_FUNCTIONS = 25
+
+# Allocation sites listed in a tracemalloc report
+TRACEMALLOC_TOP_LINES = 10
+
+_current_metrics = ContextVar("smartsearch_metrics", default=None)
+
+
+def current_metrics():
+    """
+    Returns the Metrics being collected in this context, or None
+    """
+    return _current_metrics.get()
+
+
+# Timings and counters of one run
+class Metrics:
+    """
+    Wall time per stage ("open", "get_text", "blocks_fallback", "search", ...)
+    and counters ("pages", "chars", "fallback_pages", "cache_hits", ...).
+    """
+
+    def __init__(self):
+        self.stage_seconds = {}
+        self.stage_calls = {}
+        self.counters = {}
+        self.start_time = time.perf_counter()
+        self.wall_seconds = None
+
+    def add_time(self, stage, seconds):
+        self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+        self.stage_calls[stage] = self.stage_calls.get(stage, 0) + 1
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self.start_time
+
+    def report(self):
+        """
+        Returns the metrics as a JSON-serializable dictionary
+        """
+        wall_seconds = self.wall_seconds if self.wall_seconds is not None else time.perf_counter() - self.start_time
+        report = {
+            "wall_seconds": round(wall_seconds, 6),
+            "stages": {
+                stage: {"seconds": round(seconds, 6), "calls": self.stage_calls[stage]}
+                for stage, seconds in sorted(self.stage_seconds.items(), key=lambda item: -item[1])
+            },
+            "counters": dict(self.counters),
+        }
+        if wall_seconds > 0 and self.counters.get("pages"):
+            # Only meaningful when pages were extracted (not on cache hits)
+            report["pages_per_sec"] = round(self.counters.get("pages", 0) / wall_seconds, 1)
+            report["chars_per_sec"] = round(self.counters.get("chars", 0) / wall_seconds, 1)
+        return report
+
+
+@contextmanager
+def collect_metrics(metrics=None):
+    """
+    Collects the backend metrics of everything run in the block
+    (in this thread or task only)
+    """
+    metrics = metrics or Metrics()
+    token = _current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_metrics.reset(token)
+        metrics.finish()
+
+
+def measure_keyword_costs(all_text, keywords, normalize=False):
+    """
+    Per-keyword match cost: times a separate pass over the text for each
+    keyword, since the combined matcher cannot split its time by keyword
+    Returns {keyword: {"seconds", "matches"}}, most expensive first
+    """
+    costs = {}
+    for keyword in dict.fromkeys(keywords):
+        matcher = get_keyword_matcher([keyword], normalize)
+        matches = 0
+        start = time.perf_counter()
+        for text in all_text.values():
+            matches += matcher.count(text).get(keyword, 0)
+        costs[keyword] = {"seconds": round(time.perf_counter() - start, 6), "matches": matches}
+    return dict(sorted(costs.items(), key=lambda item: -item[1]["seconds"]))
+
+
+@contextmanager
+def profile_run(use_cprofile=False, use_tracemalloc=False):
+    """
+    Opt-in cProfile and/or tracemalloc capture of a single run
+    Yields a dictionary that gets the "cprofile" and "tracemalloc" reports
+    when the block exits
+    """
+    # Imported here, the backend imports this module on every start
+    import cProfile
+    import io
+    import pstats
+    import tracemalloc
+
+    report = {}
+    profiler = cProfile.Profile() if use_cprofile else None
+    if use_tracemalloc:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield report
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+            report["cprofile"] = output.getvalue()
+        if use_tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            report["tracemalloc"] = {
+                "current_mb": round(current / 1e6, 3),
+                "peak_mb": round(peak / 1e6, 3),
+                "top": [str(stat) for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP_LINES]],
+            }
@@ -0,0 +1,361 @@
+# jobs.py
+# Background search jobs for the app: searches run in a shared, bounded
+# pool of worker processes, so they survive reruns, run side by side for
+# different sessions, and can report progress and be cancelled. Only
+# depends on the backend.
+import io
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from .backend import KeywordAggregate, iter_search_pdf
+    from .dedup import PageHitCache
+    from .highlight import highlight_pdf
+    from .instrumentation import collect_metrics
+    from .textstore import SpillingPageText
+except ImportError:
+    from backend import KeywordAggregate, iter_search_pdf
+    from dedup import PageHitCache
+    from highlight import highlight_pdf
+    from instrumentation import collect_metrics
+    from textstore import SpillingPageText
+
+
+# Searches running at the same time, across every session. PyMuPDF does not
+# support multithreaded use, so each running job has a worker process of
+# its own (started with "spawn", as the app's server process has threads).
+# At least two, so one long search never holds back every other session
+JOB_WORKERS = min(4, max(2, os.cpu_count() or 1))
+
+# Seconds between progress (and cancellation) exchanges with a job's process
+JOB_RELAY_SECONDS = 0.2
+
+# Jobs waiting or running at the same time, across every session
+MAX_ACTIVE_JOBS = 16
+
+# Finished jobs are forgotten after this many seconds if nobody collects them
+JOB_RETENTION_SECONDS = 600
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """
+    Raised when too many jobs are already waiting or running
+    """
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job function when its job has been cancelled
+    """
+
+
+# One background job and its progress
+class Job:
+    """
+    A job runs fn(job, *args) in a worker process, so fn, its arguments and
+    its return value must be picklable. The function reports progress with
+    job.set_progress() and calls job.check_cancelled() between steps (see
+    WorkerJob); both are relayed to this object every JOB_RELAY_SECONDS.
+    Its return value is kept in job.result, or the error in job.error.
+    """
+
+    def __init__(self, fn, args):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.args = args
+        self.status = QUEUED
+        self.done = 0
+        self.total = None
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self.future = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, CANCELLED, FAILED)
+
+    @property
+    def fraction(self):
+        """
+        Progress between 0 and 1
+        """
+        if not self.total:
+            return 0.0
+        return min(self.done / self.total, 1.0)
+
+    def set_progress(self, done, total=None, message=""):
+        self.done = done
+        if total is not None:
+            self.total = total
+        self.message = message
+
+    def cancel(self):
+        """
+        Asks the job to stop; a job still waiting in the queue never starts
+        """
+        self._cancel_event.set()
+        if self.future is not None and self.future.cancel():
+            self._finish(CANCELLED)
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def _finish(self, status, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.finished_at = time.monotonic()
+        self.status = status
+
+    def _run(self, manager):
+        """
+        Runs the job in one of the manager's worker processes, relaying its
+        progress and cancellation until it ends
+        """
+        if self._cancel_event.is_set():
+            self._finish(CANCELLED)
+            return
+        self.status = RUNNING
+        try:
+            progress = manager._shared.dict()
+            cancel_event = manager._shared.Event()
+            future = manager._process_pool().submit(_run_job_function, self.fn, self.args, progress, cancel_event)
+            while True:
+                try:
+                    status, value = future.result(timeout=JOB_RELAY_SECONDS)
+                    break
+                except FutureTimeoutError:
+                    pass
+                finally:
+                    if self._cancel_event.is_set() and not cancel_event.is_set():
+                        cancel_event.set()
+                    state = progress.copy()
+                    if state:
+                        self.set_progress(state["done"], state["total"], state["message"])
+        except BrokenProcessPool:
+            manager._replace_process_pool()
+            self._finish(FAILED, error="The search process stopped unexpectedly")
+        except Exception as e:
+            self._finish(FAILED, error=f"{type(e).__name__}: {e}")
+        else:
+            if status == DONE:
+                self._finish(DONE, value)
+            else:
+                self._finish(status, error=value)
+
+
+# Stand-in for the Job inside its worker process
+class WorkerJob:
+    """
+    What a job function receives as its job: progress is sent to the Job,
+    and cancellation read from it, at most every JOB_RELAY_SECONDS
+    """
+
+    def __init__(self, progress, cancel_event):
+        self._progress = progress
+        self._cancel_event = cancel_event
+        self._progress_sent = 0.0
+        self._cancel_checked = 0.0
+        self._cancelled = False
+
+    def set_progress(self, done, total=None, message=""):
+        now = time.monotonic()
+        if now - self._progress_sent >= JOB_RELAY_SECONDS or (total is not None and done >= total):
+            self._progress.update(done=done, total=total, message=message)
+            self._progress_sent = now
+
+    def check_cancelled(self):
+        now = time.monotonic()
+        if not self._cancelled and now - self._cancel_checked >= JOB_RELAY_SECONDS:
+            self._cancelled = self._cancel_event.is_set()
+            self._cancel_checked = now
+        if self._cancelled:
+            raise JobCancelled()
+
+
+def _run_job_function(fn, args, progress, cancel_event):
+    """
+    Worker process task: runs a job function
+    Returns (status, result or error message)
+    """
+    try:
+        return DONE, fn(WorkerJob(progress, cancel_event), *args)
+    except JobCancelled:
+        return CANCELLED, None
+    except Exception as e:
+        return FAILED, f"{type(e).__name__}: {e}"
+
+
+# Shared pool of background jobs
+class JobManager:
+    """
+    Runs jobs in a fixed number of worker processes shared by every session
+    (see JOB_WORKERS), each followed by a thread that relays its progress,
+    and refuses new jobs (JobQueueFull) once max_active jobs are waiting or
+    running, so the queue cannot grow without bound. A worker process that
+    dies fails its job only: the pool is replaced for the next ones.
+    Jobs are looked up by their id, which sessions keep across reruns.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_active=MAX_ACTIVE_JOBS, retention=JOB_RETENTION_SECONDS):
+        self.workers = workers
+        self.max_active = max_active
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="smartsearch-job")
+        self._context = multiprocessing.get_context("spawn")
+        # Progress and cancellation shared with the worker processes
+        self._shared = self._context.Manager()
+        self._processes = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _process_pool(self):
+        with self._lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._context)
+            return self._processes
+
+    def _replace_process_pool(self):
+        with self._lock:
+            if self._processes is not None:
+                self._processes.shutdown(wait=False)
+                self._processes = None
+
+    def submit(self, fn, *args):
+        """
+        Queues fn(job, *args) and returns its Job
+        """
+        with self._lock:
+            self._prune()
+            active = sum(1 for job in self._jobs.values() if not job.finished)
+            if active >= self.max_active:
+                raise JobQueueFull(f"{active} searches are already queued or running")
+
+            job = Job(fn, args)
+            self._jobs[job.id] = job
+            job.future = self._executor.submit(job._run, self)
+        return job
+
+    def get(self, job_id):
+        """
+        Returns the job with this id, or None if it is unknown or was forgotten
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+
+    def forget(self, job_id):
+        """
+        Drops a job once its result has been collected (cancelling it if needed)
+        """
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None and not job.finished:
+            job.cancel()
+
+    def active_count(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def _prune(self):
+        # Forget finished jobs nobody came back for
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and now - job.finished_at > self.retention:
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        for job in list(self._jobs.values()):
+            job.cancel()
+        self._executor.shutdown(wait=False)
+        self._replace_process_pool()
+        self._shared.shutdown()
+
+
+def highlight_pdf_job(job, pdf_bytes, keywords, normalize=False, pages=None):
+    """
+    Job function: builds a copy of the PDF with every keyword hit highlighted
+    (see highlight_pdf)
+    Returns the bytes of the highlighted PDF
+    """
+    output = io.BytesIO()
+    highlight_pdf(pdf_bytes, keywords, output, normalize=normalize, pages=pages)
+    return output.getvalue()
+
+
+def search_pdf_job(job, pdf_bytes, keywords, cache=None, cache_key=None, normalize=False, pages=None, presence=False,
+                   budget=None):
+    """
+    Job function: streams a PDF through iter_search_pdf, reporting progress
+    after each page and stopping between pages if the job is cancelled
+    Repeated pages reuse the hits of the first one (see PageHitCache).
+    The page text is collected once, by iter_search_pdf, for both the
+    results and the extraction cache; with a MemoryBudget, it is kept in a
+    SpillingPageText that moves to disk once over budget.
+    Returns a dictionary with the "results" (with offsets), the "text" of the
+    pages read, whether "complete" (every page was read), the run's
+    "metrics" report and, with a budget, its "memory" report
+    """
+    aggregate = KeywordAggregate(keywords, with_offsets=True)
+    # Sent back from the worker process by the path of its spilled file
+    pdf_text = SpillingPageText(keep_file=True) if budget is not None else {}
+
+    try:
+        with collect_metrics() as metrics:
+            for searched, (page_num, text, _) in enumerate(iter_search_pdf(
+                pdf_bytes,
+                keywords,
+                aggregate,
+                cache=cache,
+                cache_key=cache_key,
+                normalize=normalize,
+                pages=pages,
+                presence=presence,
+                budget=budget,
+                page_cache=PageHitCache(),
+                collect=pdf_text
+            ), start=1):
+                job.set_progress(
+                    searched,
+                    aggregate.page_count,
+                    f"Searching page {page_num} ({searched} of {aggregate.page_count})..."
+                )
+                job.check_cancelled()
+    except BaseException:
+        if budget is not None:
+            pdf_text.close()
+        raise
+
+    if budget is not None:
+        pdf_text.finish()
+    return {
+        "results": aggregate.results(),
+        "text": pdf_text,
+        "complete": pages is None and len(pdf_text) == aggregate.page_count,
+        "metrics": metrics.report(),
+        "memory": budget.report() if budget is not None else None,
+    }
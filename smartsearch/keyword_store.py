@@ -0,0 +1,186 @@
+# keyword_store.py
+# Keyword list for the app's keyword manager, sized for vocabularies of tens
+# of thousands of terms: duplicates are found with a case-folded set, and the
+# filter box runs on indexes built once per change instead of once per
+# keystroke. Also reads and writes keyword files for bulk import and export.
+import json
+from bisect import bisect_left, bisect_right
+
+
+# Sorts after any keyword that starts with a given prefix
+MAX_CHAR = "\U0010ffff"
+
+# Separates the keywords in the substring index; never part of a filter term
+_SEPARATOR = "\x00"
+
+
+# Ordered keyword list with case-insensitive lookups
+class KeywordStore:
+    """
+    Keeps the keywords in the order they were added, without duplicates
+    (compared case-insensitively). Filtering by substring scans one string of
+    all the case-folded keywords, and filtering by prefix bisects a sorted
+    list; both are rebuilt only after the list changes.
+    """
+
+    def __init__(self, keywords=()):
+        self._keywords = []
+        self._folded = {}
+        self.revision = 0
+        self._substring_index = None
+        self._prefix_index = None
+        self._json = None
+        self.add_many(keywords)
+
+    def __len__(self):
+        return len(self._keywords)
+
+    def __iter__(self):
+        return iter(self._keywords)
+
+    def __contains__(self, keyword):
+        return keyword.strip().casefold() in self._folded
+
+    def to_list(self):
+        return list(self._keywords)
+
+    def _changed(self):
+        self.revision += 1
+        self._substring_index = None
+        self._prefix_index = None
+        self._json = None
+
+    def add(self, keyword):
+        """
+        Adds a keyword unless it is empty or already in the list
+        Returns whether it was added
+        """
+        added = self._add(keyword)
+        if added:
+            self._changed()
+        return added
+
+    def _add(self, keyword):
+        keyword = keyword.strip()
+        folded = keyword.casefold()
+        if not keyword or folded in self._folded:
+            return False
+        self._folded[folded] = keyword
+        self._keywords.append(keyword)
+        return True
+
+    def add_many(self, keywords):
+        """
+        Adds the keywords not in the list yet
+        Returns how many were added
+        """
+        added = sum(1 for keyword in keywords if self._add(keyword))
+        if added:
+            self._changed()
+        return added
+
+    def remove(self, keyword):
+        """
+        Removes a keyword (case-insensitively); returns whether it was found
+        """
+        stored = self._folded.pop(keyword.strip().casefold(), None)
+        if stored is None:
+            return False
+        self._keywords.remove(stored)
+        self._changed()
+        return True
+
+    def replace(self, keywords):
+        """
+        Replaces the whole list
+        """
+        self._keywords = []
+        self._folded = {}
+        self.add_many(keywords)
+        self._changed()
+
+    def _get_substring_index(self):
+        if self._substring_index is None:
+            # _SEPARATOR + keyword for every keyword, with the offset of each separator
+            starts = []
+            offset = 0
+            for folded in self._folded:
+                starts.append(offset)
+                offset += len(folded) + 1
+            haystack = "".join(_SEPARATOR + folded for folded in self._folded)
+            self._substring_index = (haystack, starts)
+        return self._substring_index
+
+    def _get_prefix_index(self):
+        if self._prefix_index is None:
+            self._prefix_index = sorted(self._folded)
+        return self._prefix_index
+
+    def filter(self, term):
+        """
+        Keywords containing term (case-insensitively), in list order
+        """
+        term = term.strip().casefold()
+        if not term:
+            return self.to_list()
+        if _SEPARATOR in term:
+            return []
+
+        # _folded and _keywords are in the same order
+        haystack, starts = self._get_substring_index()
+        found = []
+        position = haystack.find(term)
+        while position != -1:
+            index = bisect_right(starts, position) - 1
+            found.append(self._keywords[index])
+            # Continue with the next keyword
+            next_start = starts[index + 1] if index + 1 < len(starts) else len(haystack)
+            position = haystack.find(term, next_start)
+        return found
+
+    def with_prefix(self, prefix):
+        """
+        Keywords starting with prefix (case-insensitively), in alphabetical order
+        """
+        prefix = prefix.strip().casefold()
+        index = self._get_prefix_index()
+        start = bisect_left(index, prefix)
+        end = bisect_left(index, prefix + MAX_CHAR, start)
+        return [self._folded[folded] for folded in index[start:end]]
+
+    def to_json(self):
+        """
+        The list as a JSON document, kept until the list changes
+        """
+        if self._json is None:
+            self._json = json.dumps(self._keywords, indent=2, ensure_ascii=False)
+        return self._json
+
+    def to_text(self):
+        """
+        The list as text, one keyword per line
+        """
+        return "\n".join(self._keywords) + "\n" if self._keywords else ""
+
+
+def parse_keywords(data, filename=""):
+    """
+    Reads keywords from the contents of a keyword file: a JSON list of
+    keywords (.json), or one keyword per line (any other file)
+    Raises ValueError if a JSON file is not a list of keywords
+    """
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    if filename.lower().endswith(".json"):
+        keywords = json.loads(data)
+        if not isinstance(keywords, list) or not all(isinstance(kw, str) for kw in keywords):
+            raise ValueError(f"{filename} is not a JSON list of keywords")
+        return keywords
+    return [line.strip() for line in data.splitlines() if line.strip()]
+
+
+def page_count(total, page_size):
+    """
+    Number of pages needed to show total items (at least one)
+    """
+    return max(1, -(-total // page_size))
@@ -0,0 +1,551 @@
+# matcher.py
+import re
+from collections import deque
+from functools import lru_cache
+
+try:
+    from .normalize import NormalizedText, lowercase_text, normalize_text
+except ImportError:
+    from normalize import NormalizedText, lowercase_text, normalize_text
+
+
+# Keyword match modes
+SUBSTRING = "substring"  # "white" also matches "whitepaper" (default)
+WORD = "word"            # "word:white" only matches the whole word
+PREFIX = "prefix"        # "discriminat*" matches words starting with "discriminat"
+REGEX = "regex"          # "regex:colou?r" is a regular expression
+
+WORD_KEYWORD_PREFIX = "word:"
+REGEX_KEYWORD_PREFIX = "regex:"
+WILDCARD = "*"
+
+# Compiled matchers kept for reuse by get_keyword_matcher
+MATCHER_CACHE_SIZE = 32
+
+# Substring-only keyword lists up to this many patterns are searched with
+# str.count/str.find, one C-level scan per pattern; larger lists use the
+# automaton, whose single pass does not depend on the number of patterns
+# (measured crossover on ~600k characters: ~250 patterns for counts, ~100
+# with spans)
+STR_SEARCH_MAX_PATTERNS = 100
+
+# Flags of a regex keyword without inline global flags
+_DEFAULT_REGEX_FLAGS = re.compile("").flags
+
+# Rest of the word after a prefix match
+WORD_REST_PATTERN = re.compile(r"\w*")
+
+
+def parse_keyword(keyword):
+    """
+    Splits a keyword into its match mode and pattern
+    Plain keywords (and anything that would leave an empty pattern) are
+    substring keywords, so existing keyword files keep their meaning
+    Returns a tuple (mode, pattern)
+    """
+    if keyword.startswith(WORD_KEYWORD_PREFIX) and len(keyword) > len(WORD_KEYWORD_PREFIX):
+        return WORD, keyword[len(WORD_KEYWORD_PREFIX):]
+    if keyword.startswith(REGEX_KEYWORD_PREFIX) and len(keyword) > len(REGEX_KEYWORD_PREFIX):
+        return REGEX, keyword[len(REGEX_KEYWORD_PREFIX):]
+    if keyword.endswith(WILDCARD) and keyword.rstrip(WILDCARD).strip():
+        return PREFIX, keyword.rstrip(WILDCARD)
+    return SUBSTRING, keyword
+
+
+def _is_word_char(ch):
+    # Same characters as \w in str patterns
+    return ch.isalnum() or ch == "_"
+
+
+def _match_end(text, start, end, mode):
+    """
+    Checks the word boundaries of a whole word or prefix match of text[start:end]
+    Returns the end of the match (extended to the end of the word for a
+    prefix), or None if it is not a match in that mode
+    """
+    if start and _is_word_char(text[start - 1]):
+        return None
+    if mode == WORD:
+        if end < len(text) and _is_word_char(text[end]):
+            return None
+        return end
+    return WORD_REST_PATTERN.match(text, end).end()
+
+
+def _lower(text, with_offsets):
+    """
+    Lowercases text for matching
+    Returns a tuple (lowered, offsets): offsets is a NormalizedText mapping
+    back to the text when lowercasing changed its length (e.g. "İ") and
+    with_offsets is set, else None
+    """
+    lowered = text.lower()
+    if with_offsets and len(lowered) != len(text):
+        offsets = lowercase_text(text)
+        return offsets.text, offsets
+    return lowered, None
+
+
+# Compiled multi-keyword matcher (Aho-Corasick automaton)
+class KeywordMatcher:
+    """
+    Finds every keyword of a keyword list in a single pass over the text.
+    The automaton is built once per keyword list and can be reused for
+    every page of every document.
+    Matching is case-insensitive: keywords and text are lowercased once.
+    With normalize=True, keywords and text are normalized instead (see
+    normalize.py); pages can be given already normalized as NormalizedText,
+    and match offsets are always mapped back to the original text.
+    Substring, whole word and prefix keywords share the automaton (word
+    boundaries are checked on each hit); regex keywords are combined into
+    one regular expression (see parse_keyword for the keyword syntax).
+    Small lists of substring keywords are faster with one str.count scan
+    per keyword, and skip the automaton (see STR_SEARCH_MAX_PATTERNS).
+    """
+
+    def __init__(self, keywords, normalize=False):
+        self.keywords = list(keywords)
+        self.normalize = normalize
+
+        # Several keywords can share the same pattern ("Bias" and "bias")
+        self.patterns = []
+        self.pattern_modes = []
+        self.pattern_keywords = []
+        pattern_ids = {}
+        for keyword in self.keywords:
+            mode, pattern = parse_keyword(keyword)
+            if mode != REGEX:
+                pattern = normalize_text(pattern, with_offsets=False) if normalize else pattern.lower()
+            key = (mode, pattern)
+            if key not in pattern_ids:
+                pattern_ids[key] = len(self.patterns)
+                self.patterns.append(pattern)
+                self.pattern_modes.append(mode)
+                self.pattern_keywords.append([])
+            if keyword not in self.pattern_keywords[pattern_ids[key]]:
+                self.pattern_keywords[pattern_ids[key]].append(keyword)
+
+        self._build()
+        self._build_regex()
+
+    def _build(self):
+        """
+        Builds the trie, the failure links and the output lists
+        """
+        goto = [{}]
+        outputs = [[]]
+        self._empty_patterns = []
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            if self.pattern_modes[pattern_id] == REGEX:
+                continue
+            if not pattern:
+                # str.count("") matches between every character
+                self._empty_patterns.append(pattern_id)
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(pattern_id)
+
+        # Breadth-first pass to set failure links and merge outputs,
+        # so that "equity" is reported inside "health equity"
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fallback = goto[f].get(ch, 0)
+                fail[nxt] = fallback if fallback != nxt else 0
+                outputs[nxt].extend(outputs[fail[nxt]])
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = [tuple(out) for out in outputs]
+        self._lengths = [len(pattern) for pattern in self.patterns]
+        self._modes = list(self.pattern_modes)
+
+        # Small substring-only lists skip the automaton (see STR_SEARCH_MAX_PATTERNS)
+        self._str_patterns = None
+        searched = [
+            (pattern_id, pattern) for pattern_id, pattern in enumerate(self.patterns)
+            if self.pattern_modes[pattern_id] != REGEX and pattern
+        ]
+        if len(searched) <= STR_SEARCH_MAX_PATTERNS and all(
+            self.pattern_modes[pattern_id] == SUBSTRING for pattern_id, _ in searched
+        ):
+            self._str_patterns = searched
+
+    def _build_regex(self):
+        """
+        Combines the regex keywords into a single expression: every position
+        where one of them matches is visited once, and each keyword's own
+        match is captured by a lookahead group.
+        Keywords that would change meaning inside the combined expression
+        (capturing groups, which backreferences and group names refer to,
+        or inline global flags such as (?i)) are compiled on their own.
+        """
+        self._regex = None
+        self._regex_groups = []
+        self._separate_regexes = []
+        regexes = []
+        for pattern_id, pattern in enumerate(self.patterns):
+            if self.pattern_modes[pattern_id] != REGEX:
+                continue
+            try:
+                compiled = re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid regex keyword '{self.pattern_keywords[pattern_id][0]}': {e}")
+            if compiled.groups or compiled.flags != _DEFAULT_REGEX_FLAGS:
+                self._separate_regexes.append((re.compile(pattern, re.IGNORECASE), pattern_id))
+                continue
+            regexes.append((f"_k{pattern_id}", pattern, pattern_id))
+
+        if regexes:
+            any_match = "|".join(f"(?:{pattern})" for _, pattern, _ in regexes)
+            groups = "".join(f"(?=(?P<{group}>{pattern}))?" for group, pattern, _ in regexes)
+            try:
+                self._regex = re.compile(f"(?=(?:{any_match})){groups}", re.IGNORECASE)
+            except re.error:
+                # Valid on their own but not together: search them one by one
+                self._separate_regexes.extend(
+                    (re.compile(pattern, re.IGNORECASE), pattern_id) for _, pattern, pattern_id in regexes
+                )
+            else:
+                self._regex_groups = [(group, pattern_id) for group, _, pattern_id in regexes]
+
+    @property
+    def has_regex(self):
+        return self._regex is not None or bool(self._separate_regexes)
+
+    @property
+    def has_empty_patterns(self):
+        return bool(self._empty_patterns)
+
+    def count_patterns(self, text, spans=None):
+        """
+        Counts non-overlapping occurrences of each pattern in the text; for
+        substring keywords, with the same semantics as text.lower().count(pattern).
+        If a spans dictionary is given, the (start, end) character offsets of
+        every counted match are recorded in it, per pattern_id, in the same pass.
+        With normalize=True, the text must already be normalized (and spans
+        are offsets in it); otherwise spans are offsets in the text as given,
+        even where lowercasing changes its length (e.g. "İ").
+        Returns a dictionary {pattern_id: count} for patterns found.
+        """
+        lowered = None
+        if not self.normalize:
+            text, lowered = _lower(text, spans is not None)
+
+        counts = {}
+        last_end = {}  # pattern_id -> end of its last counted match
+        if self._str_patterns is not None:
+            self._count_str_patterns(text, counts, spans)
+        else:
+            self._count_automaton(text, counts, last_end, spans)
+
+        if self._regex is not None:
+            for match in self._regex.finditer(text):
+                for group, pattern_id in self._regex_groups:
+                    start, end = match.span(group)
+                    # Empty matches are not counted
+                    if end > start and start >= last_end.get(pattern_id, 0):
+                        last_end[pattern_id] = end
+                        counts[pattern_id] = counts.get(pattern_id, 0) + 1
+                        if spans is not None:
+                            spans.setdefault(pattern_id, []).append((start, end))
+
+        for regex, pattern_id in self._separate_regexes:
+            for match in regex.finditer(text):
+                start, end = match.span()
+                # Empty matches are not counted
+                if end > start:
+                    counts[pattern_id] = counts.get(pattern_id, 0) + 1
+                    if spans is not None:
+                        spans.setdefault(pattern_id, []).append((start, end))
+
+        for pattern_id in self._empty_patterns:
+            counts[pattern_id] = len(text) + 1
+
+        if lowered is not None:
+            for pattern_id, pattern_spans in spans.items():
+                spans[pattern_id] = [lowered.to_original(start, end) for start, end in pattern_spans]
+        return counts
+
+    def _count_automaton(self, text, counts, last_end, spans):
+        """
+        count_patterns for the automaton's patterns, in a single pass
+        """
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        lengths = self._lengths
+        modes = self._modes
+
+        state = 0
+        for i, ch in enumerate(text):
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+
+            if outputs[state]:
+                end = i + 1
+                for pattern_id in outputs[state]:
+                    # Skip matches overlapping the previous one of the same pattern
+                    start = end - lengths[pattern_id]
+                    if start < last_end.get(pattern_id, 0):
+                        continue
+                    match_end = end
+                    if modes[pattern_id] != SUBSTRING:
+                        match_end = _match_end(text, start, end, modes[pattern_id])
+                        if match_end is None:
+                            continue
+                    last_end[pattern_id] = match_end
+                    counts[pattern_id] = counts.get(pattern_id, 0) + 1
+                    if spans is not None:
+                        spans.setdefault(pattern_id, []).append((start, match_end))
+
+    def _count_str_patterns(self, text, counts, spans):
+        """
+        count_patterns for small substring-only lists, with str.count (or
+        str.find when spans are recorded)
+        """
+        for pattern_id, pattern in self._str_patterns:
+            if spans is None:
+                count = text.count(pattern)
+            else:
+                length = len(pattern)
+                pattern_spans = []
+                start = text.find(pattern)
+                while start >= 0:
+                    pattern_spans.append((start, start + length))
+                    start = text.find(pattern, start + length)
+                count = len(pattern_spans)
+                if count:
+                    spans[pattern_id] = pattern_spans
+            if count:
+                counts[pattern_id] = count
+
+    def find_first_patterns(self, text, pattern_ids):
+        """
+        Presence mode: finds the first match of each of the given patterns,
+        and stops scanning as soon as all of them have been found.
+        With normalize=True, the text must already be normalized.
+        Returns a dictionary {pattern_id: (start, end)} for patterns found,
+        with offsets as in count_patterns.
+        """
+        lowered = None
+        if not self.normalize:
+            text, lowered = _lower(text, True)
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        lengths = self._lengths
+        modes = self._modes
+
+        first = {}
+        wanted = set(pattern_ids)
+        for pattern_id in self._empty_patterns:
+            if pattern_id in wanted:
+                first[pattern_id] = (0, 0)
+        separate_wanted = [
+            (regex, pattern_id) for regex, pattern_id in self._separate_regexes if pattern_id in wanted
+        ]
+        regex_wanted = {pattern_id for _, pattern_id in self._regex_groups} & wanted
+        remaining = len(wanted) - len(first) - len(regex_wanted) - len(separate_wanted)
+
+        if self._str_patterns is not None:
+            for pattern_id, pattern in self._str_patterns:
+                if pattern_id in wanted:
+                    start = text.find(pattern)
+                    if start >= 0:
+                        first[pattern_id] = (start, start + len(pattern))
+            # Nothing left for the automaton
+            remaining = 0
+
+        state = 0
+        for i, ch in enumerate(text):
+            if not remaining:
+                break
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+
+            if outputs[state]:
+                end = i + 1
+                for pattern_id in outputs[state]:
+                    if pattern_id not in wanted or pattern_id in first:
+                        continue
+                    start = end - lengths[pattern_id]
+                    match_end = end
+                    if modes[pattern_id] != SUBSTRING:
+                        match_end = _match_end(text, start, end, modes[pattern_id])
+                        if match_end is None:
+                            continue
+                    first[pattern_id] = (start, match_end)
+                    remaining -= 1
+
+        if regex_wanted:
+            remaining = len(regex_wanted)
+            for match in self._regex.finditer(text):
+                for group, pattern_id in self._regex_groups:
+                    if pattern_id in regex_wanted and pattern_id not in first:
+                        start, end = match.span(group)
+                        if end > start:
+                            first[pattern_id] = (start, end)
+                            remaining -= 1
+                if not remaining:
+                    break
+
+        for regex, pattern_id in separate_wanted:
+            for match in regex.finditer(text):
+                if match.end() > match.start():
+                    first[pattern_id] = match.span()
+                    break
+
+        if lowered is not None:
+            first = {pattern_id: lowered.to_original(*span) for pattern_id, span in first.items()}
+        return first
+
+    def find_first(self, text, found=()):
+        """
+        Presence mode: finds the first match of each keyword not in found
+        Returns a dictionary {keyword: (start, end)} for keywords found
+        """
+        pattern_ids = [
+            pattern_id for pattern_id, keywords in enumerate(self.pattern_keywords)
+            if any(keyword not in found for keyword in keywords)
+        ]
+        if not pattern_ids:
+            return {}
+
+        normalized = None
+        if isinstance(text, NormalizedText):
+            normalized = text
+        elif self.normalize:
+            normalized = normalize_text(text)
+
+        first = {}
+        for pattern_id, span in self.find_first_patterns(normalized.text if normalized else text, pattern_ids).items():
+            if normalized is not None:
+                span = normalized.to_original(*span)
+            for keyword in self.pattern_keywords[pattern_id]:
+                if keyword not in found:
+                    first[keyword] = span
+        return first
+
+    def count(self, text):
+        """
+        Counts keyword occurrences in the text
+        Returns a dictionary {keyword: count} for keywords found
+        """
+        if isinstance(text, NormalizedText):
+            text = text.text
+        elif self.normalize:
+            text = normalize_text(text, with_offsets=False)
+
+        result = {}
+        for pattern_id, count in self.count_patterns(text).items():
+            for keyword in self.pattern_keywords[pattern_id]:
+                result[keyword] = count
+        return result
+
+    def find(self, text):
+        """
+        Counts keyword occurrences and records where they are
+        Returns a tuple ({keyword: count}, {keyword: [(start, end), ...]})
+        """
+        normalized = None
+        if isinstance(text, NormalizedText):
+            normalized = text
+        elif self.normalize:
+            normalized = normalize_text(text)
+
+        pattern_spans = {}
+        counts = self.count_patterns(normalized.text if normalized else text, pattern_spans)
+
+        if normalized is not None:
+            # Offsets in the original text
+            for pattern_id, match_spans in pattern_spans.items():
+                pattern_spans[pattern_id] = [normalized.to_original(start, end) for start, end in match_spans]
+
+        keyword_counts = {}
+        spans = {}
+        for pattern_id, count in counts.items():
+            for keyword in self.pattern_keywords[pattern_id]:
+                keyword_counts[keyword] = count
+                spans[keyword] = pattern_spans.get(pattern_id, [])
+        return keyword_counts, spans
+
+
+@lru_cache(maxsize=MATCHER_CACHE_SIZE)
+def _get_cached_matcher(keywords, normalize):
+    return KeywordMatcher(keywords, normalize)
+
+
+def get_keyword_matcher(keywords, normalize=False):
+    """
+    Returns the compiled matcher for a keyword list, building it only the
+    first time the same list (and options) is searched
+    """
+    return _get_cached_matcher(tuple(keywords), normalize)
+
+
+# Running keyword totals, built up one page at a time
+class KeywordAggregate:
+    """
+    Accumulates per-page keyword hits into the search results structure
+    {keyword: {"count": total, "pages": [page numbers]}}
+    With with_offsets=True, each keyword also gets an "offsets" list of
+    (page_num, start, end) character offsets of its matches.
+    """
+
+    def __init__(self, keywords, with_offsets=False):
+        self.keywords = list(keywords)
+        self.with_offsets = with_offsets
+        self.counts = {}
+        self.pages = {}
+        self.offsets = {}
+        # Total number of pages being searched, if known
+        self.page_count = None
+
+    def add_page(self, page_num, hits, spans=None):
+        """
+        Adds the {keyword: count} hits of one page, and their
+        {keyword: [(start, end), ...]} spans if offsets are recorded
+        """
+        for keyword, count in hits.items():
+            self.counts[keyword] = self.counts.get(keyword, 0) + count
+            # Record the page number where the keyword was found
+            self.pages.setdefault(keyword, []).append(int(page_num))
+
+        if self.with_offsets and spans:
+            for keyword, keyword_spans in spans.items():
+                offsets = self.offsets.setdefault(keyword, [])
+                offsets.extend((int(page_num), start, end) for start, end in keyword_spans)
+
+    def results(self):
+        """
+        Returns the results so far, in keyword list order
+        """
+        result = {}
+        for keyword in self.keywords:
+            if keyword in self.counts:
+                result[keyword] = {"count": self.counts[keyword], "pages": list(self.pages[keyword])}
+                if self.with_offsets:
+                    result[keyword]["offsets"] = list(self.offsets.get(keyword, []))
+        return result
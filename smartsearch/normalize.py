@@ -0,0 +1,239 @@
+# normalize.py
+# One-time text normalization after extraction: NFKC, casefold,
+# de-hyphenation and whitespace collapsing, with a compact map from
+# normalized offsets back to the original text.
+import re
+import unicodedata
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+
+
+# Line-end hyphenation between two letters ("discrimi-\nnation");
+# the word is joined if it continues with a lowercase letter
+HYPHENATION_PATTERN = re.compile(r"(?<=[^\W\d_])[-\u2010][ \t]*\r?\n\s*(?=[^\W\d_])")
+
+SOFT_HYPHEN = "\u00ad"
+
+# Words and the single spaces between them
+WORD_PATTERN = re.compile(r"\S+| ")
+
+# Everything the normalizer changes, other than character-level NFKC/casefold
+# (single spaces are left in place, so plain text is copied in long runs)
+SPECIAL_PATTERN = re.compile(HYPHENATION_PATTERN.pattern + "|" + SOFT_HYPHEN + r"|\s{2,}|[^\S ]")
+
+
+# ASCII characters, which NFKC + casefold always map to one character
+_ASCII_CHARS = frozenset(map(chr, range(128)))
+
+
+@lru_cache(maxsize=4096)
+def _normalizes_to_one(ch):
+    return len(unicodedata.normalize("NFKC", ch).casefold()) == 1
+
+
+def _one_to_one(text):
+    """
+    NFKC + casefold of text if every character normalizes to exactly one
+    character (so no character is expanded, and none is composed with the
+    next), else None
+    """
+    normalized = unicodedata.normalize("NFKC", text).casefold()
+    if len(normalized) != len(text):
+        return None
+    if not all(map(_normalizes_to_one, set(text) - _ASCII_CHARS)):
+        # An expansion and a contraction cancelled out ("ﬁ" and "e\u0301")
+        return None
+    return normalized
+
+
+def _char_runs(word):
+    """
+    Yields the (start, end) of each base character and the combining marks
+    following it (e.g. "e\u0301"), which NFKC may compose into one
+    """
+    start = 0
+    for i in range(1, len(word) + 1):
+        if i == len(word) or not unicodedata.combining(word[i]):
+            yield start, i
+            start = i
+
+
+def _normalize_chars(segment):
+    """
+    NFKC + casefold of a segment without whitespace runs or hyphenation
+    Returns the normalized string if every character normalizes to exactly
+    one character, else a list of (piece, index in segment, width) where
+    width is the number of original characters the piece replaces, or None
+    if each of its characters maps to one original character
+    """
+    if segment.isascii():
+        return segment.lower()
+    normalized = _one_to_one(segment)
+    if normalized is not None:
+        return normalized
+
+    # Expanding or combining characters (ligatures, "ß", decomposed accents):
+    # only the words containing them are mapped, one character with its
+    # combining marks at a time
+    pieces = []
+    for word in WORD_PATTERN.finditer(segment):
+        piece = _one_to_one(word.group())
+        if piece is not None:
+            pieces.append((piece, word.start(), None))
+            continue
+        for start, end in _char_runs(word.group()):
+            piece = unicodedata.normalize("NFKC", word.group()[start:end]).casefold()
+            if len(piece) == 1 and end - start == 1:
+                pieces.append((piece, word.start() + start, None))
+            else:
+                pieces.append((piece, word.start() + start, end - start))
+    return pieces
+
+
+# Normalized text with a map back to the original offsets
+class NormalizedText:
+    """
+    Normalized form of a page of text.
+    The offset map is stored as breakpoints: from norm_starts[i] on, each
+    normalized character starts at orig_starts[i] + (its distance from
+    norm_starts[i]) in the original text, and ends at orig_ends[i] + (that
+    distance), until the next breakpoint. Characters of an expanded or
+    composed piece get a breakpoint each, covering the whole original piece.
+    """
+
+    __slots__ = ("text", "norm_starts", "orig_starts", "orig_ends")
+
+    def __init__(self, text, norm_starts, orig_starts, orig_ends):
+        self.text = text
+        self.norm_starts = norm_starts
+        self.orig_starts = orig_starts
+        self.orig_ends = orig_ends
+
+    def __len__(self):
+        return len(self.text)
+
+    def to_original(self, start, end):
+        """
+        Maps a [start, end) span of the normalized text to the original text
+        """
+        if end <= start:
+            original_start = self._original_offset(start)
+            return original_start, original_start
+        i = bisect_right(self.norm_starts, end - 1) - 1
+        return self._original_offset(start), self.orig_ends[i] + (end - 1 - self.norm_starts[i])
+
+    def _original_offset(self, offset):
+        i = bisect_right(self.norm_starts, offset) - 1
+        return self.orig_starts[i] + (offset - self.norm_starts[i])
+
+
+def normalize_text(text, with_offsets=True):
+    """
+    Normalizes text once for matching: NFKC (ligatures such as "ﬁ"),
+    casefold, soft hyphens removed, words hyphenated across lines joined,
+    and whitespace runs (including line breaks) collapsed to one space
+    Returns a NormalizedText, or just the normalized string if
+    with_offsets is False
+    """
+    pieces = []
+    norm_starts = array("Q")
+    orig_starts = array("Q")
+    orig_ends = array("Q")
+    length = 0  # length of the normalized text so far
+    expected = None  # original offset the next piece continues from
+
+    def add(piece, orig_start, width=None):
+        nonlocal length, expected
+        if not piece:
+            return
+        if with_offsets:
+            if width is not None:
+                # Every character of an expanded ("ﬁ" -> "fi") or composed
+                # ("e\u0301" -> "é") piece maps to the whole original piece
+                for k in range(len(piece)):
+                    norm_starts.append(length + k)
+                    orig_starts.append(orig_start)
+                    orig_ends.append(orig_start + width)
+                expected = None
+            else:
+                if orig_start != expected:
+                    norm_starts.append(length)
+                    orig_starts.append(orig_start)
+                    orig_ends.append(orig_start + 1)
+                expected = orig_start + len(piece)
+        pieces.append(piece)
+        length += len(piece)
+
+    def add_segment(start, end):
+        normalized = _normalize_chars(text[start:end])
+        if isinstance(normalized, str):
+            add(normalized, start)
+        else:
+            for piece, i, width in normalized:
+                add(piece, start + i, width)
+
+    position = 0
+    for match in SPECIAL_PATTERN.finditer(text):
+        start, end = match.span()
+        add_segment(position, start)
+        matched = match.group()
+        if matched == SOFT_HYPHEN:
+            pass
+        elif matched.isspace():
+            add(" ", start)
+        elif not text[end].islower():
+            # Hyphen at a line end before a capital: keep the hyphen
+            add("-", start)
+            add(" ", start + 1)
+        position = end
+    add_segment(position, len(text))
+
+    normalized = "".join(pieces)
+    if not with_offsets:
+        return normalized
+    if not norm_starts:
+        norm_starts.append(0)
+        orig_starts.append(0)
+        orig_ends.append(1)
+    return NormalizedText(normalized, norm_starts, orig_starts, orig_ends)
+
+
+def lowercase_text(text):
+    """
+    Lowercases text like str.lower(), with a map back to the original
+    offsets for the characters whose lowercase is longer ("İ" -> "i̇")
+    Returns a NormalizedText
+    """
+    norm_starts = array("Q", [0])
+    orig_starts = array("Q", [0])
+    orig_ends = array("Q", [1])
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return NormalizedText(lowered, norm_starts, orig_starts, orig_ends)
+
+    pieces = []
+    length = 0
+    for i, ch in enumerate(text):
+        piece = ch.lower()
+        if len(piece) != 1:
+            # Every character of the piece maps to the original character
+            for k in range(len(piece)):
+                norm_starts.append(length + k)
+                orig_starts.append(i)
+                orig_ends.append(i + 1)
+            norm_starts.append(length + len(piece))
+            orig_starts.append(i + 1)
+            orig_ends.append(i + 2)
+        pieces.append(piece)
+        length += len(piece)
+    return NormalizedText("".join(pieces), norm_starts, orig_starts, orig_ends)
+
+
+def normalize_pages(all_text):
+    """
+    Normalizes every page of a {page_num: text} dictionary once, so the
+    result can be kept and searched with many keyword lists
+    Returns {page_num: NormalizedText}
+    """
+    return {page_num: normalize_text(text) for page_num, text in all_text.items()}
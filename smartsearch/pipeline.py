@@ -0,0 +1,178 @@
+# pipeline.py
+# Asyncio ingestion pipeline for batch runs on slow (e.g. network) storage:
+# file reads, CPU-bound searches and output writes overlap, with bounded
+# queues between the stages so memory stays flat for any number of inputs.
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    from .batch import (
+        _init_batch_worker, add_to_summary, finish_summary, iter_pdf_paths, new_summary, search_document
+    )
+    from .cache import hash_pdf_bytes
+    from .dedup import DocumentDedup
+except ImportError:
+    from batch import (
+        _init_batch_worker, add_to_summary, finish_summary, iter_pdf_paths, new_summary, search_document
+    )
+    from cache import hash_pdf_bytes
+    from dedup import DocumentDedup
+
+
+# Files read at the same time
+DEFAULT_READERS = 8
+
+# PDFs read ahead of the worker processes, per worker
+READ_AHEAD_PER_WORKER = 2
+
+# End of stream marker passed through the queues
+_DONE = object()
+
+
+def _read_file(path, with_digest=False):
+    """
+    Returns the file's bytes, and their content hash if with_digest is set
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    return data, hash_pdf_bytes(data) if with_digest else None
+
+
+async def _list_paths(loop, executor, inputs, path_queue, readers):
+    """
+    Stage 1: lists the input files (in its own thread, directory listings can be slow)
+    """
+    paths = iter_pdf_paths(inputs)
+    while True:
+        path = await loop.run_in_executor(executor, next, paths, _DONE)
+        if path is _DONE:
+            break
+        await path_queue.put(path)
+    for _ in range(readers):
+        await path_queue.put(_DONE)
+
+
+async def _read_files(loop, executor, path_queue, data_queue, result_queue, document_dedup=None):
+    """
+    Stage 2: reads whole files; unreadable files go straight to the output,
+    and so do the records of duplicate documents (see DocumentDedup)
+    """
+    while True:
+        path = await path_queue.get()
+        if path is _DONE:
+            break
+        try:
+            data, digest = await loop.run_in_executor(executor, _read_file, path, document_dedup is not None)
+        except OSError as e:
+            await result_queue.put({"path": path, "error": f"{type(e).__name__}: {e}"})
+            continue
+        if document_dedup is not None:
+            ready = document_dedup.add(path, digest)
+            if ready is not None:
+                for record in ready:
+                    await result_queue.put(record)
+                continue
+        await data_queue.put((path, data, digest))
+
+
+async def _search_files(loop, executor, data_queue, result_queue, document_dedup=None):
+    """
+    Stage 3: searches the file contents in the worker processes
+    """
+    while True:
+        item = await data_queue.get()
+        if item is _DONE:
+            break
+        path, data, digest = item
+        record = await loop.run_in_executor(executor, search_document, path, data)
+        await result_queue.put(record)
+        if document_dedup is not None:
+            for duplicate in document_dedup.finish(digest, record):
+                await result_queue.put(duplicate)
+
+
+async def _write_results(loop, executor, result_queue, output, summary):
+    """
+    Stage 4: writes the records in a single thread, in completion order
+    """
+    while True:
+        record = await result_queue.get()
+        if record is _DONE:
+            break
+        await loop.run_in_executor(executor, output.write, record)
+        add_to_summary(summary, record)
+
+
+async def run_pipeline(inputs, keywords, output, workers=None, readers=DEFAULT_READERS,
+                       normalize=False, pages=None, presence=False, dedup=True):
+    """
+    Asyncio version of run_batch: readers files are read concurrently while
+    the worker processes search the files already read, and the records are
+    written as they complete. At most about readers + 3 x workers documents
+    are in memory at any time. If a stage fails (e.g. a worker process
+    dies), the other stages are cancelled and the error is raised.
+    Returns the same summary dictionary as run_batch.
+    """
+    workers = workers or os.cpu_count() or 1
+    loop = asyncio.get_running_loop()
+
+    path_queue = asyncio.Queue(readers)
+    data_queue = asyncio.Queue(workers * READ_AHEAD_PER_WORKER)
+    result_queue = asyncio.Queue(workers * READ_AHEAD_PER_WORKER)
+
+    summary = new_summary()
+    start_time = time.perf_counter()
+    # Only touched from the event loop thread
+    document_dedup = DocumentDedup() if dedup else None
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_batch_worker,
+        initargs=(keywords, normalize, pages, presence, dedup)
+    ) as process_executor, ThreadPoolExecutor(1) as list_executor, ThreadPoolExecutor(readers) as read_executor, \
+            ThreadPoolExecutor(1) as write_executor:
+        writer = asyncio.ensure_future(_write_results(loop, write_executor, result_queue, output, summary))
+        searchers = [
+            asyncio.ensure_future(_search_files(loop, process_executor, data_queue, result_queue, document_dedup))
+            for _ in range(workers)
+        ]
+        file_readers = [
+            asyncio.ensure_future(
+                _read_files(loop, read_executor, path_queue, data_queue, result_queue, document_dedup)
+            )
+            for _ in range(readers)
+        ]
+
+        async def close_stages():
+            await _list_paths(loop, list_executor, inputs, path_queue, readers)
+            # Close each stage once the previous one is finished
+            await asyncio.gather(*file_readers)
+            for _ in range(workers):
+                await data_queue.put(_DONE)
+            await asyncio.gather(*searchers)
+            await result_queue.put(_DONE)
+            await writer
+
+        tasks = [writer] + searchers + file_readers + [asyncio.ensure_future(close_stages())]
+        try:
+            # A failed stage would leave the others blocked on its queue: stop them all
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    return finish_summary(summary, time.perf_counter() - start_time)
+
+
+def run_batch_pipeline(inputs, keywords, output, workers=None, readers=DEFAULT_READERS,
+                       normalize=False, pages=None, presence=False, dedup=True):
+    """
+    Runs run_pipeline in a new event loop (see run_batch for the arguments)
+    """
+    return asyncio.run(run_pipeline(inputs, keywords, output, workers, readers, normalize, pages, presence, dedup))
@@ -1,28 +1,576 @@
 #!/usr/bin/env python3
 
-import subprocess
+import argparse
 import sys
+from contextlib import ExitStack
 from pathlib import Path
 
-def main():
+
+def run_app():
     """Run the Smart Search Streamlit app"""
     print("🔍 Starting Smart Search...")
-    
+
     # Get path to app.py in same directory
     app_path = Path(__file__).parent / "app.py"
-    
-    # Run streamlit
+
+    # Run streamlit in this process rather than starting a second interpreter
     try:
-        subprocess.run([
-            sys.executable, "-m", "streamlit", "run", str(app_path),
+        from streamlit.web import cli as streamlit_cli
+
+        streamlit_cli.main([
+            "run", str(app_path),
             "--server.headless", "false",
             "--browser.gatherUsageStats", "false"
-        ])
+        ], prog_name="streamlit")
     except KeyboardInterrupt:
         print("\n👋 Goodbye!")
     except Exception as e:
         print(f"❌ Error: {e}")
         sys.exit(1)
 
+
+def get_cli_keywords(args):
+    """Keywords from --keyword options, a --keywords-file, or the saved list"""
+    try:
+        from .backend import load_keywords, read_keywords_file
+    except ImportError:
+        from backend import load_keywords, read_keywords_file
+
+    if args.keyword:
+        return args.keyword
+    if args.keywords_file:
+        return read_keywords_file(args.keywords_file)
+    return load_keywords()
+
+
+def run_search(args):
+    """Search a single PDF and stream the hits page by page"""
+    try:
+        from .backend import ExtractionCache, KeywordAggregate, MemoryBudget, iter_search_pdf
+        from .dedup import PageHitCache
+        from .textstore import SpillingPageText, TextStoreWriter
+    except ImportError:
+        from backend import ExtractionCache, KeywordAggregate, MemoryBudget, iter_search_pdf
+        from dedup import PageHitCache
+        from textstore import SpillingPageText, TextStoreWriter
+
+    if args.save_text and (args.pages or args.presence):
+        sys.exit("❌ --save-text saves the whole document, it cannot be combined with --pages or --presence")
+    if args.highlight and Path(args.highlight).resolve() == Path(args.pdf).resolve():
+        sys.exit("❌ --highlight cannot overwrite the PDF being searched")
+
+    keywords = get_cli_keywords(args)
+    aggregate = KeywordAggregate(keywords)
+    cache = None if args.no_cache else ExtractionCache()
+    text_writer = TextStoreWriter(args.save_text) if args.save_text else None
+    page_cache = None if args.no_dedup else PageHitCache()
+    budget = None
+    if args.max_memory is not None or args.max_chars is not None:
+        budget = MemoryBudget(args.max_chars, args.max_memory)
+    profiling = args.profile is not None or args.cprofile or args.tracemalloc
+    profile_text = None
+    if profiling:
+        profile_text = SpillingPageText() if budget is not None else {}
+
+    with ExitStack() as stack:
+        if profiling:
+            try:
+                from .instrumentation import collect_metrics, profile_run
+            except ImportError:
+                from instrumentation import collect_metrics, profile_run
+            metrics = stack.enter_context(collect_metrics())
+            capture = stack.enter_context(profile_run(args.cprofile, args.tracemalloc))
+
+        try:
+            for page_num, text, hits in iter_search_pdf(
+                args.pdf, keywords, aggregate, cache=cache,
+                normalize=args.normalize, pages=args.pages, presence=args.presence, budget=budget,
+                page_cache=page_cache, collect=profile_text
+            ):
+                if text_writer is not None:
+                    text_writer.add_page(page_num, text)
+                if hits:
+                    found = ", ".join(f"'{keyword}' ({count})" for keyword, count in hits.items())
+                    print(f"Page {page_num}: {found}", flush=True)
+            if text_writer is not None:
+                text_writer.close()
+                print(f"Extracted text saved to: {args.save_text}", file=sys.stderr)
+        except Exception as e:
+            if text_writer is not None:
+                text_writer.abort()
+            print(f"❌ Error processing PDF: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    if profiling:
+        if budget is not None:
+            profile_text.finish()
+        write_profile_report(args.profile or "-", metrics, capture, profile_text, keywords, args.normalize)
+
+    if budget is not None:
+        print(format_memory_report(budget.report()), file=sys.stderr)
+    if page_cache is not None and page_cache.duplicate_pages:
+        print(
+            f"Reused the hits of {page_cache.duplicate_pages} duplicate pages "
+            f"({page_cache.duplicate_chars:,} characters not searched again)",
+            file=sys.stderr
+        )
+
+    if args.highlight:
+        write_highlighted_pdf(args, keywords)
+
+    results = aggregate.results()
+    print("=" * 50)
+    if results:
+        print("Keyword Matches Found:")
+        for keyword, info in results.items():
+            if args.presence:
+                print(f"'{keyword}': first found on page {info['pages'][0]}")
+                continue
+            pages = ", ".join(map(str, info["pages"]))
+            print(f"'{keyword}': found {info['count']} times on pages: {pages}")
+        if args.presence:
+            missing = [keyword for keyword in keywords if keyword not in results]
+            if missing:
+                print("Not found: " + ", ".join(f"'{keyword}'" for keyword in missing))
+    else:
+        print("No keyword matches found.")
+
+
+def write_highlighted_pdf(args, keywords):
+    """Save a copy of the searched PDF with every keyword hit highlighted"""
+    try:
+        from .highlight import highlight_pdf
+    except ImportError:
+        from highlight import highlight_pdf
+
+    try:
+        summary = highlight_pdf(args.pdf, keywords, args.highlight, normalize=args.normalize, pages=args.pages)
+    except Exception as e:
+        print(f"❌ Error highlighting PDF: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(
+        f"Highlighted PDF saved to: {args.highlight} "
+        f"({summary['hits']:,} hits on {summary['pages']:,} pages)",
+        file=sys.stderr
+    )
+
+
+def format_memory_report(memory):
+    """One line summary of a MemoryBudget report"""
+    line = f"Peak page text in memory: {memory['peak_text_mb']:,.1f} MB"
+    limits = []
+    if memory["max_mb"] is not None:
+        limits.append(f"{memory['max_mb']:,g} MB")
+    if memory["max_chars"] is not None:
+        limits.append(f"{memory['max_chars']:,} characters")
+    line += f" (budget {' / '.join(limits)})"
+    if memory["spilled_pages"]:
+        line += f", {memory['spilled_pages']:,} pages of text spilled to disk"
+    return line
+
+
+def write_profile_report(destination, metrics, capture, all_text, keywords, normalize=False):
+    """Write the --profile JSON report to a file, or to standard error for "-" """
+    import json
+    try:
+        from .instrumentation import measure_keyword_costs
+    except ImportError:
+        from instrumentation import measure_keyword_costs
+
+    report = {
+        "metrics": metrics.report(),
+        "keyword_costs": measure_keyword_costs(all_text, keywords, normalize),
+    }
+    report.update(capture)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if destination == "-":
+        print(text, file=sys.stderr)
+    else:
+        with open(destination, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Profile report saved to: {destination}", file=sys.stderr)
+
+
+def run_batch_command(args):
+    """Search directories or glob patterns of PDFs and stream the results"""
+    try:
+        from .batch import WRITERS, print_summary, run_batch
+    except ImportError:
+        from batch import WRITERS, print_summary, run_batch
+
+    keywords = get_cli_keywords(args)
+    output_format = args.format
+    if output_format is None:
+        output_format = "csv" if args.output and args.output.lower().endswith(".csv") else "jsonl"
+
+    if args.output:
+        output_file = open(args.output, "w", encoding="utf-8", newline="")
+    else:
+        output_file = sys.stdout
+
+    try:
+        if args.readers:
+            try:
+                from .pipeline import run_batch_pipeline
+            except ImportError:
+                from pipeline import run_batch_pipeline
+            summary = run_batch_pipeline(
+                args.inputs, keywords, WRITERS[output_format](output_file), args.workers, args.readers,
+                args.normalize, args.pages, args.presence, not args.no_dedup
+            )
+        else:
+            summary = run_batch(
+                args.inputs, keywords, WRITERS[output_format](output_file), args.workers,
+                args.normalize, args.pages, args.presence, not args.no_dedup
+            )
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+
+    print_summary(summary)
+    if summary["failed"]:
+        sys.exit(1)
+
+
+def run_index_command(args):
+    """Build or incrementally update the corpus index"""
+    try:
+        from .index import CorpusIndex, format_update_stats, update_index, watch_index
+    except ImportError:
+        from index import CorpusIndex, format_update_stats, update_index, watch_index
+
+    with CorpusIndex(args.db) as index:
+        stats = update_index(index, args.inputs, args.workers)
+        print(f"{format_update_stats(stats)} ({index.db_path})", file=sys.stderr)
+        for path, error in stats["failed"]:
+            print(f"  failed: {path}: {error}", file=sys.stderr)
+
+        if args.watch:
+            print(f"Watching for changes every {args.interval}s (Ctrl+C to stop)", file=sys.stderr)
+            watch_index(index, args.inputs, args.interval, args.workers)
+        elif stats["failed"]:
+            sys.exit(1)
+
+
+def run_query_command(args):
+    """Search the corpus index and print one JSON line per matching document"""
+    import json
+    import math
+    import time
+    try:
+        from .index import CorpusIndex, rank_documents
+    except ImportError:
+        from index import CorpusIndex, rank_documents
+
+    keywords = get_cli_keywords(args)
+    weights = {}
+    for weight_option in args.weight or []:
+        keyword, _, weight = weight_option.rpartition("=")
+        try:
+            weight = float(weight)
+        except ValueError:
+            weight = None
+        if not keyword or weight is None or not math.isfinite(weight):
+            sys.exit(f"❌ Invalid --weight '{weight_option}', expected KEYWORD=WEIGHT with a number as WEIGHT")
+        weights[keyword] = weight
+
+    with CorpusIndex(args.db) as index:
+        start_time = time.perf_counter()
+        try:
+            if args.top:
+                results = rank_documents(index, keywords, args.top, weights, args.by_page)
+            else:
+                results = index.search(keywords)
+        except ValueError as e:
+            sys.exit(f"❌ {e}")
+        elapsed = time.perf_counter() - start_time
+
+    if args.top:
+        for rank, hit in enumerate(results, start=1):
+            print(json.dumps(dict(rank=rank, **hit), ensure_ascii=False))
+    else:
+        for path, doc_results in results.items():
+            print(json.dumps({"path": path, "results": doc_results}, ensure_ascii=False))
+    print(f"{len(results)} results in {elapsed * 1000:.1f} ms", file=sys.stderr)
+
+
+def run_serve_command(args):
+    """Run the HTTP search service"""
+    try:
+        from .server import run_server
+    except ImportError:
+        from server import run_server
+
+    run_server(
+        args.host, args.port, args.workers, args.max_pending, args.root,
+        use_cache=not args.no_cache, quiet=args.quiet
+    )
+
+
+def run_shard_serve_command(args):
+    """Serve one shard of a corpus for sharded searches"""
+    try:
+        from .batch import iter_pdf_paths
+        from .shard import parse_shard_spec, partition, run_shard
+    except ImportError:
+        from batch import iter_pdf_paths
+        from shard import parse_shard_spec, partition, run_shard
+
+    try:
+        index, count = parse_shard_spec(args.shard)
+    except ValueError as e:
+        sys.exit(f"❌ {e}")
+    paths = partition(iter_pdf_paths(args.inputs, text_stores=True), index, count)
+    run_shard(paths, args.host, args.port, args.shard, use_cache=not args.no_cache)
+
+
+def run_shard_search_command(args):
+    """Search every shard of a corpus and print one JSON line per document"""
+    import json
+    import time
+    try:
+        from .shard import ShardError, local_shards, scatter_gather
+    except ImportError:
+        from shard import ShardError, local_shards, scatter_gather
+
+    if bool(args.local) == bool(args.shard):
+        sys.exit("❌ Give the shard addresses with --shard, or start local shards with --local N INPUTS")
+    if args.local and not args.inputs:
+        sys.exit("❌ --local needs the PDF files, directories or glob patterns to split between the shards")
+
+    keywords = get_cli_keywords(args)
+    with ExitStack() as stack:
+        shards = args.shard
+        if args.local:
+            try:
+                shards = stack.enter_context(local_shards(args.inputs, args.local, use_cache=not args.no_cache))
+            except ShardError as e:
+                sys.exit(f"❌ {e}")
+
+        start_time = time.perf_counter()
+        search = scatter_gather(shards, keywords, args.timeout, args.normalize, args.pages, args.presence)
+        elapsed = time.perf_counter() - start_time
+
+    for path, record in search["documents"].items():
+        print(json.dumps(dict(path=path, **record), ensure_ascii=False))
+    answered = sum(1 for report in search["shards"].values() if "error" not in report)
+    print(
+        f"{len(search['documents'])} documents searched on {answered} of {len(shards)} shards "
+        f"in {elapsed * 1000:.1f} ms",
+        file=sys.stderr
+    )
+    for path, error in search["failed_documents"].items():
+        print(f"  failed: {path}: {error}", file=sys.stderr)
+    for address, report in search["shards"].items():
+        if "error" in report:
+            print(f"  shard {address} left out: {report['error']}", file=sys.stderr)
+    if not search["complete"]:
+        print("⚠️ Partial results: some shards did not answer", file=sys.stderr)
+        sys.exit(1)
+
+
+def add_keyword_arguments(parser):
+    """Keyword list options shared by the search subcommands"""
+    parser.add_argument(
+        "-k", "--keyword", action="append",
+        help="keyword to search for (can be repeated)"
+    )
+    parser.add_argument(
+        "-f", "--keywords-file",
+        help="JSON keywords file (defaults to the saved keywords list)"
+    )
+
+
+def add_search_option_arguments(parser):
+    """Search options of the PDF search subcommands"""
+    try:
+        from .backend import PageSelection
+    except ImportError:
+        from backend import PageSelection
+
+    parser.add_argument(
+        "--normalize", action="store_true",
+        help="match across ligatures, hyphenated line breaks and line breaks inside phrases"
+    )
+    parser.add_argument(
+        "--pages", type=PageSelection, metavar="SELECTION",
+        help='only extract and search these pages, e.g. "1-30" or "1-5,12,40-"'
+    )
+    parser.add_argument(
+        "--presence", action="store_true",
+        help="only report whether each keyword appears (and its first page); "
+             "stops reading the PDF once every keyword has been found"
+    )
+    parser.add_argument(
+        "--no-dedup", action="store_true",
+        help="search every page and document again, even exact duplicates of one already searched"
+    )
+
+
+def main(argv=None):
+    """Smart Search command line: runs the app unless a subcommand is given"""
+    parser = argparse.ArgumentParser(
+        prog="smartsearch",
+        description="Search keywords in PDF files"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("app", help="run the Streamlit web interface (default)")
+
+    search_parser = subparsers.add_parser("search", help="search a PDF file from the command line")
+    search_parser.add_argument("pdf", help="PDF file to search")
+    add_keyword_arguments(search_parser)
+    add_search_option_arguments(search_parser)
+    search_parser.add_argument(
+        "--no-cache", action="store_true",
+        help="do not read or write the extracted text cache"
+    )
+    search_parser.add_argument(
+        "--save-text", metavar="FILE",
+        help="also save the extracted text as a memory-mappable text store (name it *.sstx for shard-serve "
+             "to find it in a directory)"
+    )
+    search_parser.add_argument(
+        "--highlight", metavar="FILE",
+        help="also save a copy of the PDF with every keyword hit highlighted"
+    )
+    search_parser.add_argument(
+        "--profile", nargs="?", const="-", metavar="FILE",
+        help="write a JSON report of per-stage timings, counters and per-keyword "
+             "match cost to FILE (default: standard error)"
+    )
+    search_parser.add_argument(
+        "--max-memory", type=float, metavar="MB",
+        help="memory-capped mode: keep at most MB of page text in memory (the text only, not the whole "
+             "process), spilling the rest to disk"
+    )
+    search_parser.add_argument(
+        "--max-chars", type=int, metavar="N",
+        help="memory-capped mode: keep at most N characters of page text in memory"
+    )
+    search_parser.add_argument("--cprofile", action="store_true", help="add a cProfile report to the profile")
+    search_parser.add_argument("--tracemalloc", action="store_true", help="add a tracemalloc report to the profile")
+
+    batch_parser = subparsers.add_parser("batch", help="search many PDFs in parallel")
+    batch_parser.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns")
+    add_keyword_arguments(batch_parser)
+    add_search_option_arguments(batch_parser)
+    batch_parser.add_argument("-o", "--output", help="output file (default: standard output)")
+    batch_parser.add_argument(
+        "--format", choices=["jsonl", "csv"],
+        help="output format (default: from the output file extension, else jsonl)"
+    )
+    batch_parser.add_argument("-w", "--workers", type=int, help="worker processes (default: all cores)")
+    batch_parser.add_argument(
+        "--readers", type=int, metavar="N",
+        help="read N files at a time ahead of the workers (for slow or network storage)"
+    )
+
+    index_parser = subparsers.add_parser(
+        "index", help="add new or modified PDFs to the corpus index and drop deleted ones"
+    )
+    index_parser.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns")
+    index_parser.add_argument("--db", help="index database (default: ~/.smart_search_index.sqlite)")
+    index_parser.add_argument("-w", "--workers", type=int, help="worker processes (default: all cores)")
+    index_parser.add_argument("--watch", action="store_true", help="keep polling for changes")
+    index_parser.add_argument(
+        "--interval", type=float, default=30, help="seconds between polls in watch mode (default: 30)"
+    )
+
+    query_parser = subparsers.add_parser("query", help="search the corpus index")
+    add_keyword_arguments(query_parser)
+    query_parser.add_argument("--db", help="index database (default: ~/.smart_search_index.sqlite)")
+    query_parser.add_argument(
+        "--top", type=int, metavar="K", help="rank with BM25 and only print the K most relevant documents"
+    )
+    query_parser.add_argument("--by-page", action="store_true", help="rank pages instead of documents")
+    query_parser.add_argument(
+        "--weight", action="append", metavar="KEYWORD=WEIGHT",
+        help="weight of a keyword in the ranking (default 1, can be repeated)"
+    )
+
+    serve_parser = subparsers.add_parser("serve", help="run a local HTTP search service")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    serve_parser.add_argument("-w", "--workers", type=int, help="worker processes (default: all cores)")
+    serve_parser.add_argument(
+        "--max-pending", type=int, metavar="N",
+        help="documents queued or being searched before requests are refused with 503 (default: 4 per worker)"
+    )
+    serve_parser.add_argument("--root", help="allow searching PDFs by path under this directory")
+    serve_parser.add_argument("--no-cache", action="store_true", help="do not use the extracted text cache")
+    serve_parser.add_argument("--quiet", action="store_true", help="do not log requests")
+
+    shard_serve_parser = subparsers.add_parser(
+        "shard-serve", help="serve one shard of a corpus for shard-search"
+    )
+    shard_serve_parser.add_argument(
+        "inputs", nargs="+", help="PDF files or text stores, directories of them (text stores named *.sstx), or glob patterns"
+    )
+    shard_serve_parser.add_argument(
+        "--shard", default="1/1", metavar="I/N",
+        help="serve the I-th of N shards of the inputs, e.g. 2/4 (default: 1/1, every document)"
+    )
+    shard_serve_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    shard_serve_parser.add_argument("--port", type=int, default=8770, help="port to listen on (default: 8770)")
+    shard_serve_parser.add_argument("--no-cache", action="store_true", help="do not use the extracted text cache")
+
+    try:
+        from .backend import PageSelection
+    except ImportError:
+        from backend import PageSelection
+
+    shard_search_parser = subparsers.add_parser("shard-search", help="search every shard of a corpus")
+    add_keyword_arguments(shard_search_parser)
+    shard_search_parser.add_argument(
+        "inputs", nargs="*",
+        help="with --local: PDF files or text stores, directories of them (text stores named *.sstx), or glob patterns"
+    )
+    shard_search_parser.add_argument(
+        "--shard", action="append", metavar="HOST:PORT", help="address of a shard (can be repeated)"
+    )
+    shard_search_parser.add_argument(
+        "--local", type=int, metavar="N", help="start N shard processes on this machine over the inputs"
+    )
+    shard_search_parser.add_argument(
+        "--timeout", type=float, default=30.0,
+        help="seconds to wait for the shards; the others are reported as partial results (default: 30)"
+    )
+    shard_search_parser.add_argument(
+        "--normalize", action="store_true",
+        help="match across ligatures, hyphenated line breaks and line breaks inside phrases"
+    )
+    shard_search_parser.add_argument(
+        "--pages", type=PageSelection, metavar="SELECTION",
+        help='only search these pages of each document, e.g. "1-30" or "1-5,12,40-"'
+    )
+    shard_search_parser.add_argument(
+        "--presence", action="store_true",
+        help="only report whether each keyword appears in each document (and its first page)"
+    )
+    shard_search_parser.add_argument(
+        "--no-cache", action="store_true", help="with --local: do not use the extracted text cache"
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.command == "search":
+        run_search(args)
+    elif args.command == "batch":
+        run_batch_command(args)
+    elif args.command == "index":
+        run_index_command(args)
+    elif args.command == "query":
+        run_query_command(args)
+    elif args.command == "serve":
+        run_serve_command(args)
+    elif args.command == "shard-serve":
+        run_shard_serve_command(args)
+    elif args.command == "shard-search":
+        run_shard_search_command(args)
+    else:
+        run_app()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,392 @@
+# server.py
+# Headless HTTP search service (standard library only). Searches run on a
+# bounded pool of worker processes; requests beyond the queue limit are
+# refused with 503 so callers can back off and retry.
+import base64
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    from .backend import ExtractionCache, KeywordAggregate, PageSelection, iter_search_pdf
+except ImportError:
+    from backend import ExtractionCache, KeywordAggregate, PageSelection, iter_search_pdf
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Documents waiting or being searched per worker process; beyond this,
+# requests are refused with 503
+PENDING_PER_WORKER = 4
+
+# Largest request body accepted
+MAX_REQUEST_BYTES = 256 * 1024 * 1024
+
+# Request bodies held in memory at the same time, across every request;
+# beyond this, requests are refused with 503 before their body is read
+MAX_BUFFERED_BYTES = 2 * MAX_REQUEST_BYTES
+
+# Seconds clients are asked to wait before retrying a refused request
+RETRY_AFTER_SECONDS = 2
+
+
+class RequestError(Exception):
+    """
+    Invalid request, reported to the client with an HTTP status
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Extraction cache opened once by each worker process
+_worker_cache = None
+
+
+def _init_server_worker(use_cache):
+    global _worker_cache
+    _worker_cache = ExtractionCache() if use_cache else None
+
+
+def search_source(source, keywords, normalize=False, pages=None, presence=False):
+    """
+    Worker process task: searches one PDF, given as a path or as its bytes
+    Returns {"page_count", "results"} or {"error"}; errors are not raised
+    """
+    try:
+        aggregate = KeywordAggregate(keywords)
+        for _ in iter_search_pdf(
+            source, keywords, aggregate, cache=_worker_cache,
+            normalize=normalize, pages=pages, presence=presence, workers=1
+        ):
+            pass
+        return {"page_count": aggregate.page_count, "results": aggregate.results()}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+# Worker pool and admission control
+class SearchService:
+    """
+    Runs searches on a pool of worker processes. At most max_pending
+    documents are admitted at a time, across every request; a request that
+    does not fit is refused as a whole instead of queueing without bound.
+    Request bodies are only read while the service has room for them, up to
+    max_buffered bytes in total.
+    PDFs can be named by path only if a root directory is given, and only
+    inside it.
+    """
+
+    def __init__(self, workers=None, max_pending=None, root=None, use_cache=True, max_buffered=MAX_BUFFERED_BYTES):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * PENDING_PER_WORKER
+        self.max_buffered = max_buffered
+        self.root = Path(root).resolve() if root else None
+        self.pending = 0
+        self.buffered = 0
+        self.use_cache = use_cache
+        self._lock = threading.Lock()
+        self._executor = self._new_executor()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_server_worker,
+            initargs=(self.use_cache,)
+        )
+
+    def _replace_executor(self, broken):
+        """
+        Replaces a pool broken by a dead worker process (once, however many
+        requests found it broken)
+        """
+        with self._lock:
+            if self._executor is broken:
+                self._executor = self._new_executor()
+        broken.shutdown(wait=False)
+
+    def try_admit(self, count):
+        """
+        Reserves count document slots; returns False if they are not available
+        """
+        with self._lock:
+            if self.pending + count > self.max_pending:
+                return False
+            self.pending += count
+            return True
+
+    def release(self, count):
+        with self._lock:
+            self.pending -= count
+
+    def try_buffer(self, length):
+        """
+        Reserves room for a request body of length bytes; returns False if
+        the server is full, or already holds too many request bodies
+        """
+        with self._lock:
+            if self.pending >= self.max_pending or self.buffered + length > self.max_buffered:
+                return False
+            self.buffered += length
+            return True
+
+    def release_buffer(self, length):
+        with self._lock:
+            self.buffered -= length
+
+    def check_batch_size(self, count):
+        """
+        Raises RequestError(413) for a batch that could never be admitted
+        """
+        if count > self.max_pending:
+            raise RequestError(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f"a batch can have at most {self.max_pending} documents, split it into smaller batches"
+            )
+
+    def resolve_path(self, path):
+        if self.root is None:
+            raise RequestError(HTTPStatus.FORBIDDEN, "searching by path is disabled (start the server with --root)")
+        resolved = (self.root / path).resolve()
+        if resolved != self.root and self.root not in resolved.parents:
+            raise RequestError(HTTPStatus.FORBIDDEN, f"{path} is outside the server root")
+        return str(resolved)
+
+    def search(self, sources, keywords, options):
+        """
+        Searches every source in parallel; blocks until all are done
+        Raises RequestError(413) if there are more sources than can ever be
+        admitted, RequestError(503) if the queue is full, and
+        RequestError(500) if a worker process died during the search (the
+        pool is replaced for the next requests)
+        Returns a list of result records, in the order of sources
+        """
+        self.check_batch_size(len(sources))
+        if not self.try_admit(len(sources)):
+            raise RequestError(HTTPStatus.SERVICE_UNAVAILABLE, "server busy, retry later")
+        executor = self._executor
+        try:
+            futures = [
+                executor.submit(search_source, source, keywords, **options)
+                for source in sources
+            ]
+            records = []
+            for future in futures:
+                try:
+                    records.append(future.result())
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:  # e.g. a result that could not be sent back
+                    records.append({"error": f"{type(e).__name__}: {e}"})
+            return records
+        except BrokenProcessPool:
+            self._replace_executor(executor)
+            raise RequestError(HTTPStatus.INTERNAL_SERVER_ERROR, "a worker process stopped unexpectedly, retry later")
+        finally:
+            self.release(len(sources))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_keywords(keywords):
+    if not isinstance(keywords, list) or not keywords or not all(isinstance(kw, str) for kw in keywords):
+        raise RequestError(HTTPStatus.BAD_REQUEST, '"keywords" must be a non-empty list of strings')
+    return keywords
+
+
+def _flag(value):
+    # JSON booleans, or query parameters such as "1" or "true"
+    if isinstance(value, str):
+        return value.lower() not in ("", "0", "false", "no")
+    return bool(value)
+
+
+def parse_options(params):
+    """
+    Search options of a request: normalize, pages and presence
+    """
+    options = {
+        "normalize": _flag(params.get("normalize", False)),
+        "presence": _flag(params.get("presence", False)),
+        "pages": None,
+    }
+    pages = params.get("pages")
+    if pages:
+        try:
+            options["pages"] = PageSelection(str(pages))
+        except ValueError as e:
+            raise RequestError(HTTPStatus.BAD_REQUEST, str(e))
+    return options
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health  pool status
+    POST /search  one PDF: raw application/pdf body with ?keyword=...
+                  parameters, or a JSON {"keywords", "path" | "pdf_base64"}
+    POST /batch   JSON {"keywords", "documents": [{"path" | "pdf_base64"}, ...]}
+    Options (JSON fields or query parameters): normalize, pages, presence.
+    """
+
+    server_version = "smartsearch"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlsplit(self.path).path != "/health":
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+            return
+        service = self.server.service
+        self.send_json(HTTPStatus.OK, {
+            "status": "ok",
+            "workers": service.workers,
+            "pending": service.pending,
+            "max_pending": service.max_pending,
+        })
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        try:
+            if url.path not in ("/search", "/batch"):
+                # The body is not read, so the connection cannot be reused
+                self.close_connection = True
+                raise RequestError(HTTPStatus.NOT_FOUND, "not found")
+            length = self.read_content_length()
+            try:
+                body = self.rfile.read(length)
+                if url.path == "/search":
+                    self.handle_search(body, parse_qs(url.query))
+                else:
+                    self.handle_batch(body)
+            finally:
+                self.server.service.release_buffer(length)
+        except RequestError as e:
+            headers = {}
+            if e.status == HTTPStatus.SERVICE_UNAVAILABLE:
+                headers["Retry-After"] = str(RETRY_AFTER_SECONDS)
+            self.send_json(e.status, {"error": str(e)}, headers)
+
+    def read_content_length(self):
+        """
+        Checks the size of the request body before it is read, and reserves
+        room for it (see SearchService.try_buffer)
+        Returns the body length; the caller releases it once done
+        """
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            raise RequestError(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+        if length > MAX_REQUEST_BYTES:
+            # The body is not read, so the connection cannot be reused
+            self.close_connection = True
+            raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"request body larger than {MAX_REQUEST_BYTES} bytes")
+        if not self.server.service.try_buffer(length):
+            self.close_connection = True
+            raise RequestError(HTTPStatus.SERVICE_UNAVAILABLE, "server busy, retry later")
+        return length
+
+    def read_json(self, body):
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "request body is not valid JSON")
+        if not isinstance(payload, dict):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "request body must be a JSON object")
+        return payload
+
+    def read_source(self, document):
+        """
+        The path or bytes of a PDF named in a JSON request
+        """
+        if not isinstance(document, dict):
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'each document must be a JSON object')
+        if "pdf_base64" in document:
+            try:
+                return base64.b64decode(document["pdf_base64"], validate=True)
+            except (ValueError, TypeError):
+                raise RequestError(HTTPStatus.BAD_REQUEST, '"pdf_base64" is not valid base64')
+        if isinstance(document.get("path"), str):
+            return self.server.service.resolve_path(document["path"])
+        raise RequestError(HTTPStatus.BAD_REQUEST, 'a document needs a "path" or "pdf_base64"')
+
+    def handle_search(self, body, query):
+        if self.headers.get("Content-Type", "").split(";")[0].strip() == "application/pdf":
+            keywords = parse_keywords(query.get("keyword"))
+            options = parse_options({name: values[-1] for name, values in query.items()})
+            source = body
+        else:
+            payload = self.read_json(body)
+            keywords = parse_keywords(payload.get("keywords"))
+            options = parse_options(payload)
+            source = self.read_source(payload)
+
+        record = self.server.service.search([source], keywords, options)[0]
+        status = HTTPStatus.UNPROCESSABLE_ENTITY if "error" in record else HTTPStatus.OK
+        self.send_json(status, record)
+
+    def handle_batch(self, body):
+        payload = self.read_json(body)
+        keywords = parse_keywords(payload.get("keywords"))
+        options = parse_options(payload)
+        documents = payload.get("documents")
+        if not isinstance(documents, list) or not documents:
+            raise RequestError(HTTPStatus.BAD_REQUEST, '"documents" must be a non-empty list')
+        self.server.service.check_batch_size(len(documents))
+        sources = [self.read_source(document) for document in documents]
+
+        records = self.server.service.search(sources, keywords, options)
+        for document, record in zip(documents, records):
+            if "path" in document:
+                record["path"] = document["path"]
+        self.send_json(HTTPStatus.OK, {"documents": records})
+
+
+def run_server(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, max_pending=None, root=None,
+               use_cache=True, quiet=False):
+    """
+    Serves search requests until interrupted
+    """
+    service = SearchService(workers, max_pending, root, use_cache)
+    server = ThreadingHTTPServer((host, port), SearchRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.quiet = quiet
+
+    print(
+        f"Serving on http://{host}:{server.server_address[1]} "
+        f"({service.workers} workers, up to {service.max_pending} pending documents)",
+        file=sys.stderr,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
@@ -0,0 +1,412 @@
+# shard.py
+# Sharded search over an extracted corpus. The documents are split into N
+# shards, each held in memory by a long-lived shard process that answers
+# search requests over a small socket protocol, so shards can run on
+# separate hosts. A coordinator sends the keyword list to every shard at
+# once, merges their partial results, and reports the shards that failed or
+# did not answer in time instead of failing the whole search.
+import json
+import multiprocessing
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+try:
+    from .backend import ExtractionCache, extract_text_from_pdf, search_keywords_in_text, select_pages
+    from .batch import iter_pdf_paths
+    from .normalize import normalize_pages
+    from .textstore import TextStore, is_text_store
+except ImportError:
+    from backend import ExtractionCache, extract_text_from_pdf, search_keywords_in_text, select_pages
+    from batch import iter_pdf_paths
+    from normalize import normalize_pages
+    from textstore import TextStore, is_text_store
+
+
+DEFAULT_SHARD_HOST = "127.0.0.1"
+DEFAULT_SHARD_PORT = 8770
+
+# Seconds the coordinator waits for the shards' answers
+DEFAULT_SHARD_TIMEOUT = 30.0
+
+# Messages are a 4-byte big-endian length followed by that many bytes of
+# UTF-8 JSON
+MESSAGE_HEADER = struct.Struct(">I")
+
+# Largest message accepted
+MAX_MESSAGE_BYTES = 256 * 1024 * 1024
+
+
+class ShardError(Exception):
+    """
+    Raised on a malformed message, or when a shard answers with an error
+    """
+
+
+def send_message(sock, payload):
+    """
+    Sends one JSON message
+    """
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    sock.sendall(MESSAGE_HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, size, eof_ok=False):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            if eof_ok and not received:
+                return None
+            raise ConnectionError("connection closed in the middle of a message")
+        received += count
+    return buffer
+
+
+def recv_message(sock):
+    """
+    Receives one JSON message
+    Returns None if the connection was closed between two messages
+    Raises ShardError if the message is too large or not valid JSON
+    """
+    header = _recv_exactly(sock, MESSAGE_HEADER.size, eof_ok=True)
+    if header is None:
+        return None
+    (length,) = MESSAGE_HEADER.unpack(header)
+    if length > MAX_MESSAGE_BYTES:
+        raise ShardError(f"message larger than {MAX_MESSAGE_BYTES} bytes")
+    try:
+        return json.loads(_recv_exactly(sock, length))
+    except ValueError:
+        raise ShardError("message is not valid JSON")
+
+
+def parse_shard_spec(spec):
+    """
+    Parses a shard number such as "2/4" (the second of four shards)
+    Returns a tuple (0-based index, count)
+    """
+    try:
+        number, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"invalid shard '{spec}', expected e.g. 2/4")
+    if not 1 <= number <= count:
+        raise ValueError(f"invalid shard '{spec}', the shard number must be between 1 and {count}")
+    return number - 1, count
+
+
+def partition(paths, index, count):
+    """
+    The documents of shard index (0-based) out of count: every count-th
+    path in sorted order, so every host listing the same corpus agrees on
+    the split
+    """
+    return sorted(paths)[index::count]
+
+
+def parse_address(address):
+    """
+    Parses "host:port" (or just "host") into a (host, port) tuple
+    """
+    host, _, port = address.rpartition(":")
+    if not host:
+        return address, DEFAULT_SHARD_PORT
+    try:
+        return host.strip("[]"), int(port)
+    except ValueError:
+        raise ValueError(f"invalid shard address '{address}', expected host:port")
+
+
+# Page text held by one shard
+class ShardCorpus:
+    """
+    Loads the page text of the shard's documents once: text stores are
+    memory-mapped, PDFs are extracted (through the extraction cache if one
+    is given, so a restarted shard maps its text instead of extracting it
+    again) with workers extraction processes (None for every core).
+    Normalized pages are built the first time a normalized search needs
+    them. Documents that cannot be read are kept in errors.
+    """
+
+    def __init__(self, paths, cache=None, workers=None):
+        self.documents = {}
+        self.errors = {}
+        self._normalized = {}
+        self._lock = threading.Lock()
+        for path in paths:
+            try:
+                if is_text_store(path):
+                    self.documents[path] = TextStore(path)
+                else:
+                    self.documents[path] = extract_text_from_pdf(path, workers=workers, cache=cache)
+            except Exception as e:
+                self.errors[path] = f"{type(e).__name__}: {e}"
+
+    def status(self):
+        return {
+            "documents": len(self.documents),
+            "pages": sum(len(all_text) for all_text in self.documents.values()),
+            "errors": self.errors,
+        }
+
+    def _normalized_pages(self, path):
+        # Built once, even if several requests need it at the same time
+        with self._lock:
+            if path not in self._normalized:
+                self._normalized[path] = normalize_pages(self.documents[path])
+            return self._normalized[path]
+
+    def search(self, keywords, normalize=False, pages=None, presence=False):
+        """
+        Searches every document of the shard
+        Returns {path: {"page_count", "results"}}
+        """
+        documents = {}
+        for path, all_text in self.documents.items():
+            search_text = self._normalized_pages(path) if normalize else all_text
+            if pages is not None:
+                search_text = {page_num: search_text[page_num] for page_num in select_pages(pages, len(all_text))}
+            documents[path] = {
+                "page_count": len(all_text),
+                "results": search_keywords_in_text(search_text, keywords, normalize=normalize, presence=presence),
+            }
+        return documents
+
+
+class ShardRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Answers the messages of one connection until the client closes it:
+    {"op": "status"}
+    {"op": "search", "keywords": [...], "normalize", "pages", "presence"}
+    Every answer is a JSON object, with an "error" if the request failed.
+    """
+
+    def handle(self):
+        while True:
+            try:
+                request = recv_message(self.request)
+            except ShardError as e:
+                # The rest of the stream cannot be trusted
+                send_message(self.request, {"error": str(e)})
+                return
+            except OSError:
+                return
+            if request is None:
+                return
+            send_message(self.request, self.server.answer(request))
+
+
+class ShardServer(socketserver.ThreadingTCPServer):
+    """
+    Serves one shard's corpus, one thread per connection
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, corpus, name=""):
+        super().__init__(address, ShardRequestHandler)
+        self.corpus = corpus
+        self.name = name
+
+    def answer(self, request):
+        if not isinstance(request, dict):
+            return {"error": "a request must be a JSON object"}
+        op = request.get("op")
+        if op == "status":
+            return dict(self.corpus.status(), shard=self.name)
+        if op != "search":
+            return {"error": f"unknown op {op!r}"}
+
+        keywords = request.get("keywords")
+        if not isinstance(keywords, list) or not keywords or not all(isinstance(kw, str) for kw in keywords):
+            return {"error": '"keywords" must be a non-empty list of strings'}
+        start = time.perf_counter()
+        try:
+            documents = self.corpus.search(
+                keywords,
+                normalize=bool(request.get("normalize")),
+                pages=request.get("pages") or None,
+                presence=bool(request.get("presence")),
+            )
+        except ValueError as e:  # invalid regex keyword or page selection
+            return {"error": str(e)}
+        return {
+            "shard": self.name,
+            "documents": documents,
+            "errors": self.corpus.errors,
+            "seconds": round(time.perf_counter() - start, 6),
+        }
+
+
+def run_shard(paths, host=DEFAULT_SHARD_HOST, port=DEFAULT_SHARD_PORT, name="", use_cache=True, ready=None,
+              workers=None):
+    """
+    Loads the documents of a shard and serves them until interrupted
+    ready, if given, is a connection that gets the bound port once the
+    shard is ready to answer (port 0 picks a free port)
+    workers is the number of processes extracting each PDF (None for every core)
+    """
+    start = time.perf_counter()
+    corpus = ShardCorpus(paths, ExtractionCache() if use_cache else None, workers)
+    server = ShardServer((host, port), corpus, name)
+    status = corpus.status()
+    print(
+        f"Shard {name} serving {status['documents']} documents ({status['pages']:,} pages) "
+        f"on {host}:{server.server_address[1]}, loaded in {time.perf_counter() - start:.1f} s",
+        file=sys.stderr,
+    )
+    for path, error in corpus.errors.items():
+        print(f"  {path}: {error}", file=sys.stderr)
+    if ready is not None:
+        ready.send(server.server_address[1])
+        ready.close()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def query_shard(address, request, timeout):
+    """
+    Sends one request to a shard and waits for its answer
+    Raises OSError (e.g. socket.timeout) if the shard cannot be reached or
+    is too slow, and ShardError if it answers with an error
+    """
+    with socket.create_connection(address, timeout=timeout) as sock:
+        send_message(sock, request)
+        answer = recv_message(sock)
+    if answer is None:
+        raise ShardError("connection closed without an answer")
+    if "error" in answer:
+        raise ShardError(answer["error"])
+    return answer
+
+
+def merge_results(into, results, presence=False):
+    """
+    Adds the partial {keyword: {"count", "pages"}} results of a document to
+    the results already merged for it
+    """
+    for keyword, info in results.items():
+        merged = into.get(keyword)
+        if merged is None:
+            into[keyword] = {"count": info["count"], "pages": list(info["pages"])}
+        elif presence:
+            merged["pages"] = [min(merged["pages"] + info["pages"])]
+        else:
+            merged["count"] += info["count"]
+            merged["pages"] = sorted(set(merged["pages"]) | set(info["pages"]))
+
+
+def scatter_gather(shards, keywords, timeout=DEFAULT_SHARD_TIMEOUT, normalize=False, pages=None, presence=False):
+    """
+    Sends the keyword list to every shard ("host:port" addresses) at once,
+    and merges the results of the documents they hold.
+    Shards that fail, or have not answered after timeout seconds, are
+    reported and left out: the results of the others are still returned,
+    with "complete" set to False.
+    Returns a dictionary with the merged "documents"
+    {path: {"page_count", "results"}}, the documents the shards could not
+    read ("failed_documents"), a report per shard ("shards") and "complete"
+    """
+    request = {
+        "op": "search",
+        "keywords": list(keywords),
+        "normalize": normalize,
+        "pages": str(pages) if pages else None,
+        "presence": presence,
+    }
+    executor = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="smartsearch-shard")
+    futures = {}
+    shard_reports = {}
+    for address in shards:
+        try:
+            futures[executor.submit(query_shard, parse_address(address), request, timeout)] = address
+        except ValueError as e:
+            shard_reports[address] = {"error": str(e)}
+    _, not_done = wait(futures, timeout=timeout)
+    # Slow shards are not waited for: their sockets time out on their own
+    executor.shutdown(wait=False)
+
+    documents = {}
+    failed_documents = {}
+    for future, address in futures.items():
+        if future in not_done:
+            shard_reports[address] = {"error": f"no answer within {timeout:g} s"}
+            continue
+        try:
+            answer = future.result()
+        except (OSError, ShardError) as e:
+            shard_reports[address] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+
+        for path, record in answer["documents"].items():
+            document = documents.setdefault(path, {"page_count": 0, "results": {}})
+            document["page_count"] = max(document["page_count"], record["page_count"])
+            merge_results(document["results"], record["results"], presence)
+        failed_documents.update(answer.get("errors", {}))
+        shard_reports[address] = {"documents": len(answer["documents"]), "seconds": answer["seconds"]}
+
+    return {
+        "documents": dict(sorted(documents.items())),
+        "failed_documents": failed_documents,
+        "shards": {address: shard_reports[address] for address in shards},
+        "complete": all("error" not in report for report in shard_reports.values()),
+    }
+
+
+def _run_local_shard(paths, name, use_cache, ready):
+    try:
+        # Extracts serially: daemon processes cannot start worker processes,
+        # and the other local shards already use the other cores
+        run_shard(paths, port=0, name=name, use_cache=use_cache, ready=ready, workers=1)
+    except KeyboardInterrupt:
+        pass
+
+
+@contextmanager
+def local_shards(inputs, count, use_cache=True):
+    """
+    Starts count shard processes on this machine over the documents named
+    by inputs (files, directories or glob patterns), and stops them when
+    the block exits
+    Yields the list of their "host:port" addresses, once they are all ready
+    """
+    paths = list(iter_pdf_paths(inputs, text_stores=True))
+    processes = []
+    connections = []
+    try:
+        for index in range(count):
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=_run_local_shard,
+                args=(partition(paths, index, count), f"{index + 1}/{count}", use_cache, sender),
+                daemon=True,
+            )
+            process.start()
+            sender.close()
+            processes.append(process)
+            connections.append(receiver)
+        # Each shard sends its port once its documents are loaded
+        addresses = []
+        for index, receiver in enumerate(connections):
+            try:
+                addresses.append(f"{DEFAULT_SHARD_HOST}:{receiver.recv()}")
+            except EOFError:
+                raise ShardError(f"shard {index + 1}/{count} stopped before it was ready")
+        yield addresses
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
@@ -0,0 +1,372 @@
+# textstore.py
+# Compact binary format for extracted text: one contiguous UTF-8 buffer
+# plus page offset arrays, loaded with mmap instead of parsed.
+#
+# Layout (little-endian):
+#   header        magic, version, page_count, text byte length, text char length
+#   text          UTF-8 text of every page, each followed by PAGE_SEPARATOR
+#   page_nums     page_count x uint32
+#   byte_offsets  (page_count + 1) x uint64, start of each page in the text bytes
+#   char_offsets  (page_count + 1) x uint64, start of each page in the decoded text
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_right
+from collections.abc import Mapping
+
+try:
+    from .matcher import KeywordAggregate, KeywordMatcher, get_keyword_matcher
+except ImportError:
+    from matcher import KeywordAggregate, KeywordMatcher, get_keyword_matcher
+
+
+MAGIC = b"SSTX"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIQQ")
+
+# File name extension of text stores, looked for in input directories
+TEXT_STORE_SUFFIX = ".sstx"
+
+# Ends every page, so no keyword match can span two pages
+PAGE_SEPARATOR = "\f"
+
+# Text decoded and searched at a time by search_text_store (whole pages,
+# so a page larger than this is one chunk)
+SEARCH_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def _little_endian(values):
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+# Incremental writer, so pages never need to be held in memory together
+class TextStoreWriter:
+    """
+    Writes pages one at a time to a text store file.
+    The file is written under a temporary name and renamed on close(),
+    so readers never see a partial file.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, self.tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        self.f = os.fdopen(fd, "wb")
+        self.f.write(b"\0" * HEADER.size)
+        self.page_nums = array("I")
+        self.byte_offsets = array("Q", [0])
+        self.char_offsets = array("Q", [0])
+
+    def add_page(self, page_num, text):
+        data = (text + PAGE_SEPARATOR).encode("utf-8")
+        self.f.write(data)
+        self.page_nums.append(int(page_num))
+        self.byte_offsets.append(self.byte_offsets[-1] + len(data))
+        self.char_offsets.append(self.char_offsets[-1] + len(text) + len(PAGE_SEPARATOR))
+
+    def close(self):
+        try:
+            for values in (self.page_nums, self.byte_offsets, self.char_offsets):
+                self.f.write(_little_endian(array(values.typecode, values)).tobytes())
+            self.f.seek(0)
+            self.f.write(HEADER.pack(
+                MAGIC, VERSION, 0, len(self.page_nums), self.byte_offsets[-1], self.char_offsets[-1]
+            ))
+            self.f.close()
+            os.replace(self.tmp_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        """
+        Discard the partially written file
+        """
+        self.f.close()
+        try:
+            os.unlink(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_text_store(all_text, path):
+    """
+    Saves a {page_num: text} dictionary as a text store file
+    """
+    with TextStoreWriter(path) as writer:
+        for page_num, text in all_text.items():
+            writer.add_page(page_num, text)
+
+
+def is_text_store(path):
+    """
+    Checks whether a file is a text store
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+# Read-only, memory-mapped view of a text store
+class TextStore(Mapping):
+    """
+    Memory-mapped text store. Behaves like the {page_num: text} dictionary
+    returned by extract_text_from_pdf; page text is decoded on access.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, page_count, text_bytes, text_chars = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{self.path} is not a smartsearch text store")
+
+        self.text_start = HEADER.size
+        self.text_bytes = text_bytes
+        self.text_chars = text_chars
+
+        position = self.text_start + text_bytes
+        self.page_nums, position = self._read_array("I", page_count, position)
+        self.byte_offsets, position = self._read_array("Q", page_count + 1, position)
+        self.char_offsets, position = self._read_array("Q", page_count + 1, position)
+        self._page_index = {page_num: index for index, page_num in enumerate(self.page_nums)}
+
+    def _read_array(self, typecode, length, position):
+        values = array(typecode)
+        values.frombytes(self._mmap[position:position + length * values.itemsize])
+        return _little_endian(values), position + length * values.itemsize
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.page_nums)
+
+    def __iter__(self):
+        return iter(self.page_nums)
+
+    def __getitem__(self, page_num):
+        index = self._page_index[int(page_num)]
+        start = self.text_start + self.byte_offsets[index]
+        end = self.text_start + self.byte_offsets[index + 1] - len(PAGE_SEPARATOR.encode("utf-8"))
+        return self._mmap[start:end].decode("utf-8")
+
+    def text(self):
+        """
+        The text of every page as one string, pages ending with PAGE_SEPARATOR
+        """
+        return self._mmap[self.text_start:self.text_start + self.text_bytes].decode("utf-8")
+
+    def chunks(self, max_bytes=SEARCH_CHUNK_BYTES):
+        """
+        Yields the text in chunks of whole pages of about max_bytes, as
+        (char offset of the chunk in text(), [page_num, ...], chunk text)
+        """
+        start = 0
+        while start < len(self.page_nums):
+            end = bisect_right(self.byte_offsets, self.byte_offsets[start] + max_bytes) - 1
+            end = min(max(end, start + 1), len(self.page_nums))
+            data = self._mmap[self.text_start + self.byte_offsets[start]:self.text_start + self.byte_offsets[end]]
+            yield self.char_offsets[start], self.page_nums[start:end], data.decode("utf-8")
+            start = end
+
+    def page_for_offset(self, offset):
+        """
+        Returns (page_num, offset within the page) for an offset in text()
+        """
+        index = bisect_right(self.char_offsets, offset) - 1
+        return self.page_nums[index], offset - self.char_offsets[index]
+
+
+# Page text held in memory until told to spill it to disk
+class SpillingPageText(Mapping):
+    """
+    Collects {page_num: text} one page at a time, in page order. Pages stay
+    in memory until spill() is called; from then on they, and every page
+    added later, go to a temporary text store file instead. Once finish()
+    has been called, it reads like the dictionary returned by
+    extract_text_from_pdf (spilled pages are read back from the mapped file).
+    With keep_file=True, the spilled file is kept after finish(), so the
+    collection can be pickled (e.g. sent back from a worker process): the
+    receiving side maps the file and deletes it.
+    """
+
+    def __init__(self, directory=None, keep_file=False):
+        self.directory = directory
+        self.keep_file = keep_file
+        self.pages = {}
+        self.chars = 0
+        self.bytes = 0
+        self.store = None
+        self._writer = None
+
+    @property
+    def spilled(self):
+        return self._writer is not None or self.store is not None
+
+    def add_page(self, page_num, text):
+        if self._writer is not None:
+            self._writer.add_page(page_num, text)
+        else:
+            self.pages[page_num] = text
+            self.chars += len(text)
+            self.bytes += sys.getsizeof(text)
+
+    def spill(self):
+        """
+        Moves the pages in memory to a temporary file, and sends later pages there
+        """
+        if self.spilled:
+            return
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix=TEXT_STORE_SUFFIX)
+        os.close(fd)
+        self._writer = TextStoreWriter(path)
+        for page_num, text in self.pages.items():
+            self._writer.add_page(page_num, text)
+        self.pages = {}
+        self.chars = 0
+        self.bytes = 0
+
+    def finish(self):
+        """
+        Ends the collection; returns self, now readable as a mapping
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self.store = TextStore(self._writer.path)
+            self._writer = None
+            if not self.keep_file:
+                try:
+                    # The mapping stays readable; the file is gone once it is closed
+                    os.unlink(self.store.path)
+                except OSError:
+                    pass
+        return self
+
+    def close(self):
+        """
+        Discards the spilled pages (the mapping cannot be read afterwards)
+        """
+        if self._writer is not None:
+            self._writer.abort()
+            os.unlink(self._writer.path)
+            self._writer = None
+        if self.store is not None:
+            self.store.close()
+            if self.keep_file:
+                try:
+                    os.unlink(self.store.path)
+                except OSError:
+                    pass
+            self.store = None
+
+    def __getstate__(self):
+        if self._writer is not None or (self.store is not None and not self.keep_file):
+            raise TypeError("Only a finished SpillingPageText with keep_file=True can be pickled")
+        return {
+            "directory": self.directory,
+            "pages": self.pages,
+            "chars": self.chars,
+            "bytes": self.bytes,
+            "store_path": self.store.path if self.store is not None else None,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"])
+        self.pages = state["pages"]
+        self.chars = state["chars"]
+        self.bytes = state["bytes"]
+        if state["store_path"] is not None:
+            self.store = TextStore(state["store_path"])
+            try:
+                # This side owns the file now (see finish())
+                os.unlink(self.store.path)
+            except OSError:
+                pass
+
+    def _mapping(self):
+        if self._writer is not None:
+            raise RuntimeError("The spilled pages cannot be read before finish()")
+        return self.store if self.store is not None else self.pages
+
+    def __len__(self):
+        return len(self._mapping())
+
+    def __iter__(self):
+        return iter(self._mapping())
+
+    def __getitem__(self, page_num):
+        return self._mapping()[page_num]
+
+
+def search_text_store(store, keywords, with_offsets=False, chunk_bytes=SEARCH_CHUNK_BYTES):
+    """
+    Searches a text store a chunk of pages at a time (see TextStore.chunks),
+    in a single pass over each chunk; page numbers are found by bisecting
+    the page offsets. Only one chunk is decoded at any time.
+    Returns the same structure as search_keywords_in_text
+    """
+    matcher = keywords if isinstance(keywords, KeywordMatcher) else get_keyword_matcher(keywords)
+    aggregate = KeywordAggregate(matcher.keywords, with_offsets)
+    # Normalized offsets would not line up with the pages, and a regex could
+    # match across the page separator: search by page
+    by_page = matcher.normalize or matcher.has_regex or matcher.has_empty_patterns
+
+    for chunk_start, page_nums, text in store.chunks(chunk_bytes):
+        if by_page:
+            for index, page_num in enumerate(page_nums, store._page_index[page_nums[0]]):
+                # Sliced out of the decoded chunk, not decoded again
+                start = store.char_offsets[index] - chunk_start
+                page_text = text[start:store.char_offsets[index + 1] - chunk_start - len(PAGE_SEPARATOR)]
+                if with_offsets:
+                    aggregate.add_page(page_num, *matcher.find(page_text))
+                else:
+                    aggregate.add_page(page_num, matcher.count(page_text))
+            continue
+
+        spans = {}
+        matcher.count_patterns(text, spans)
+
+        # Regroup the matches by page, keeping the page order
+        pages = {}
+        for pattern_id, pattern_spans in spans.items():
+            for start, end in pattern_spans:
+                page_num, page_start = store.page_for_offset(chunk_start + start)
+                page_spans = pages.setdefault(page_num, {}).setdefault(pattern_id, [])
+                page_spans.append((page_start, page_start + end - start))
+
+        for page_num in sorted(pages, key=store._page_index.get):
+            hits = {}
+            keyword_spans = {}
+            for pattern_id, page_spans in pages[page_num].items():
+                for keyword in matcher.pattern_keywords[pattern_id]:
+                    hits[keyword] = len(page_spans)
+                    keyword_spans[keyword] = page_spans
+            aggregate.add_page(page_num, hits, keyword_spans)
+
+    return aggregate.results()
@@ -0,0 +1,37 @@
+from smartsearch.matcher import KeywordMatcher
+from smartsearch.normalize import normalize_text
+
+
+def spans_text(text, spans):
+    return {keyword: [text[start:end] for start, end in keyword_spans] for keyword, keyword_spans in spans.items()}
+
+
+def test_decomposed_accent_matches_composed_keyword():
+    text = "un café noir"
+    counts, spans = KeywordMatcher(["café"], normalize=True).find(text)
+    assert counts == {"café": 1}
+    assert spans_text(text, spans) == {"café": ["café"]}
+
+
+def test_contraction_and_expansion_in_one_segment():
+    text = "café au lait ﬁne"
+    normalized = normalize_text(text)
+    assert normalized.text == "café au lait fine"
+
+    counts, spans = KeywordMatcher(["lait", "word:au", "fine", "café"], normalize=True).find(text)
+    assert counts == {"lait": 1, "word:au": 1, "fine": 1, "café": 1}
+    assert spans_text(text, spans) == {
+        "lait": ["lait"],
+        "word:au": ["au"],
+        "fine": ["ﬁne"],
+        "café": ["café"],
+    }
+
+
+def test_offsets_of_plain_text_are_unchanged():
+    text = "Health   equity\nand discrimi-\nnation"
+    counts, spans = KeywordMatcher(["health equity", "discrimination"], normalize=True).find(text)
+    assert spans_text(text, spans) == {
+        "health equity": ["Health   equity"],
+        "discrimination": ["discrimi-\nnation"],
+    }